@@ -0,0 +1,521 @@
+"""
+ARMAZENAMENTO DOS ARQUIVOS DOS CLIENTES (GOOGLE DRIVE OU DISCO LOCAL)
+Camada abaixo dos helpers de listagem/download/upload do worker
+(main_v10_fase3.py) e do dashboard (dashboard_server.py).
+
+Duas implementações com a mesma interface:
+  - ArmazenamentoDrive: Google Drive (índice local, cache de downloads,
+    limitador de cota, subpastas com cache de id, appProperties)
+  - ArmazenamentoLocal: pastas em disco/NAS (os.scandir, leitura por mmap,
+    estado de processado em .processado.json). Os IDs são os caminhos
+    relativos a ARMAZENAMENTO_LOCAL_DIR (ex: PASTA_ACAO_ACIDENTARIA=CLIENTES/ACIDENTARIA)
+
+Seleção: ARMAZENAMENTO_BACKEND=drive (padrão) ou local.
+
+Os helpers continuam recebendo 'service': com o backend local ele é a
+própria instância de ArmazenamentoLocal (obter_service_armazenamento), e
+obter_armazenamento(service) devolve a implementação certa nos dois casos.
+Os endpoints /api/drive/* do dashboard (navegador do Drive) continuam só Drive.
+"""
+
+import io
+import os
+import json
+import mmap
+import shutil
+import tempfile
+import threading
+import mimetypes
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from googleapiclient.http import MediaIoBaseDownload
+
+from limitador_drive import executar_drive, executar_drive_chamada
+from drive_utils import (
+    iterar_arquivos_drive, listar_filhos_em_lote, enviar_arquivo_drive, enviar_arquivo_em_subpasta,
+    buscar_ou_criar_subpasta, criar_pasta, pasta_esta_processada, marcar_pasta_processada, desmarcar_pasta_processada,
+    listar_clientes_processados,
+    normalizar_texto, pastas_tipos_acao, _limitar_bytes,
+    PASTA_MIME_TYPE, EXPORTACAO_NATIVOS, CHAVE_PROCESSADO, NOME_MARCADOR_LEGADO,
+)
+from drive_index import obter_indice_drive, buscar_pasta_cliente
+from cache_downloads import obter_cache_downloads, obter_versao_drive, versao_drive
+from credenciais_drive import obter_service_drive
+
+load_dotenv()
+
+ARMAZENAMENTO_BACKEND = os.getenv('ARMAZENAMENTO_BACKEND', 'drive').lower()
+ARMAZENAMENTO_LOCAL_DIR = os.getenv('ARMAZENAMENTO_LOCAL_DIR', 'clientes_local')
+
+# Tamanho de cada requisição do download (limita o pico de memória por arquivo)
+DOWNLOAD_CHUNK_BYTES = int(os.getenv('DOWNLOAD_CHUNK_MB', '16')) * 1024 * 1024
+
+# Acima deste tamanho o download em stream passa da memória para um arquivo temporário
+DOWNLOAD_LIMIAR_DISCO_BYTES = int(os.getenv('DOWNLOAD_LIMIAR_DISCO_MB', '8')) * 1024 * 1024
+
+# Estado de processado no backend local (equivalente às appProperties do Drive)
+ARQUIVO_ESTADO_LOCAL = '.processado.json'
+
+
+# ============================================================================
+# GOOGLE DRIVE
+# ============================================================================
+
+class ArmazenamentoDrive:
+    """Arquivos dos clientes no Google Drive"""
+
+    local = False
+
+    def __init__(self, service):
+        self.service = service
+
+    def para_thread(self):
+        """Instância para uso em outra thread (httplib2 não é thread-safe)"""
+        creds = getattr(getattr(self.service, '_http', None), 'credentials', None)
+        if creds is None:
+            # Service sem credenciais acessíveis (ex: Drive falso): usa o próprio
+            return self
+        return ArmazenamentoDrive(obter_service_drive() or self.service)
+
+    # -------------------------------------------------------------- listagem
+
+    def listar_pastas(self, pasta_id):
+        """Subpastas de uma pasta ({'id', 'name'}); árvore CLIENTES vem do índice local"""
+        indice = obter_indice_drive(self.service)
+        if indice and indice.contem_pasta(pasta_id):
+            return indice.listar_filhos(pasta_id, somente_pastas=True)
+
+        query = f"'{pasta_id}' in parents and trashed=false and mimeType='{PASTA_MIME_TYPE}'"
+        return list(iterar_arquivos_drive(self.service, query, "id, name"))
+
+    def iterar_arquivos(self, pasta_id, campos="id, name, mimeType"):
+        """Gerador sobre os arquivos (não pastas) de uma pasta"""
+        indice = obter_indice_drive(self.service)
+        if indice and indice.contem_pasta(pasta_id):
+            return iter(indice.listar_filhos(pasta_id, somente_pastas=False))
+
+        query = f"'{pasta_id}' in parents and trashed=false and mimeType != '{PASTA_MIME_TYPE}'"
+        return iterar_arquivos_drive(self.service, query, campos)
+
+    def listar_filhos_em_lote(self, pastas_ids):
+        """Arquivos e pastas de várias pastas (com 'parents'), uma consulta por lote"""
+        indice = obter_indice_drive(self.service)
+        if indice and all(indice.contem_pasta(pid) for pid in pastas_ids):
+            return indice.listar_filhos_em_lote(pastas_ids)
+        return listar_filhos_em_lote(
+            self.service, pastas_ids, "id, name, mimeType, parents, md5Checksum, modifiedTime"
+        )
+
+    def buscar_arquivo(self, pasta_id, nome):
+        """Primeiro arquivo com esse nome exato na pasta, ou None"""
+        nome_escapado = nome.replace("\\", "\\\\").replace("'", "\\'")
+        query = f"'{pasta_id}' in parents and name = '{nome_escapado}' and trashed = false"
+        return next(iter(iterar_arquivos_drive(self.service, query, "id, name")), None)
+
+    def buscar_pasta_cliente(self, cliente_nome, tipo_acao=None):
+        return buscar_pasta_cliente(self.service, cliente_nome, tipo_acao)
+
+    # -------------------------------------------------------------- download
+
+    def transferir(self, file_id, destino):
+        """Copia o conteúdo para um arquivo aberto, bloco a bloco (propaga exceções)"""
+        request = self.service.files().get_media(fileId=file_id)
+        downloader = MediaIoBaseDownload(destino, request, chunksize=DOWNLOAD_CHUNK_BYTES)
+        done = False
+        while not done:
+            # Em erro temporário o bloco é pedido de novo a partir do mesmo offset
+            status, done = executar_drive_chamada(downloader.next_chunk, 'drive.files.get_media')
+
+    def _ler_drive(self, file_id):
+        fh = io.BytesIO()
+        self.transferir(file_id, fh)
+        return fh.getvalue()
+
+    def _exportar_drive(self, file_id, mime_exportacao):
+        return executar_drive(self.service.files().export(fileId=file_id, mimeType=mime_exportacao))
+
+    def versao(self, file_id):
+        """Versão atual do arquivo: headRevisionId, senão md5Checksum/modifiedTime"""
+        meta = executar_drive(self.service.files().get(
+            fileId=file_id, fields='headRevisionId, md5Checksum, modifiedTime'
+        ))
+        if meta.get('headRevisionId'):
+            return f"rev:{meta['headRevisionId']}"
+        return versao_drive(meta)
+
+    def ler(self, file_id, versao=None, mime_type=None):
+        """
+        Conteúdo do arquivo em bytes, pelo cache local: só vai ao Drive se a
+        versão (md5/modifiedTime) não estiver guardada (propaga exceções)
+
+        Documentos/planilhas nativos do Google (mime_type em EXPORTACAO_NATIVOS)
+        não têm conteúdo para get_media: vêm de files().export já como texto
+        UTF-8 (text/plain ou text/csv), em uma única requisição.
+        """
+        mime_exportacao = EXPORTACAO_NATIVOS.get(mime_type)
+        if mime_exportacao:
+            baixar = lambda: self._exportar_drive(file_id, mime_exportacao)
+        else:
+            baixar = lambda: self._ler_drive(file_id)
+
+        cache = obter_cache_downloads()
+        if not cache:
+            return baixar()
+
+        if not versao:
+            versao = obter_versao_drive(self.service, file_id)
+        if not versao:
+            return baixar()
+        if mime_exportacao:
+            # Nativos não têm md5: a versão é o modifiedTime + o formato exportado
+            versao = f"{versao}|{mime_exportacao}"
+
+        conteudo = cache.obter(file_id, versao)
+        if conteudo is None:
+            conteudo = baixar()
+            cache.guardar(file_id, versao, conteudo)
+        return conteudo
+
+    def ler_texto(self, file_id, versao=None, mime_type=None):
+        """Texto de um arquivo nativo do Google exportado (None se não for nativo)"""
+        if mime_type not in EXPORTACAO_NATIVOS:
+            return None
+        conteudo = self.ler(file_id, versao, mime_type)
+        return conteudo.decode('utf-8-sig', errors='ignore') if conteudo else ""
+
+    def abrir(self, file_id, versao=None):
+        """
+        Arquivo aberto para leitura, sem manter duas cópias em memória
+
+        O conteúdo vai para um SpooledTemporaryFile, que passa para o disco ao
+        ultrapassar DOWNLOAD_LIMIAR_DISCO_BYTES. Se o arquivo estiver no cache,
+        a própria entrada do cache é aberta. Quem chama fecha.
+        """
+        cache = obter_cache_downloads()
+        if cache and not versao:
+            versao = obter_versao_drive(self.service, file_id)
+        if cache and versao:
+            f = cache.abrir(file_id, versao)
+            if f is not None:
+                return f
+
+        fh = tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_LIMIAR_DISCO_BYTES)
+        self.transferir(file_id, fh)
+        tamanho = fh.tell()
+        if cache and versao:
+            fh.seek(0)
+            cache.guardar_stream(file_id, versao, fh, tamanho)
+        fh.seek(0)
+        return fh
+
+    def copiar_para_caminho(self, file_id, caminho):
+        """Grava o arquivo em um caminho local; devolve o tamanho em bytes"""
+        with open(caminho, 'wb') as f:
+            self.transferir(file_id, f)
+            return f.tell()
+
+    # ---------------------------------------------------------------- upload
+
+    def enviar(self, metadados, conteudo, mimetype, campos="id"):
+        return enviar_arquivo_drive(self.service, metadados, conteudo, mimetype, campos=campos)
+
+    def enviar_em_subpasta(self, nome_subpasta, pasta_pai_id, metadados, conteudo, mimetype, campos="id"):
+        return enviar_arquivo_em_subpasta(
+            self.service, nome_subpasta, pasta_pai_id, metadados, conteudo, mimetype, campos=campos
+        )
+
+    def buscar_ou_criar_subpasta(self, nome, pasta_pai_id):
+        return buscar_ou_criar_subpasta(self.service, nome, pasta_pai_id)
+
+    def criar_pasta(self, nome, pasta_pai_id):
+        return criar_pasta(self.service, nome, pasta_pai_id)
+
+    def mover(self, arquivo_id, pasta_destino_id):
+        """Move o arquivo para outra pasta; False se ele não tiver pasta atual"""
+        arquivo = executar_drive(self.service.files().get(fileId=arquivo_id, fields='parents'))
+        pastas_atuais = arquivo.get('parents', [])
+        if not pastas_atuais:
+            return False
+        executar_drive(self.service.files().update(
+            fileId=arquivo_id,
+            addParents=pasta_destino_id,
+            removeParents=",".join(pastas_atuais),
+            fields='id, parents'
+        ))
+        return True
+
+    # ------------------------------------------------------ estado processado
+
+    def pasta_esta_processada(self, pasta_id):
+        return pasta_esta_processada(self.service, pasta_id)
+
+    def marcar_pasta_processada(self, pasta_id, info=None):
+        return marcar_pasta_processada(self.service, pasta_id, info)
+
+    def desmarcar_pasta_processada(self, pasta_id):
+        return desmarcar_pasta_processada(self.service, pasta_id)
+
+    def listar_clientes_processados(self, pastas_tipos_ids, migrar=False):
+        return listar_clientes_processados(self.service, pastas_tipos_ids, migrar)
+
+
+# ============================================================================
+# DISCO LOCAL / NAS
+# ============================================================================
+
+def _data_rfc3339(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+class ArmazenamentoLocal:
+    """
+    Arquivos dos clientes em um diretório local (ex: NAS montado)
+
+    Listagens com os.scandir (sem chamadas de rede), leitura em stream por
+    mmap e escrita atômica. Os itens têm o mesmo formato dos do Drive
+    (id, name, mimeType, parents, size, createdTime, modifiedTime, webViewLink).
+    """
+
+    local = True
+
+    def __init__(self, diretorio=ARMAZENAMENTO_LOCAL_DIR):
+        self.raiz = os.path.realpath(diretorio)
+        self.lock = threading.Lock()
+        os.makedirs(self.raiz, exist_ok=True)
+
+    def para_thread(self):
+        return self
+
+    def _caminho(self, item_id):
+        """Caminho absoluto de um ID, sem permitir sair da raiz"""
+        caminho = os.path.realpath(os.path.join(self.raiz, *str(item_id).split('/')))
+        if caminho != self.raiz and not caminho.startswith(self.raiz + os.sep):
+            raise ValueError(f"ID fora do diretório de armazenamento: {item_id}")
+        return caminho
+
+    def _id(self, caminho):
+        return os.path.relpath(caminho, self.raiz).replace(os.sep, '/')
+
+    def _item(self, entrada, pasta_id):
+        st = entrada.stat()
+        pasta = entrada.is_dir()
+        item = {
+            'id': f"{pasta_id}/{entrada.name}" if pasta_id not in ('', '.') else entrada.name,
+            'name': entrada.name,
+            'mimeType': PASTA_MIME_TYPE if pasta else (mimetypes.guess_type(entrada.name)[0] or 'application/octet-stream'),
+            'parents': [pasta_id],
+            'createdTime': _data_rfc3339(getattr(st, 'st_birthtime', st.st_mtime)),
+            'modifiedTime': _data_rfc3339(st.st_mtime),
+            'webViewLink': f"file://{entrada.path}",
+        }
+        if not pasta:
+            item['size'] = str(st.st_size)
+        return item
+
+    def _entradas(self, pasta_id):
+        """Itens visíveis da pasta (ignora ocultos e temporários), em ordem de nome"""
+        with os.scandir(self._caminho(pasta_id)) as it:
+            entradas = [e for e in it if not e.name.startswith('.') and not e.name.endswith('.tmp')]
+        entradas.sort(key=lambda e: e.name.lower())
+        return entradas
+
+    # -------------------------------------------------------------- listagem
+
+    def listar_pastas(self, pasta_id):
+        return [{'id': self._item(e, pasta_id)['id'], 'name': e.name}
+                for e in self._entradas(pasta_id) if e.is_dir()]
+
+    def iterar_arquivos(self, pasta_id, campos=None):
+        return (self._item(e, pasta_id) for e in self._entradas(pasta_id) if not e.is_dir())
+
+    def listar_filhos_em_lote(self, pastas_ids):
+        return [self._item(e, pid) for pid in pastas_ids for e in self._entradas(pid)]
+
+    def buscar_arquivo(self, pasta_id, nome):
+        caminho = os.path.join(self._caminho(pasta_id), nome)
+        if not os.path.isfile(caminho):
+            return None
+        return {'id': self._id(caminho), 'name': nome}
+
+    def buscar_pasta_cliente(self, cliente_nome, tipo_acao=None):
+        """Mesma regra do Drive: nome sem acentos/maiúsculas, tipos na ordem do .env"""
+        alvo = normalizar_texto(cliente_nome).strip()
+        for tipo, pasta_tipo_id in pastas_tipos_acao():
+            if tipo_acao not in (None, tipo):
+                continue
+            for pasta in self.listar_pastas(pasta_tipo_id):
+                if normalizar_texto(pasta['name']).strip() == alvo:
+                    return dict(pasta, tipo_acao=tipo, pasta_tipo_id=pasta_tipo_id)
+        return None
+
+    # -------------------------------------------------------------- leitura
+
+    def versao(self, file_id):
+        """Versão atual do arquivo: data de modificação (ns) e tamanho"""
+        st = os.stat(self._caminho(file_id))
+        return f"mtime:{st.st_mtime_ns}:{st.st_size}"
+
+    def ler(self, file_id, versao=None, mime_type=None):
+        with open(self._caminho(file_id), 'rb') as f:
+            return f.read()
+
+    def ler_texto(self, file_id, versao=None, mime_type=None):
+        # Em disco não existem documentos nativos do Google
+        return None
+
+    def abrir(self, file_id, versao=None):
+        """
+        Arquivo mapeado em memória (mmap): leitura sob demanda pelo cache de
+        páginas do sistema, sem cópia para o processo. Quem chama fecha.
+        """
+        f = open(self._caminho(file_id), 'rb')
+        try:
+            mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Arquivo vazio não pode ser mapeado
+            return f
+        f.close()
+        return mapa
+
+    def copiar_para_caminho(self, file_id, caminho):
+        shutil.copyfile(self._caminho(file_id), caminho)
+        return os.path.getsize(caminho)
+
+    # -------------------------------------------------------------- escrita
+
+    def _nome_livre(self, pasta, nome):
+        """Como o Drive aceita nomes repetidos, o arquivo novo nunca sobrescreve outro"""
+        base, ext = os.path.splitext(nome)
+        candidato, n = nome, 1
+        while os.path.exists(os.path.join(pasta, candidato)):
+            candidato = f"{base} ({n}){ext}"
+            n += 1
+        return os.path.join(pasta, candidato)
+
+    def enviar(self, metadados, conteudo, mimetype, campos="id"):
+        pasta = self._caminho((metadados.get('parents') or [''])[0])
+        os.makedirs(pasta, exist_ok=True)
+        with self.lock:
+            destino = self._nome_livre(pasta, metadados['name'])
+            # Reserva o nome antes de soltar o lock
+            open(destino, 'wb').close()
+        tmp = f"{destino}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            if isinstance(conteudo, (bytes, bytearray)):
+                f.write(conteudo)
+            else:
+                shutil.copyfileobj(conteudo, f, 1024 * 1024)
+        os.replace(tmp, destino)
+        pasta_id = self._id(pasta)
+        with os.scandir(pasta) as it:
+            entrada = next(e for e in it if e.path == destino)
+        return self._item(entrada, pasta_id)
+
+    def buscar_ou_criar_subpasta(self, nome, pasta_pai_id):
+        caminho = os.path.join(self._caminho(pasta_pai_id), nome)
+        criada = not os.path.isdir(caminho)
+        os.makedirs(caminho, exist_ok=True)
+        return self._id(caminho), criada
+
+    def criar_pasta(self, nome, pasta_pai_id):
+        pasta = self._caminho(pasta_pai_id)
+        os.makedirs(pasta, exist_ok=True)
+        with self.lock:
+            # Nome repetido: outra pasta ("Nome (1)"), como no Drive
+            caminho = self._nome_livre(pasta, nome)
+            os.makedirs(caminho)
+        return self._id(caminho)
+
+    def enviar_em_subpasta(self, nome_subpasta, pasta_pai_id, metadados, conteudo, mimetype, campos="id"):
+        pasta_id, _ = self.buscar_ou_criar_subpasta(nome_subpasta, pasta_pai_id)
+        arquivo = self.enviar(dict(metadados, parents=[pasta_id]), conteudo, mimetype, campos)
+        return arquivo, pasta_id
+
+    def mover(self, arquivo_id, pasta_destino_id):
+        origem = self._caminho(arquivo_id)
+        pasta = self._caminho(pasta_destino_id)
+        with self.lock:
+            os.replace(origem, self._nome_livre(pasta, os.path.basename(origem)))
+        return True
+
+    # ------------------------------------------------------ estado processado
+
+    def pasta_esta_processada(self, pasta_id):
+        try:
+            with open(os.path.join(self._caminho(pasta_id), ARQUIVO_ESTADO_LOCAL), 'r', encoding='utf-8') as f:
+                return json.load(f).get(CHAVE_PROCESSADO) == '1'
+        except (OSError, ValueError):
+            return False
+
+    def marcar_pasta_processada(self, pasta_id, info=None):
+        estado = {
+            CHAVE_PROCESSADO: '1',
+            'processado_em': datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        if info:
+            estado['peticao'] = _limitar_bytes(info.get('nome_arquivo', ''), 110)
+        caminho = os.path.join(self._caminho(pasta_id), ARQUIVO_ESTADO_LOCAL)
+        with open(f"{caminho}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(estado, f, ensure_ascii=False)
+        os.replace(f"{caminho}.tmp", caminho)
+
+    def desmarcar_pasta_processada(self, pasta_id):
+        base = self._caminho(pasta_id)
+        estado = os.path.join(base, ARQUIVO_ESTADO_LOCAL)
+        if os.path.exists(estado):
+            os.remove(estado)
+        legado = os.path.join(base, NOME_MARCADOR_LEGADO)
+        if os.path.exists(legado):
+            os.remove(legado)
+            return 1
+        return 0
+
+    def listar_clientes_processados(self, pastas_tipos_ids, migrar=False):
+        processados = set()
+        for pasta_tipo_id in pastas_tipos_ids:
+            if not pasta_tipo_id:
+                continue
+            for pasta in self.listar_pastas(pasta_tipo_id):
+                if self.pasta_esta_processada(pasta['id']):
+                    processados.add(pasta['id'])
+                elif os.path.exists(os.path.join(self._caminho(pasta['id']), NOME_MARCADOR_LEGADO)):
+                    if migrar:
+                        self.marcar_pasta_processada(pasta['id'])
+                    processados.add(pasta['id'])
+        return processados
+
+
+# ============================================================================
+# SELEÇÃO DO BACKEND
+# ============================================================================
+
+_LOCAL = None
+_LOCK_LOCAL = threading.Lock()
+
+
+def armazenamento_local_ativo():
+    return ARMAZENAMENTO_BACKEND == 'local'
+
+
+def obter_service_armazenamento(permitir_login=False):
+    """
+    Objeto passado como 'service' pelos helpers
+
+    Returns:
+        Drive service (backend drive) ou a instância de ArmazenamentoLocal
+    """
+    global _LOCAL
+    if not armazenamento_local_ativo():
+        return obter_service_drive(permitir_login=permitir_login)
+    with _LOCK_LOCAL:
+        if _LOCAL is None:
+            _LOCAL = ArmazenamentoLocal()
+            print(f"[ARMAZENAMENTO] Usando pastas locais em {_LOCAL.raiz}")
+        return _LOCAL
+
+
+def obter_armazenamento(service):
+    """Implementação de armazenamento para o 'service' recebido pelos helpers"""
+    if isinstance(service, ArmazenamentoLocal):
+        return service
+    return ArmazenamentoDrive(service)
@@ -0,0 +1,234 @@
+"""
+AUDITORIA EM LOTE (MESSAGE BATCHES API)
+Reauditar um acervo de petições (ex: depois de mudar o checklist) com uma
+chamada messages.create por petição leva horas e paga preço cheio. No modo
+lote (AUDITORIA_MODO=lote) o agente_auditor monta todos os prompts, envia
+um único lote pela Message Batches API (metade do preço, processado em
+até 24h), consulta o andamento e distribui os resultados para
+log_auditoria / atualizar_status_historico / atualizar_estatisticas.
+
+O lote enviado fica registrado em LOTE_AUDITORIA_FILE até os resultados
+serem processados: se a espera (AUDITORIA_LOTE_ESPERA_MAX_SEG) acabar, a
+próxima execução do auditor retoma o mesmo lote em vez de reenviar.
+Pedido pelo dashboard (flags/flag_auditoria.json), o auditor só envia o
+lote e retorna; o loop do worker consulta o lote pendente sem bloquear, no
+máximo a cada AUDITORIA_LOTE_INTERVALO_SEG, e distribui os resultados
+quando ele termina.
+
+AUDITORIA_LOTE_BACKEND=fake troca a API pelo lote falso em processo
+(LotesFake), que responde com uma auditoria fixa, para testar o modo
+sem rede.
+"""
+
+import os
+import json
+import time
+import uuid
+from types import SimpleNamespace
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# individual (uma chamada por petição) ou lote (Message Batches API)
+AUDITORIA_MODO = os.getenv('AUDITORIA_MODO', 'individual').lower()
+
+AUDITORIA_LOTE_BACKEND = os.getenv('AUDITORIA_LOTE_BACKEND', 'anthropic').lower()
+
+# Intervalo entre consultas ao lote e quanto esperar nesta execução antes de
+# deixar o lote para a próxima (o lote continua sendo processado na API)
+AUDITORIA_LOTE_INTERVALO_SEG = float(os.getenv('AUDITORIA_LOTE_INTERVALO_SEG', '60'))
+AUDITORIA_LOTE_ESPERA_MAX_SEG = float(os.getenv('AUDITORIA_LOTE_ESPERA_MAX_SEG', '3600'))
+
+# Consultas em que o lote falso ainda responde "in_progress"
+AUDITORIA_LOTE_FAKE_CONSULTAS = int(os.getenv('AUDITORIA_LOTE_FAKE_CONSULTAS', '1'))
+
+LOTE_AUDITORIA_FILE = os.getenv('LOTE_AUDITORIA_FILE', 'lote_auditoria_pendente.json')
+
+
+# ============================================================================
+# LOTE FALSO (OFFLINE)
+# ============================================================================
+
+def resposta_auditoria_fake(params):
+    """Auditoria fixa no formato JSON pedido pelo prompt do auditor"""
+    return json.dumps({
+        "score": 85,
+        "aprovada": True,
+        "justificativa_score": "Auditoria simulada (lote falso).",
+        "erros_criticos": [],
+        "estrutura_faltante": [],
+        "reflexos_he_faltantes": [],
+        "qualidade_extra": {"bonus_pontos": 0},
+        "alertas": [],
+        "sugestoes": [],
+        "pontos_positivos": ["Auditoria simulada"],
+        "melhorias_100": [],
+        "resumo": "Aprovada 85/100 (lote falso)."
+    }, ensure_ascii=False)
+
+
+class LotesFake:
+    """
+    Subconjunto de client.beta.messages.batches (create / retrieve / results)
+    processado em memória
+
+    Args:
+        responder: Função params -> texto da resposta (padrão: resposta_auditoria_fake)
+        consultas_ate_terminar: Quantos retrieve() respondem "in_progress"
+    """
+
+    def __init__(self, responder=None, consultas_ate_terminar=AUDITORIA_LOTE_FAKE_CONSULTAS):
+        self.responder = responder or resposta_auditoria_fake
+        self.consultas_ate_terminar = consultas_ate_terminar
+        self.lotes = {}
+
+    def create(self, requests):
+        lote_id = f"msgbatch_fake_{uuid.uuid4().hex[:16]}"
+        self.lotes[lote_id] = {'requests': list(requests), 'consultas': 0}
+        return self._estado(lote_id)
+
+    def retrieve(self, lote_id):
+        if lote_id not in self.lotes:
+            raise KeyError(f"Lote {lote_id} não existe no lote falso")
+        self.lotes[lote_id]['consultas'] += 1
+        return self._estado(lote_id)
+
+    def results(self, lote_id):
+        for req in self.lotes[lote_id]['requests']:
+            texto = self.responder(req['params'])
+            mensagem = SimpleNamespace(
+                content=[SimpleNamespace(type='text', text=texto)],
+                stop_reason='end_turn',
+                usage=SimpleNamespace(input_tokens=0, output_tokens=0),
+            )
+            yield SimpleNamespace(
+                custom_id=req['custom_id'],
+                result=SimpleNamespace(type='succeeded', message=mensagem),
+            )
+
+    def _estado(self, lote_id):
+        lote = self.lotes[lote_id]
+        terminou = lote['consultas'] > self.consultas_ate_terminar
+        total = len(lote['requests'])
+        return SimpleNamespace(
+            id=lote_id,
+            processing_status='ended' if terminou else 'in_progress',
+            request_counts=SimpleNamespace(
+                processing=0 if terminou else total,
+                succeeded=total if terminou else 0,
+                errored=0, canceled=0, expired=0,
+            ),
+        )
+
+
+_LOTES_FAKE = None
+
+
+def obter_cliente_lotes(anthropic_client):
+    """client.beta.messages.batches, ou o lote falso com AUDITORIA_LOTE_BACKEND=fake"""
+    global _LOTES_FAKE
+    if AUDITORIA_LOTE_BACKEND == 'fake':
+        if _LOTES_FAKE is None:
+            _LOTES_FAKE = LotesFake()
+        return _LOTES_FAKE
+    return anthropic_client.beta.messages.batches
+
+
+# ============================================================================
+# LOTE PENDENTE (JSON)
+# ============================================================================
+
+def carregar_lote_pendente():
+    """{'lote_id', 'enviado_em', 'itens': {custom_id: metadados}} ou None"""
+    if not os.path.exists(LOTE_AUDITORIA_FILE):
+        return None
+    try:
+        with open(LOTE_AUDITORIA_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"  Erro ao ler {LOTE_AUDITORIA_FILE}: {e}")
+        return None
+
+
+def salvar_lote_pendente(lote):
+    with open(LOTE_AUDITORIA_FILE, 'w', encoding='utf-8') as f:
+        json.dump(lote, f, ensure_ascii=False, indent=2)
+
+
+def limpar_lote_pendente():
+    if os.path.exists(LOTE_AUDITORIA_FILE):
+        os.remove(LOTE_AUDITORIA_FILE)
+
+
+# ============================================================================
+# ENVIO, ESPERA E RESULTADOS
+# ============================================================================
+
+def enviar_lote(cliente_lotes, itens):
+    """
+    Envia um lote e registra em LOTE_AUDITORIA_FILE
+
+    Args:
+        itens: Lista de (params de messages.create, metadados para processar o resultado)
+
+    Returns:
+        Lote registrado (mesmo formato de carregar_lote_pendente)
+    """
+    # custom_id só aceita [a-zA-Z0-9_-] (IDs do armazenamento local são caminhos)
+    requisicoes = []
+    metadados = {}
+    for i, (params, meta) in enumerate(itens):
+        custom_id = f"auditoria-{i:05d}"
+        requisicoes.append({'custom_id': custom_id, 'params': params})
+        metadados[custom_id] = meta
+
+    lote = cliente_lotes.create(requests=requisicoes)
+    registro = {
+        'lote_id': lote.id,
+        'enviado_em': datetime.now().isoformat(),
+        'itens': metadados,
+    }
+    salvar_lote_pendente(registro)
+    print(f"     Lote {lote.id} enviado: {len(requisicoes)} auditoria(s)")
+    return registro
+
+
+def aguardar_lote(cliente_lotes, lote_id, intervalo=AUDITORIA_LOTE_INTERVALO_SEG,
+                  espera_max=AUDITORIA_LOTE_ESPERA_MAX_SEG):
+    """
+    Consulta o lote até terminar
+
+    Returns:
+        True se terminou, False se a espera acabou antes (o lote segue na API)
+    """
+    inicio = time.time()
+    while True:
+        lote = cliente_lotes.retrieve(lote_id)
+        contagem = lote.request_counts
+        print(f"     Lote {lote_id}: {lote.processing_status} "
+              f"({contagem.succeeded} ok, {contagem.errored} erro(s), {contagem.processing} em andamento)")
+        if lote.processing_status == 'ended':
+            return True
+        if time.time() - inicio + intervalo > espera_max:
+            print(f"     Lote ainda em processamento, será retomado na próxima execução")
+            return False
+        time.sleep(intervalo)
+
+
+def iterar_resultados(cliente_lotes, lote_id):
+    """
+    Resultados do lote terminado
+
+    Yields:
+        (custom_id, texto da resposta ou None, descrição do erro ou None)
+    """
+    for item in cliente_lotes.results(lote_id):
+        resultado = item.result
+        if resultado.type == 'succeeded':
+            yield item.custom_id, resultado.message.content[0].text, None
+        elif resultado.type == 'errored':
+            yield item.custom_id, None, str(getattr(resultado, 'error', 'erro'))
+        else:
+            # canceled / expired
+            yield item.custom_id, None, resultado.type
@@ -0,0 +1,201 @@
+"""
+BENCHMARK OFFLINE DAS ETAPAS DE DRIVE
+Monta uma árvore de clientes falsa em disco, aponta o sistema para o Drive
+falso (DRIVE_BACKEND=fake, ver drive_fake.py) ou, com --backend local, para o
+armazenamento em disco (ARMAZENAMENTO_BACKEND=local, ver armazenamento.py)
+e mede, sem rede:
+  - etapas de Drive do agente_gerador / processar_geracao_manual
+    (clientes processados, listagem de pastas, listagem recursiva,
+    classificação, busca da pasta do cliente, downloads do prompt em paralelo)
+  - endpoints do dashboard (/api/stats, /api/detailed-stats)
+
+A geração com a IA não entra na medição (só o I/O de Drive).
+
+Uso:
+    python benchmark_drive.py --clientes 30 --arquivos 12 --latencia-ms 80
+    python benchmark_drive.py --clientes 30 --arquivos 12 --backend local
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+NOMES_DOCUMENTOS = [
+    'procuracao.pdf', 'rg.pdf', 'cpf.pdf', 'ctps.pdf', 'comprovante_residencia.pdf',
+    'holerite_01.pdf', 'holerite_02.pdf', 'extrato_fgts.pdf', 'contrato_trabalho.pdf',
+    'print_whatsapp_01.jpg', 'print_whatsapp_02.jpg', 'cat.pdf', 'atestado_medico.pdf',
+    'laudo_medico.pdf', 'termo_rescisao.pdf', 'declaracao_hipossuficiencia.pdf',
+]
+
+PASTAS_TIPOS = {
+    'PASTA_RECONHECIMENTO_VINCULO': 'CLIENTES/RECONHECIMENTO_VINCULO',
+    'PASTA_ACAO_ACIDENTARIA': 'CLIENTES/ACAO_ACIDENTARIA',
+    'PASTA_DIFERENCAS_CONTRATUAIS': 'CLIENTES/DIFERENCAS_CONTRATUAIS',
+}
+PASTAS_FIXAS = {
+    'PASTA_CLIENTES': 'CLIENTES',
+    'PASTA_PETICOES_VINCULO': 'PETICOES/02_GERADAS/RECONHECIMENTO_VINCULO',
+    'PASTA_PETICOES_ACIDENTARIA': 'PETICOES/02_GERADAS/ACAO_ACIDENTARIA',
+    'PASTA_PETICOES_DIFERENCAS': 'PETICOES/02_GERADAS/DIFERENCAS_CONTRATUAIS',
+    'PASTA_03_APROVADAS': 'PETICOES/03_APROVADAS',
+    'PASTA_04_REJEITADAS': 'PETICOES/04_REJEITADAS',
+}
+
+
+def montar_arvore(diretorio, clientes, arquivos, tamanho_kb):
+    """Cria CLIENTES/<tipo>/<cliente>/<documentos> com conteúdo aleatório"""
+    for caminho in list(PASTAS_TIPOS.values()) + list(PASTAS_FIXAS.values()):
+        os.makedirs(os.path.join(diretorio, *caminho.split('/')), exist_ok=True)
+    tipos = list(PASTAS_TIPOS.values())
+    for i in range(clientes):
+        pasta = os.path.join(diretorio, *tipos[i % len(tipos)].split('/'), f"Cliente Teste {i:04d}")
+        os.makedirs(pasta, exist_ok=True)
+        for j in range(arquivos):
+            nome = NOMES_DOCUMENTOS[j % len(NOMES_DOCUMENTOS)]
+            if j >= len(NOMES_DOCUMENTOS):
+                base, ext = os.path.splitext(nome)
+                nome = f"{base}_{j}{ext}"
+            with open(os.path.join(pasta, nome), 'wb') as f:
+                f.write(os.urandom(tamanho_kb * 1024))
+
+
+def medir(nome, funcao, repeticoes, resultados):
+    tempos = []
+    retorno = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        retorno = funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    p95 = tempos[min(len(tempos) - 1, int(round(0.95 * (len(tempos) - 1))))]
+    resultados.append((nome, statistics.median(tempos), p95))
+    print(f"   {nome:<42} mediana {statistics.median(tempos):9.1f} ms   p95 {p95:9.1f} ms")
+    return retorno
+
+
+def requisitar(cliente_http, url, falhas):
+    """GET no dashboard; respostas diferentes de 200 vão para falhas (não são tempo válido)"""
+    resposta = cliente_http.get(url)
+    if resposta.status_code != 200:
+        falhas.append((url, resposta.status_code, resposta.get_data(as_text=True)[:200]))
+    return resposta
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark das etapas de Drive sobre o Drive falso')
+    parser.add_argument('--clientes', type=int, default=30)
+    parser.add_argument('--arquivos', type=int, default=12, help='Arquivos por cliente')
+    parser.add_argument('--tamanho-kb', type=int, default=256, help='Tamanho de cada arquivo')
+    parser.add_argument('--latencia-ms', type=float, default=0, help='Latência injetada por requisição')
+    parser.add_argument('--banda-mbps', type=float, default=0, help='Banda simulada (0 = sem limite)')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--diretorio', help='Árvore existente (senão cria uma temporária)')
+    parser.add_argument('--backend', choices=['fake', 'local'], default='fake',
+                        help='fake = Drive falso (mesmo caminho de código do Drive), local = armazenamento em disco')
+    args = parser.parse_args()
+
+    temporario = tempfile.mkdtemp(prefix='benchmark_drive_')
+    diretorio = args.diretorio or os.path.join(temporario, 'drive')
+    if not args.diretorio:
+        montar_arvore(diretorio, args.clientes, args.arquivos, args.tamanho_kb)
+
+    # Precisa estar no ambiente antes de importar os módulos do sistema
+    os.environ.update({
+        'DRIVE_BACKEND': 'fake',
+        'DRIVE_FAKE_DIR': diretorio,
+        'ARMAZENAMENTO_BACKEND': 'local' if args.backend == 'local' else 'drive',
+        'ARMAZENAMENTO_LOCAL_DIR': diretorio,
+        'DRIVE_FAKE_LATENCIA_MS': str(args.latencia_ms),
+        'DRIVE_FAKE_BANDA_MBPS': str(args.banda_mbps),
+        'INDICE_DRIVE_DB': os.path.join(temporario, 'indice_drive.db'),
+        'CACHE_DOWNLOADS_DIR': os.path.join(temporario, 'cache_downloads'),
+        'CACHE_PASTAS_ARQUIVO': os.path.join(temporario, 'cache_pastas.json'),
+    })
+    from drive_fake import id_do_caminho
+    for variavel, caminho in {**PASTAS_TIPOS, **PASTAS_FIXAS}.items():
+        # No armazenamento local o ID é o próprio caminho relativo
+        os.environ[variavel] = caminho if args.backend == 'local' else id_do_caminho(caminho)
+    os.environ.setdefault('ANTHROPIC_API_KEY', 'benchmark')
+
+    import main_v10_fase3 as worker
+    import dashboard_server
+    from limitador_drive import estatisticas_drive
+
+    print(f"\n{'='*70}")
+    print(f"  BENCHMARK {args.backend.upper()}: {args.clientes} clientes x {args.arquivos} arquivos "
+          f"de {args.tamanho_kb} KB, latência {args.latencia_ms} ms")
+    print(f"{'='*70}\n")
+
+    service = worker.autenticar_google_drive()
+    armazenamento = worker.obter_armazenamento(service)
+    pastas_tipos = [os.environ[v] for v in PASTAS_TIPOS]
+    resultados = []
+
+    medir('índice: semeadura + sincronização',
+          lambda: worker.obter_indice_drive(service, forcar_sincronizacao=True), 1, resultados)
+    medir('listar_clientes_processados',
+          lambda: armazenamento.listar_clientes_processados(pastas_tipos), args.repeticoes, resultados)
+    clientes = medir('listar_pastas (3 tipos)',
+                     lambda: [p for t in pastas_tipos for p in worker.listar_pastas(service, t)],
+                     args.repeticoes, resultados)
+    if not clientes:
+        print("   Nenhum cliente encontrado na árvore")
+        return 1
+
+    alvo = clientes[len(clientes) // 2]
+    arquivos = medir('listar_arquivos_recursivo (1 cliente)',
+                     lambda: worker.listar_arquivos_recursivo(service, alvo['id']), args.repeticoes, resultados)
+    medir('buscar_pasta_cliente',
+          lambda: armazenamento.buscar_pasta_cliente(alvo['name']), args.repeticoes, resultados)
+
+    def classificar():
+        docs = []
+        for arq in arquivos:
+            classif = worker.classificar_documento(arq['name'])
+            if classif['prioridade'] != 'IGNORAR':
+                docs.append({'id': arq['id'], 'nome': arq['name'], 'tipo': classif['tipo'],
+                             'prioridade': classif['prioridade'], 'versao': arq.get('versao'),
+                             'mimeType': arq.get('mimeType')})
+        return docs
+    docs = medir('classificar_documento (1 cliente)', classificar, args.repeticoes, resultados)
+
+    cache = worker.obter_cache_downloads()
+    if cache:
+        shutil.rmtree(cache.diretorio, ignore_errors=True)
+        os.makedirs(cache.diretorio, exist_ok=True)
+        cache.total_bytes = 0
+
+    def baixar_para_prompt():
+        # Só o download do que vai para o prompt (a extração de texto/imagem não entra)
+        documentos = worker.criar_documentos_sob_demanda(service, docs)
+        worker.preparar_documentos_em_paralelo([d for d in documentos if d.vai_para_prompt])
+        return documentos
+    medir('downloads sob demanda do prompt (frio)', baixar_para_prompt, 1, resultados)
+    medir('downloads sob demanda do prompt (cache)', baixar_para_prompt, args.repeticoes, resultados)
+
+    cliente_http = dashboard_server.app.test_client()
+    falhas = []
+    for url in ('/api/stats', '/api/detailed-stats'):
+        medir(f'GET {url}', lambda: requisitar(cliente_http, url, falhas), args.repeticoes, resultados)
+
+    print(f"\n   Chamadas ao Drive (falso) por endpoint:")
+    for endpoint, valores in estatisticas_drive().items():
+        print(f"     {endpoint:<36} {valores['chamadas']:6d} chamadas  {valores['tempo_total_seg']:8.3f} s")
+
+    shutil.rmtree(temporario, ignore_errors=True)
+
+    if falhas:
+        # Tempo de uma resposta de erro não mede o endpoint: o benchmark falha
+        print(f"\n   [ERRO] {len(falhas)} requisição(ões) ao dashboard sem status 200:")
+        for url, status, corpo in falhas:
+            print(f"     {url} -> {status}: {corpo}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
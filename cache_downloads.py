@@ -0,0 +1,229 @@
+"""
+CACHE LOCAL DE DOWNLOADS DO GOOGLE DRIVE
+Guarda em disco o conteúdo dos arquivos baixados, chaveado por ID + versão
+(md5Checksum ou, para arquivos nativos do Google, modifiedTime).
+
+Arquivo sem alteração no Drive nunca é baixado duas vezes: regeneração com
+forcar_geracao, auditoria da petição recém-enviada e o modelo baixado em
+carregar_modelo_peticao/salvar_peticao_no_drive saem do cache.
+
+O tamanho total é limitado (CACHE_DOWNLOADS_MAX_MB); ao estourar, os arquivos
+usados há mais tempo são removidos (LRU pela data de modificação, que é
+atualizada a cada acerto).
+"""
+
+import os
+import shutil
+import hashlib
+import threading
+from dotenv import load_dotenv
+from limitador_drive import executar_drive
+
+load_dotenv()
+
+CACHE_DOWNLOADS_ATIVO = os.getenv('CACHE_DOWNLOADS_ATIVO', '1') == '1'
+CACHE_DOWNLOADS_DIR = os.getenv('CACHE_DOWNLOADS_DIR', 'cache_downloads')
+CACHE_DOWNLOADS_MAX_MB = int(os.getenv('CACHE_DOWNLOADS_MAX_MB', '1024'))
+
+# Ao despejar, libera espaço até ficar nesta fração do limite
+FRACAO_APOS_DESPEJO = 0.9
+
+
+def versao_drive(arquivo):
+    """
+    Extrai a versão de um item do Drive (md5Checksum ou modifiedTime)
+
+    Returns:
+        String da versão ou None se o item não trouxe esses campos
+    """
+    if not arquivo:
+        return None
+    if arquivo.get('md5Checksum'):
+        return f"md5:{arquivo['md5Checksum']}"
+    if arquivo.get('modifiedTime'):
+        return f"mod:{arquivo['modifiedTime']}"
+    return None
+
+
+def obter_versao_drive(service, file_id):
+    """Consulta só os metadados de versão de um arquivo (chamada leve, sem conteúdo)"""
+    meta = executar_drive(service.files().get(fileId=file_id, fields='md5Checksum, modifiedTime'))
+    return versao_drive(meta)
+
+
+class CacheDownloads:
+    """Cache em disco com despejo LRU e contadores de acerto/falha"""
+
+    def __init__(self, diretorio=CACHE_DOWNLOADS_DIR, max_bytes=CACHE_DOWNLOADS_MAX_MB * 1024 * 1024):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.despejos = 0
+        os.makedirs(self.diretorio, exist_ok=True)
+        self.total_bytes = sum(tamanho for _, _, tamanho in self._listar_entradas())
+
+    def _pasta_arquivo(self, file_id):
+        """Cada arquivo do Drive tem uma pasta; dentro dela, um arquivo por versão"""
+        chave = hashlib.sha1(file_id.encode('utf-8')).hexdigest()
+        return os.path.join(self.diretorio, chave[:2], chave)
+
+    def _caminho(self, file_id, versao):
+        nome = hashlib.sha1(versao.encode('utf-8')).hexdigest()
+        return os.path.join(self._pasta_arquivo(file_id), nome)
+
+    def _listar_entradas(self):
+        """Lista (caminho, mtime, tamanho) de todas as entradas do cache"""
+        entradas = []
+        for raiz, _, arquivos in os.walk(self.diretorio):
+            for nome in arquivos:
+                if nome.endswith('.tmp'):
+                    continue
+                caminho = os.path.join(raiz, nome)
+                try:
+                    st = os.stat(caminho)
+                except OSError:
+                    continue
+                entradas.append((caminho, st.st_mtime, st.st_size))
+        return entradas
+
+    def abrir(self, file_id, versao):
+        """
+        Abre a entrada do cache para leitura (sem carregar tudo na memória)
+
+        Returns:
+            Arquivo aberto em modo 'rb' (quem chama fecha) ou None se não houver entrada
+        """
+        caminho = self._caminho(file_id, versao)
+        try:
+            f = open(caminho, 'rb')
+            os.utime(caminho, None)  # marca como usado recentemente (LRU)
+        except OSError:
+            with self.lock:
+                self.falhas += 1
+            return None
+        with self.lock:
+            self.acertos += 1
+        return f
+
+    def obter(self, file_id, versao):
+        """
+        Busca o conteúdo no cache
+
+        Returns:
+            bytes se houver entrada para essa versão, senão None
+        """
+        f = self.abrir(file_id, versao)
+        if f is None:
+            return None
+        with f:
+            return f.read()
+
+    def guardar(self, file_id, versao, conteudo):
+        """Grava o conteúdo e remove versões antigas do mesmo arquivo"""
+        if conteudo is None or len(conteudo) > self.max_bytes:
+            return
+        self._gravar(file_id, versao, len(conteudo), lambda destino: destino.write(conteudo))
+
+    def guardar_stream(self, file_id, versao, origem, tamanho):
+        """
+        Igual a guardar, copiando de um arquivo aberto em blocos
+
+        A posição de origem não é restaurada; quem chama faz o seek se precisar.
+        """
+        if tamanho > self.max_bytes:
+            return
+        self._gravar(file_id, versao, tamanho, lambda destino: shutil.copyfileobj(origem, destino, 1024 * 1024))
+
+    def _gravar(self, file_id, versao, tamanho, escrever):
+        """
+        Escreve a entrada em um .tmp fora do lock (downloads paralelos não
+        esperam a cópia uns dos outros); o lock cobre só a troca do arquivo,
+        a limpeza de versões, o total de bytes e o despejo
+        """
+        pasta = self._pasta_arquivo(file_id)
+        caminho = self._caminho(file_id, versao)
+        os.makedirs(pasta, exist_ok=True)
+        tmp = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                escrever(f)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+        with self.lock:
+            # Versões antigas deste arquivo não serão mais pedidas
+            for nome in os.listdir(pasta):
+                antigo = os.path.join(pasta, nome)
+                if antigo != caminho and not nome.endswith('.tmp'):
+                    try:
+                        self.total_bytes -= os.path.getsize(antigo)
+                        os.remove(antigo)
+                    except OSError:
+                        pass
+
+            anterior = os.path.getsize(caminho) if os.path.exists(caminho) else 0
+            os.replace(tmp, caminho)  # escrita atômica
+            self.total_bytes += tamanho - anterior
+
+            if self.total_bytes > self.max_bytes:
+                self._despejar()
+
+    def _despejar(self):
+        """Remove as entradas menos usadas até caber no limite (chamado com o lock)"""
+        alvo = self.max_bytes * FRACAO_APOS_DESPEJO
+        for caminho, _, tamanho in sorted(self._listar_entradas(), key=lambda e: e[1]):
+            if self.total_bytes <= alvo:
+                break
+            try:
+                os.remove(caminho)
+                self.total_bytes -= tamanho
+                self.despejos += 1
+            except OSError:
+                pass
+
+    def estatisticas(self):
+        """Contadores do cache (para logs e dashboard)"""
+        with self.lock:
+            consultas = self.acertos + self.falhas
+            return {
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': round(self.acertos / consultas, 3) if consultas else 0.0,
+                'despejos': self.despejos,
+                'total_mb': round(self.total_bytes / (1024 * 1024), 2),
+                'limite_mb': round(self.max_bytes / (1024 * 1024), 2),
+            }
+
+
+# ============================================================================
+# INSTÂNCIA COMPARTILHADA DO PROCESSO
+# ============================================================================
+
+_CACHE = None
+_LOCK_CACHE = threading.Lock()
+
+
+def obter_cache_downloads():
+    """
+    Retorna o cache do processo (criado na primeira chamada)
+
+    Returns:
+        CacheDownloads ou None se desativado (CACHE_DOWNLOADS_ATIVO=0)
+    """
+    global _CACHE
+    if not CACHE_DOWNLOADS_ATIVO:
+        return None
+    with _LOCK_CACHE:
+        if _CACHE is None:
+            try:
+                _CACHE = CacheDownloads()
+            except Exception as e:
+                print(f"[CACHE] Não foi possível iniciar o cache de downloads ({e}), baixando sempre do Drive")
+                return None
+        return _CACHE
@@ -0,0 +1,137 @@
+"""
+CACHE DOS MODELOS DE PETIÇÃO (MODELOS_IDS)
+Cada modelo é baixado e interpretado uma vez por revisão do Drive:
+  - texto extraído (usado no prompt por carregar_modelo_peticao)
+  - pacote .docx com o corpo removido, só cabeçalho/rodapé/estilos
+    (base do documento em salvar_peticao_no_drive)
+
+A entrada é validada contra a versão do armazenamento (headRevisionId/
+md5Checksum no Drive, data de modificação e tamanho no disco local); a
+consulta de versão é refeita no máximo a cada CACHE_MODELOS_REVALIDAR_SEG
+segundos.
+Cada petição recebe um clone novo aberto a partir do pacote em memória.
+"""
+
+import io
+import os
+import time
+import threading
+from docx import Document
+from dotenv import load_dotenv
+from armazenamento import obter_armazenamento
+
+load_dotenv()
+
+CACHE_MODELOS_REVALIDAR_SEG = int(os.getenv('CACHE_MODELOS_REVALIDAR_SEG', '60'))
+
+
+def remover_corpo_documento(doc):
+    """
+    Remove parágrafos e tabelas do corpo, mantendo cabeçalho, rodapé e estilos
+
+    O sectPr (configuração de página e referências ao cabeçalho/rodapé)
+    não é parágrafo nem tabela, então permanece.
+    """
+    for table in doc.tables:
+        table._element.getparent().remove(table._element)
+    for _ in range(len(doc.paragraphs)):
+        p = doc.paragraphs[0]
+        p._element.getparent().remove(p._element)
+    return doc
+
+
+class CacheModelos:
+    """Modelos interpretados em memória, por ID, com a versão do armazenamento"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entradas = {}
+        self.locks_modelo = {}
+
+    def _lock_modelo(self, modelo_id):
+        with self.lock:
+            return self.locks_modelo.setdefault(modelo_id, threading.Lock())
+
+    def obter(self, service, modelo_id):
+        """
+        Retorna a entrada do modelo, baixando/interpretando só se a revisão mudou
+
+        Args:
+            service: Google Drive service ou ArmazenamentoLocal
+            modelo_id: ID do modelo (no modo local, caminho relativo)
+
+        Returns:
+            Dict com 'texto', 'pacote' (bytes do .docx sem corpo) e 'versao', ou None
+        """
+        with self._lock_modelo(modelo_id):
+            entrada = self.entradas.get(modelo_id)
+            if entrada and time.monotonic() - entrada['validado_em'] < CACHE_MODELOS_REVALIDAR_SEG:
+                return entrada
+
+            armazenamento = obter_armazenamento(service)
+            versao = armazenamento.versao(modelo_id)
+            if entrada and versao and entrada['versao'] == versao:
+                entrada['validado_em'] = time.monotonic()
+                return entrada
+
+            conteudo = armazenamento.ler(modelo_id, versao)
+            if not conteudo:
+                return None
+
+            doc = Document(io.BytesIO(conteudo))
+            texto = "\n".join([p.text for p in doc.paragraphs])
+            remover_corpo_documento(doc)
+            pacote = io.BytesIO()
+            doc.save(pacote)
+
+            entrada = {
+                'versao': versao,
+                'texto': texto,
+                'pacote': pacote.getvalue(),
+                'validado_em': time.monotonic(),
+            }
+            self.entradas[modelo_id] = entrada
+            print(f"    [MODELOS] Modelo {modelo_id[:20]}... carregado ({versao})")
+            return entrada
+
+    def texto(self, service, modelo_id):
+        """Texto do modelo (ou None)"""
+        entrada = self.obter(service, modelo_id)
+        return entrada['texto'] if entrada else None
+
+    def novo_documento(self, service, modelo_id):
+        """
+        Documento novo com cabeçalho/rodapé do modelo e corpo vazio
+
+        Returns:
+            Document independente (pode ser alterado à vontade) ou None
+        """
+        entrada = self.obter(service, modelo_id)
+        if not entrada:
+            return None
+        return Document(io.BytesIO(entrada['pacote']))
+
+    def invalidar(self, modelo_id=None):
+        """Descarta um modelo (ou todos), forçando nova consulta da versão"""
+        with self.lock:
+            if modelo_id is None:
+                self.entradas.clear()
+            else:
+                self.entradas.pop(modelo_id, None)
+
+
+# ============================================================================
+# INSTÂNCIA COMPARTILHADA DO PROCESSO
+# ============================================================================
+
+_CACHE = None
+_LOCK_CACHE = threading.Lock()
+
+
+def obter_cache_modelos():
+    """Retorna o cache de modelos do processo (criado na primeira chamada)"""
+    global _CACHE
+    with _LOCK_CACHE:
+        if _CACHE is None:
+            _CACHE = CacheModelos()
+        return _CACHE
@@ -0,0 +1,179 @@
+"""
+GERENCIADOR DE CREDENCIAIS DO GOOGLE DRIVE
+Uma única cópia das credenciais por processo, renovada antes de expirar, e um
+Drive service por thread (httplib2 não é thread-safe).
+
+Usado pelo worker (main_v10_fase3.py) e pelo dashboard (dashboard_server.py):
+o token.json é lido uma vez e o service não é reconstruído a cada chamada.
+O service é montado com o documento de discovery que já vem no
+google-api-python-client (static_discovery), sem buscar na rede.
+As requisições dos services de todas as threads passam pelo mesmo pool de
+conexões httpx (transporte_http.py), com keep-alive e HTTP/2 quando disponível.
+DRIVE_BACKEND=fake troca o Drive real pelo Drive falso local (drive_fake.py).
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
+from dotenv import load_dotenv
+from transporte_http import obter_http_drive
+
+load_dotenv()
+
+SCOPES = ['https://www.googleapis.com/auth/drive']
+
+CAMINHO_TOKEN = 'token.json'
+CAMINHO_CREDENTIALS = 'credentials.json'
+
+# Renova o token quando faltar menos que isso para expirar (segundos)
+MARGEM_RENOVACAO_SEG = int(os.getenv('CREDENCIAIS_MARGEM_RENOVACAO_SEG', '300'))
+
+
+class GerenciadorCredenciais:
+    """Credenciais em memória com renovação antecipada e services por thread"""
+
+    def __init__(self, caminho_token=CAMINHO_TOKEN, permitir_login=False):
+        """
+        Args:
+            caminho_token: Arquivo do token OAuth
+            permitir_login: Se True, abre o login no navegador (porta 8080) quando
+                não houver token válido (worker local). O dashboard não faz isso.
+        """
+        self.caminho_token = caminho_token
+        self.permitir_login = permitir_login
+        self.creds = None
+        self.lock = threading.Lock()
+        self._local = threading.local()
+
+    def _carregar_token(self):
+        # Em deploy o token pode vir da variável de ambiente
+        if not os.path.exists(self.caminho_token) and os.getenv('GOOGLE_DRIVE_TOKEN_JSON'):
+            print("📝 Criando token.json a partir da variável de ambiente...")
+            with open(self.caminho_token, 'w') as f:
+                f.write(os.getenv('GOOGLE_DRIVE_TOKEN_JSON'))
+
+        if not os.path.exists(self.caminho_token):
+            print(f"    [AUTH] {self.caminho_token} NÃO encontrado.")
+            return None
+        try:
+            return Credentials.from_authorized_user_file(self.caminho_token, SCOPES)
+        except Exception as e:
+            print(f"    [AUTH] Erro ao ler {self.caminho_token}: {e}")
+            return None
+
+    def _salvar_token(self):
+        try:
+            with open(self.caminho_token, 'w') as token:
+                token.write(self.creds.to_json())
+        except Exception as e:
+            print(f"    [AUTH] Não foi possível salvar {self.caminho_token}: {e}")
+
+    def _login_navegador(self):
+        if not self.permitir_login:
+            return None
+        if not os.path.exists(CAMINHO_CREDENTIALS):
+            print(f"    [AUTH] CRÍTICO: {CAMINHO_CREDENTIALS} não encontrado para iniciar login!")
+            return None
+        print(f"    [AUTH] Sem credenciais válidas. Iniciando login via browser...")
+        flow = InstalledAppFlow.from_client_secrets_file(CAMINHO_CREDENTIALS, SCOPES)
+        return flow.run_local_server(port=8080)
+
+    def _precisa_renovar(self):
+        if not self.creds.valid:
+            return True
+        # expiry do google-auth é UTC sem fuso
+        expiry = getattr(self.creds, 'expiry', None)
+        return expiry is not None and expiry - datetime.utcnow() < timedelta(seconds=MARGEM_RENOVACAO_SEG)
+
+    def obter_credenciais(self):
+        """
+        Retorna as credenciais do processo, renovando antes de expirar
+
+        Returns:
+            Credentials ou None se não for possível autenticar
+        """
+        with self.lock:
+            if self.creds is None:
+                self.creds = self._carregar_token()
+
+            if self.creds is not None and self._precisa_renovar():
+                if self.creds.refresh_token:
+                    try:
+                        self.creds.refresh(Request())
+                        self._salvar_token()
+                    except Exception as e:
+                        print(f"    [AUTH] Falha no refresh ({e})")
+                        if not self.creds.valid:
+                            self.creds = None
+                elif not self.creds.valid:
+                    self.creds = None
+
+            if self.creds is None:
+                self.creds = self._login_navegador()
+                if self.creds is not None:
+                    self._salvar_token()
+
+            return self.creds
+
+    def obter_service(self):
+        """
+        Drive service da thread atual (criado uma vez por thread)
+
+        As credenciais são compartilhadas: a renovação feita por uma thread vale
+        para os services de todas.
+        """
+        creds = self.obter_credenciais()
+        if creds is None:
+            return None
+        if getattr(self._local, 'creds', None) is not creds:
+            http = obter_http_drive()
+            if http is not None:
+                # Pool compartilhado: o service da thread é só o invólucro com as credenciais
+                self._local.service = build(
+                    'drive', 'v3', http=AuthorizedHttp(creds, http=http),
+                    static_discovery=True, cache_discovery=False
+                )
+            else:
+                self._local.service = build(
+                    'drive', 'v3', credentials=creds,
+                    static_discovery=True, cache_discovery=False
+                )
+            self._local.creds = creds
+        return self._local.service
+
+
+# ============================================================================
+# INSTÂNCIA COMPARTILHADA DO PROCESSO
+# ============================================================================
+
+_GERENCIADOR = None
+_LOCK_GERENCIADOR = threading.Lock()
+
+
+def obter_gerenciador_credenciais(permitir_login=False):
+    """Retorna o gerenciador do processo (criado na primeira chamada)"""
+    global _GERENCIADOR
+    with _LOCK_GERENCIADOR:
+        if _GERENCIADOR is None:
+            _GERENCIADOR = GerenciadorCredenciais(permitir_login=permitir_login)
+        elif permitir_login:
+            _GERENCIADOR.permitir_login = True
+        return _GERENCIADOR
+
+
+def obter_service_drive(permitir_login=False):
+    """
+    Atalho: Drive service da thread atual, ou None se não autenticado
+
+    Com DRIVE_BACKEND=fake devolve o Drive falso sobre DRIVE_FAKE_DIR
+    (drive_fake.py), para benchmarks e testes de carga sem rede.
+    """
+    if os.getenv('DRIVE_BACKEND', 'google').lower() == 'fake':
+        from drive_fake import obter_drive_fake
+        return obter_drive_fake()
+    return obter_gerenciador_credenciais(permitir_login).obter_service()
@@ -9,15 +9,15 @@ from datetime import datetime, timedelta
 import os
 import json
 from dotenv import load_dotenv
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
+from googleapiclient.http import MediaIoBaseUpload
 import io
 from docx import Document
 import tempfile
 import subprocess
 import re
+from limitador_drive import executar_drive, estatisticas_drive
+from drive_utils import iterar_arquivos_drive, completar_metadados, esquecer_pasta, pastas_peticoes_geradas
+from armazenamento import obter_armazenamento, obter_service_armazenamento
 
 load_dotenv()
 
@@ -33,7 +33,6 @@ def add_header(response):
 
 
 
-SCOPES = ['https://www.googleapis.com/auth/drive']
 HISTORICO_FILE = 'historico_peticoes.json'
 
 def carregar_historico():
@@ -47,47 +46,39 @@ def carregar_historico():
         return []
 
 def autenticar_google_drive():
-    """Autentica com Google Drive"""
+    """
+    Autentica com Google Drive (service da thread, credenciais compartilhadas no processo)
+    
+    Com ARMAZENAMENTO_BACKEND=local devolve o armazenamento em disco (ver armazenamento.py)
+    """
     try:
-        # Tentar recuperar token da variável de ambiente se o arquivo não existir
-        if not os.path.exists('token.json') and os.getenv('GOOGLE_DRIVE_TOKEN_JSON'):
-            print("📝 Criando token.json a partir da variável de ambiente...")
-            with open('token.json', 'w') as f:
-                f.write(os.getenv('GOOGLE_DRIVE_TOKEN_JSON'))
-
-        creds = None
-        if os.path.exists('token.json'):
-            creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-            
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-                with open('token.json', 'w') as token:
-                    token.write(creds.to_json())
-                    
-        if creds:
-            return build('drive', 'v3', credentials=creds)
-        return None
+        return obter_service_armazenamento()
     except Exception as e:
         print(f"⚠️ Erro ao autenticar Google Drive: {e}")
         return None
 
+def iterar_arquivos_pasta(service, pasta_id):
+    """Gerador sobre os arquivos de uma pasta (todas as páginas, sob demanda)"""
+    # No Drive, pastas da árvore CLIENTES são respondidas pelo índice local
+    return obter_armazenamento(service).iterar_arquivos(
+        pasta_id, "id, name, createdTime, modifiedTime, webViewLink"
+    )
+
 def listar_arquivos_pasta(service, pasta_id):
     """Lista arquivos em uma pasta"""
     try:
-        query = f"'{pasta_id}' in parents and trashed=false and mimeType != 'application/vnd.google-apps.folder'"
-        results = service.files().list(
-            q=query,
-            fields="files(id, name, createdTime, modifiedTime)",
-            pageSize=1000
-        ).execute()
-        return results.get('files', [])
+        return list(iterar_arquivos_pasta(service, pasta_id))
     except Exception as e:
+        # Propaga: uma falha do Drive não pode aparecer como pasta vazia
         print(f"Erro ao listar: {e}")
-        return []
+        raise
+
+def listar_pastas_clientes(service, pasta_tipo_id):
+    """Lista as pastas de clientes de uma pasta de tipo (índice local, Drive ou disco)"""
+    return obter_armazenamento(service).listar_pastas(pasta_tipo_id)
 
 def contar_clientes_processados(service):
-    """Conta clientes que têm _PROCESSADO.txt"""
+    """Conta clientes marcados como processados (appProperties ou _PROCESSADO.txt antigo)"""
     try:
         pastas_tipos = [
             os.getenv('PASTA_RECONHECIMENTO_VINCULO'),
@@ -95,23 +86,13 @@ def contar_clientes_processados(service):
             os.getenv('PASTA_DIFERENCAS_CONTRATUAIS')
         ]
         
+        processados = obter_armazenamento(service).listar_clientes_processados(pastas_tipos)
+        
         total = 0
         for pasta_tipo_id in pastas_tipos:
             if not pasta_tipo_id:
                 continue
-            
-            # Listar pastas de clientes
-            query = f"'{pasta_tipo_id}' in parents and trashed=false and mimeType='application/vnd.google-apps.folder'"
-            results = service.files().list(q=query, fields="files(id)").execute()
-            pastas_clientes = results.get('files', [])
-            
-            # Para cada cliente, verificar se tem _PROCESSADO.txt
-            for pasta_cliente in pastas_clientes:
-                arquivos = listar_arquivos_pasta(service, pasta_cliente['id'])
-                for arq in arquivos:
-                    if arq['name'].strip().upper() == '_PROCESSADO.TXT':
-                        total += 1
-                        break
+            total += sum(1 for p in listar_pastas_clientes(service, pasta_tipo_id) if p['id'] in processados)
         
         return total
     except Exception as e:
@@ -296,11 +277,7 @@ def get_detailed_stats():
             result['total_clientes'] += tipo_data.get('total', 0)
         
         # 02 - PETIÇÕES GERADAS
-        result['peticoes_geradas'] = analisar_pasta_peticoes(service, {
-            'RECONHECIMENTO_VINCULO': '1ya29qkIu8J2O1idmlco9HwSqCFKSsxTm',
-            'ACAO_ACIDENTARIA': '1OE_MFrNmzrDKTQ4iJN30qhMc95cEfI1P',
-            'DIFERENCAS_CONTRATUAIS': '1edqtmAgtZI_B4GvcmXrn8mSRK9DpU-BE'
-        })
+        result['peticoes_geradas'] = analisar_pasta_peticoes(service, pastas_peticoes_geradas())
         
         # 03 - APROVADAS
         pasta_aprovadas = os.getenv('PASTA_03_APROVADAS')
@@ -356,13 +333,15 @@ def analisar_casos_novos(service):
     
     resultado = {}
     
+    # Clientes já processados: uma consulta por pasta de tipo
+    processados_ids = obter_armazenamento(service).listar_clientes_processados(list(tipos_pastas.values()))
+    
     for tipo, pasta_id in tipos_pastas.items():
         if not pasta_id:
             continue
         
         # Listar pastas de clientes
-        query = f"'{pasta_id}' in parents and trashed=false and mimeType='application/vnd.google-apps.folder'"
-        pastas = service.files().list(q=query, fields="files(id, name)").execute().get('files', [])
+        pastas = listar_pastas_clientes(service, pasta_id)
         
         clientes = []
         processados = 0
@@ -370,8 +349,7 @@ def analisar_casos_novos(service):
         
         for pasta_cliente in pastas:
             # Verificar se processado
-            arquivos = listar_arquivos_pasta(service, pasta_cliente['id'])
-            eh_processado = any(a['name'].strip().upper() == '_PROCESSADO.TXT' for a in arquivos)
+            eh_processado = pasta_cliente['id'] in processados_ids
             
             if eh_processado:
                 processados += 1
@@ -383,6 +361,7 @@ def analisar_casos_novos(service):
                 })
             else:
                 # Classificar documentos com sistema expandido
+                arquivos = listar_arquivos_pasta(service, pasta_cliente['id'])
                 docs_presentes = []
                 for arq in arquivos:
                     tipo_doc = classificar_doc_completo(arq['name'])
@@ -531,19 +510,19 @@ def analisar_pasta_peticoes(service, pastas_tipos):
         arquivos = listar_arquivos_pasta(service, pasta_id)
         peticoes = [a for a in arquivos if a['name'].startswith('Peticao_') and a['name'].endswith('.docx')]
         
+        # Link do Drive: já vem na listagem; o que faltar é resolvido em lote
+        try:
+            completar_metadados(service, peticoes, ('webViewLink', 'createdTime'))
+        except Exception as e:
+            print(f"Erro ao resolver metadados das petições: {e}")
+        
         clientes = []
         for pet in peticoes:
             parts = pet['name'].split('_')
             cliente_nome = parts[2] if len(parts) > 2 else 'Desconhecido'
             
-            # Link do Drive
-            try:
-                file_info = service.files().get(fileId=pet['id'], fields='webViewLink,createdTime').execute()
-                link = file_info.get('webViewLink', '')
-                created = file_info.get('createdTime', '')
-            except:
-                link = ''
-                created = ''
+            link = pet.get('webViewLink', '')
+            created = pet.get('createdTime', '')
             
             clientes.append({
                 'nome': cliente_nome,
@@ -697,6 +676,12 @@ def analisar_pasta_final(service, pasta_id):
     arquivos = listar_arquivos_pasta(service, pasta_id)
     peticoes = [a for a in arquivos if a['name'].startswith('Peticao_') and a['name'].endswith('.docx')]
     
+    # Link do Drive: já vem na listagem; o que faltar é resolvido em lote
+    try:
+        completar_metadados(service, peticoes, ('webViewLink',))
+    except Exception as e:
+        print(f"Erro ao resolver metadados das petições: {e}")
+    
     # Agrupar por tipo
     por_tipo = {}
     
@@ -729,11 +714,7 @@ def analisar_pasta_final(service, pasta_id):
         log_data = ler_score_do_log(cliente_nome)
         
         # Link do Drive
-        try:
-            file_info = service.files().get(fileId=pet['id'], fields='webViewLink').execute()
-            link = file_info.get('webViewLink', '')
-        except:
-            link = ''
+        link = pet.get('webViewLink', '')
         
         por_tipo[tipo]['total'] += 1
         por_tipo[tipo]['clientes'].append({
@@ -882,6 +863,11 @@ def health_check():
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/api/drive-stats')
+def drive_stats():
+    """Chamadas, novas tentativas e erros do Drive por endpoint (limitador de cota)"""
+    return jsonify(estatisticas_drive())
+
 @app.route('/api/debug-auth')
 def debug_auth():
     """Endpoint para diagnosticar problemas de autenticação"""
@@ -908,11 +894,11 @@ def debug_auth():
         if service and pasta_id:
             try:
                 folder_test = f"Tentando ler pasta: {pasta_id}"
-                results = service.files().list(
+                results = executar_drive(service.files().list(
                     q=f"'{pasta_id}' in parents",
                     pageSize=10,
                     fields="files(id, name)"
-                ).execute()
+                ))
                 files = results.get('files', [])
                 files_found = [f['name'] for f in files]
                 folder_test = "Sucesso - Arquivos encontrados"
@@ -1034,6 +1020,49 @@ def gerar_cronologia():
             'error': str(e)
         }), 500
 
+@app.route('/api/auditar-peticoes', methods=['POST'])
+def auditar_peticoes():
+    """
+    Endpoint para rodar o agente auditor uma vez sobre as petições pendentes
+    Body opcional: {"modo": "individual" | "lote"} (padrão: AUDITORIA_MODO do worker)
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        modo = data.get('modo')
+        
+        if modo and modo not in ('individual', 'lote'):
+            return jsonify({
+                'success': False,
+                'error': 'modo deve ser "individual" ou "lote"'
+            }), 400
+        
+        if not os.path.exists('flags'):
+            os.makedirs('flags')
+        
+        flag_file = os.path.join("flags", "flag_auditoria.json")
+        
+        with open(flag_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'tipo': 'auditoria',
+                'modo': modo,
+                'timestamp': datetime.now().isoformat()
+            }, f)
+        
+        print(f"✅ Flag de auditoria criada: {flag_file} (modo {modo or 'padrão'})")
+        
+        return jsonify({
+            'success': True,
+            'message': 'Auditoria solicitada. O worker audita as petições pendentes em instantes.',
+            'flag_file': flag_file
+        })
+            
+    except Exception as e:
+        print(f"❌ Erro ao solicitar auditoria: {e}")
+        return jsonify({
+            'success': False, 
+            'error': str(e)
+        }), 500
+
 @app.route('/api/transcrever-video', methods=['POST'])
 def transcrever_video():
     """
@@ -1251,19 +1280,10 @@ def check_status_processamento():
 def criar_pasta_google_drive(service, nome_pasta, pasta_pai_id):
     """Cria uma nova pasta no Google Drive dentro da pasta pai especificada"""
     try:
-        file_metadata = {
-            'name': nome_pasta,
-            'mimeType': 'application/vnd.google-apps.folder',
-            'parents': [pasta_pai_id]
-        }
-        
-        file = service.files().create(
-            body=file_metadata,
-            fields='id'
-        ).execute()
+        pasta_id = obter_armazenamento(service).criar_pasta(nome_pasta, pasta_pai_id)
         
-        print(f"✅ Pasta criada: {nome_pasta} (ID: {file.get('id')})")
-        return file.get('id')
+        print(f"✅ Pasta criada: {nome_pasta} (ID: {pasta_id})")
+        return pasta_id
         
     except Exception as e:
         print(f"❌ Erro ao criar pasta no Drive: {e}")
@@ -1277,16 +1297,11 @@ def salvar_json_drive(service, dados, nome_arquivo, pasta_pai_id):
             'parents': [pasta_pai_id]
         }
         
-        # Converter dict para stream de bytes
+        # Converter dict para bytes
         json_str = json.dumps(dados, indent=4, ensure_ascii=False)
-        fh = io.BytesIO(json_str.encode('utf-8'))
-        media = MediaIoBaseUpload(fh, mimetype='application/json', resumable=True)
-        
-        file = service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
+        file = obter_armazenamento(service).enviar(
+            file_metadata, json_str.encode('utf-8'), 'application/json', campos='id'
+        )
         
         print(f"✅ Arquivo JSON salvo: {nome_arquivo} (ID: {file.get('id')})")
         return file.get('id')
@@ -1306,37 +1321,23 @@ def get_client_metadata():
         print(f"🔍 Buscando metadados para: {nome_cliente}")
         service = autenticar_google_drive()
         
-        # 1. Encontrar pasta do cliente pelo nome
-        query = f"name = '{nome_cliente}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-        results = service.files().list(q=query, fields="files(id, parents)").execute()
-        pastas = results.get('files', [])
+        # 1. Encontrar pasta do cliente pelo nome (só dentro das pastas de tipo)
+        armazenamento = obter_armazenamento(service)
+        pasta_cliente = armazenamento.buscar_pasta_cliente(nome_cliente)
         
-        if not pastas:
+        if not pasta_cliente:
             return jsonify({'success': False, 'error': 'Pasta do cliente não encontrada'}), 404
             
-        # Assumir a primeira pasta encontrada (idealmente filtrar pelo pai correto se houver duplicidade)
-        pasta_id = pastas[0]['id']
+        pasta_id = pasta_cliente['id']
         
         # 2. Buscar dados_cliente.json dentro da pasta
-        query_json = f"'{pasta_id}' in parents and name = 'dados_cliente.json' and trashed = false"
-        results_json = service.files().list(q=query_json, fields="files(id)").execute()
-        arquivos = results_json.get('files', [])
+        arquivo_json = armazenamento.buscar_arquivo(pasta_id, 'dados_cliente.json')
         
-        if not arquivos:
+        if not arquivo_json:
             return jsonify({'success': False, 'error': 'Arquivo de dados não encontrado'}), 404
-            
-        file_id = arquivos[0]['id']
         
         # 3. Baixar conteúdo
-        request_drive = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request_drive)
-        done = False
-        while done is False:
-            status, done = downloader.next_chunk()
-            
-        fh.seek(0)
-        dados = json.load(fh)
+        dados = json.loads(armazenamento.ler(arquivo_json['id']).decode('utf-8'))
         
         return jsonify({
             'success': True,
@@ -1347,6 +1348,44 @@ def get_client_metadata():
         print(f"❌ Erro ao buscar metadados: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/desmarcar-processado', methods=['POST'])
+def desmarcar_processado():
+    """
+    Tira a marcação de processado de um cliente para a petição ser gerada de novo
+    Body: {"cliente_nome": "..."} ou {"pasta_id": "..."}
+    (substitui apagar o _PROCESSADO.txt à mão)
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        cliente_nome = data.get('cliente_nome')
+        pasta_id = data.get('pasta_id')
+        
+        if not cliente_nome and not pasta_id:
+            return jsonify({'success': False, 'error': 'Informe cliente_nome ou pasta_id'}), 400
+        
+        service = autenticar_google_drive()
+        armazenamento = obter_armazenamento(service)
+        
+        if not pasta_id:
+            pasta_cliente = armazenamento.buscar_pasta_cliente(cliente_nome)
+            if not pasta_cliente:
+                return jsonify({'success': False, 'error': 'Pasta do cliente não encontrada'}), 404
+            pasta_id = pasta_cliente['id']
+        
+        marcadores = armazenamento.desmarcar_pasta_processada(pasta_id)
+        print(f"✅ Cliente desmarcado como processado: {cliente_nome or pasta_id} "
+              f"({marcadores} _PROCESSADO.txt removido(s))")
+        
+        return jsonify({
+            'success': True,
+            'message': 'Cliente desmarcado. A petição pode ser gerada novamente.',
+            'pasta_id': pasta_id
+        })
+        
+    except Exception as e:
+        print(f"❌ Erro ao desmarcar cliente: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/drive/folders', methods=['GET'])
 def list_drive_folders():
     """Lista pastas e arquivos do Google Drive"""
@@ -1392,20 +1431,18 @@ def list_drive_folders():
         
         # Listar conteúdo da pasta especificada
         query = f"'{folder_id}' in parents and trashed=false"
-        results = service.files().list(
-            q=query,
-            fields="files(id, name, mimeType, size, modifiedTime, parents)",
-            orderBy="folder,name",
-            pageSize=100
-        ).execute()
-        
-        files = results.get('files', [])
+        files = list(iterar_arquivos_drive(
+            service,
+            query,
+            "id, name, mimeType, size, modifiedTime",
+            orderBy="folder,name"
+        ))
         
         # Buscar nome da pasta atual
-        folder_info = service.files().get(
+        folder_info = executar_drive(service.files().get(
             fileId=folder_id,
             fields="name, parents"
-        ).execute()
+        ))
         
         items = []
         for file in files:
@@ -1470,11 +1507,11 @@ def upload_to_drive():
         )
         
         # Upload do arquivo
-        uploaded_file = service.files().create(
+        uploaded_file = executar_drive(service.files().create(
             body=file_metadata,
             media_body=media,
             fields='id, name, mimeType, size, modifiedTime'
-        ).execute()
+        ))
         
         print(f"✅ Upload concluído: {uploaded_file['name']} (ID: {uploaded_file['id']})")
         
@@ -1530,7 +1567,9 @@ def delete_from_drive():
         service = autenticar_google_drive()
         
         # Mover arquivo para lixeira (soft delete)
-        service.files().delete(fileId=file_id).execute()
+        executar_drive(service.files().delete(fileId=file_id))
+        # Se era uma subpasta do sistema em cache, o id não vale mais
+        esquecer_pasta(file_id)
         
         print(f"✅ Arquivo excluído com sucesso")
         
@@ -0,0 +1,152 @@
+"""
+DEDUPLICAÇÃO DOS ARQUIVOS DO CLIENTE
+Clientes costumam copiar o mesmo arquivo para várias subpastas; sem isto
+cada cópia é baixada, rasterizada e enviada ao Claude.
+
+  - deduplicar_arquivos: antes do download, pelo md5Checksum da listagem
+    do Drive (cópias idênticas byte a byte). Google Docs e arquivos do
+    backend local não têm md5 e passam direto.
+  - deduplicar_imagens (opcional, DEDUP_IMAGENS_DISTANCIA_MAXIMA >= 0):
+    baixando só as imagens, pelo hash perceptual (dHash de 256 bits) entre
+    imagens de mesmas dimensões: o mesmo print recomprimido tem hash a
+    poucos bits de distância. Desligado por padrão: páginas diferentes com
+    o mesmo layout (holerites, CTPS, atestados fotografados) ficam com
+    hashes próximos, e um falso positivo tira um documento da petição.
+    Documentos de prioridade ALTA nunca são descartados.
+
+As duplicatas descartadas vão para o relatório de prints
+(gerar_relatorio_prints, seção ARQUIVOS DUPLICADOS IGNORADOS).
+"""
+
+import io
+import os
+from PIL import Image
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Distância máxima de Hamming (em 256 bits) para duas imagens serem a mesma; -1 desliga (padrão)
+DEDUP_IMAGENS_DISTANCIA_MAXIMA = int(os.getenv('DEDUP_IMAGENS_DISTANCIA_MAXIMA', '-1'))
+
+# Lado da miniatura do dHash (LADO x LADO bits)
+LADO_HASH = 16
+
+EXTENSOES_IMAGEM = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')
+
+
+def deduplicar_arquivos(arquivos):
+    """
+    Remove cópias idênticas (mesmo md5Checksum), mantendo a primeira
+
+    A listagem recursiva vem da raiz para as subpastas, então fica o
+    arquivo mais próximo da raiz.
+
+    Args:
+        arquivos: Resultado de listar_arquivos_recursivo ({'id', 'name', 'md5', ...})
+
+    Returns:
+        (arquivos únicos, lista de duplicatas para o relatório)
+    """
+    vistos = {}
+    unicos = []
+    duplicados = []
+    for arq in arquivos:
+        md5 = arq.get('md5')
+        if md5 and md5 in vistos:
+            original = vistos[md5]
+            duplicados.append({
+                'arquivo': arq['name'],
+                'pasta_origem': arq.get('pasta_origem'),
+                'igual_a': original['name'],
+                'criterio': 'md5',
+            })
+            continue
+        if md5:
+            vistos[md5] = arq
+        unicos.append(arq)
+    return unicos, duplicados
+
+
+def hash_perceptual(conteudo):
+    """
+    dHash de LADO_HASH² bits: compara o brilho de pixels vizinhos em uma
+    miniatura (LADO_HASH+1) x LADO_HASH
+
+    Returns:
+        ((largura, altura), hash), ou None se o conteúdo não for uma imagem legível
+    """
+    try:
+        img = Image.open(io.BytesIO(conteudo))
+        tamanho = img.size
+        # JPEG: decodifica já reduzido (bem mais rápido que a imagem inteira)
+        img.draft('L', (128, 128))
+        pixels = list(img.convert('L').resize((LADO_HASH + 1, LADO_HASH), Image.LANCZOS).getdata())
+    except Exception:
+        return None
+    valor = 0
+    for linha in range(LADO_HASH):
+        for coluna in range(LADO_HASH):
+            esquerda = pixels[linha * (LADO_HASH + 1) + coluna]
+            direita = pixels[linha * (LADO_HASH + 1) + coluna + 1]
+            valor = (valor << 1) | (1 if esquerda > direita else 0)
+    return tamanho, valor
+
+
+def distancia_hash(a, b):
+    """Número de bits diferentes entre dois hashes"""
+    return bin(a ^ b).count('1')
+
+
+def deduplicar_imagens(documentos, obter_conteudo=None, distancia_maxima=DEDUP_IMAGENS_DISTANCIA_MAXIMA):
+    """
+    Remove imagens quase idênticas dos documentos, mantendo a primeira
+
+    Só compara imagens de mesmas dimensões, e documentos de prioridade
+    ALTA são sempre mantidos (servem apenas de original para os demais).
+
+    Args:
+        documentos: Documentos classificados ({'nome', ...})
+        obter_conteudo: Função doc -> bytes (padrão: doc['conteudo']); só é
+            chamada para as imagens
+
+    Returns:
+        (documentos mantidos, lista de duplicatas para o relatório)
+    """
+    if distancia_maxima < 0:
+        return documentos, []
+    obter_conteudo = obter_conteudo or (lambda doc: doc.get('conteudo'))
+
+    mantidos = []
+    duplicados = []
+    hashes = []
+    for doc in documentos:
+        if not doc['nome'].lower().endswith(EXTENSOES_IMAGEM):
+            mantidos.append(doc)
+            continue
+        conteudo = obter_conteudo(doc)
+        assinatura = hash_perceptual(conteudo) if conteudo else None
+        if assinatura is None:
+            mantidos.append(doc)
+            continue
+        tamanho, valor = assinatura
+        original = next((nome for nome, t, h in hashes
+                         if t == tamanho and distancia_hash(valor, h) <= distancia_maxima), None)
+        if original and doc.get('prioridade') != 'ALTA':
+            duplicados.append({
+                'arquivo': doc['nome'],
+                'igual_a': original,
+                'criterio': 'imagem',
+            })
+            continue
+        hashes.append((doc['nome'], tamanho, valor))
+        mantidos.append(doc)
+    return mantidos, duplicados
+
+
+def imprimir_duplicados(duplicados):
+    """Resumo no log do job"""
+    if not duplicados:
+        return
+    print(f"   Duplicados ignorados: {len(duplicados)}")
+    for dup in duplicados:
+        print(f"     - {dup['arquivo']} = {dup['igual_a']} ({dup['criterio']})")
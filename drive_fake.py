@@ -0,0 +1,910 @@
+"""
+DRIVE FALSO (OFFLINE) SOBRE UM DIRETÓRIO LOCAL
+Implementa, em processo, a parte da API do Google Drive v3 que o sistema usa,
+para rodar benchmarks e testes de carga sem rede:
+  - files().list com o subconjunto de consultas usado no código
+    ('<id>' in parents, name/mimeType =/!=, trashed, contains,
+    appProperties has {...}, and/or/not e parênteses), orderBy e paginação
+  - files().get / get_media (compatível com MediaIoBaseDownload) / export
+  - files().create / update / delete (inclusive upload resumable em blocos)
+  - changes().getStartPageToken / list
+  - new_batch_http_request
+  - latência, banda e erros 503 injetáveis (DRIVE_FAKE_*)
+
+Cada arquivo/pasta do diretório DRIVE_FAKE_DIR vira um item; a raiz é 'root'.
+O ID de um item encontrado no disco é derivado do caminho relativo
+(id_do_caminho), então os IDs das pastas podem ser calculados antes de subir
+o processo. appProperties e itens criados pela API ficam no índice
+.drive_fake.json dentro do diretório. Arquivos .gdoc/.gsheet/.gslides
+(texto puro no disco) fazem o papel de Google Docs/Planilhas/Apresentações:
+não têm md5 nem get_media, só export.
+
+Ativação: DRIVE_BACKEND=fake (ver credenciais_drive.obter_service_drive).
+"""
+
+import io
+import os
+import json
+import time
+import uuid
+import random
+import shutil
+import hashlib
+import threading
+import mimetypes
+from datetime import datetime, timezone
+
+import httplib2
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaUploadProgress
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PASTA_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+DRIVE_FAKE_DIR = os.getenv('DRIVE_FAKE_DIR', 'drive_fake')
+
+# Latência por requisição (média e variação, em ms), banda para conteúdo
+# (MB/s, 0 = sem limite) e fração de requisições que falham com 503
+DRIVE_FAKE_LATENCIA_MS = float(os.getenv('DRIVE_FAKE_LATENCIA_MS', '0'))
+DRIVE_FAKE_VARIACAO_MS = float(os.getenv('DRIVE_FAKE_VARIACAO_MS', '0'))
+DRIVE_FAKE_BANDA_MBPS = float(os.getenv('DRIVE_FAKE_BANDA_MBPS', '0'))
+DRIVE_FAKE_TAXA_ERROS = float(os.getenv('DRIVE_FAKE_TAXA_ERROS', '0'))
+
+ARQUIVO_INDICE = '.drive_fake.json'
+
+# Extensões que viram arquivos nativos do Google (conteúdo só via export)
+NATIVOS_POR_EXTENSAO = {
+    '.gdoc': 'application/vnd.google-apps.document',
+    '.gsheet': 'application/vnd.google-apps.spreadsheet',
+    '.gslides': 'application/vnd.google-apps.presentation',
+}
+FORMATOS_EXPORTACAO = {'text/plain', 'text/csv'}
+TAMANHO_PAGINA_PADRAO = 100
+TAMANHO_PAGINA_MAXIMO = 1000
+
+
+def id_do_caminho(caminho_relativo):
+    """ID estável de um item encontrado no disco (caminho relativo à raiz)"""
+    caminho = caminho_relativo.replace(os.sep, '/').strip('/')
+    if not caminho:
+        return 'root'
+    return 'fk' + hashlib.sha1(caminho.encode('utf-8')).hexdigest()[:30]
+
+
+def _data_rfc3339(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def _erro_http(status, motivo, mensagem):
+    """HttpError no mesmo formato do Drive (o limitador lê status e reason)"""
+    corpo = {'error': {'code': status, 'message': mensagem, 'errors': [{'reason': motivo, 'message': mensagem}]}}
+    return HttpError(httplib2.Response({'status': status}), json.dumps(corpo).encode('utf-8'))
+
+
+# ============================================================================
+# INJEÇÃO DE LATÊNCIA E ERROS
+# ============================================================================
+
+class LatenciaFake:
+    """Atraso e falhas artificiais aplicados a cada requisição"""
+
+    def __init__(self, latencia_ms=DRIVE_FAKE_LATENCIA_MS, variacao_ms=DRIVE_FAKE_VARIACAO_MS,
+                 banda_mbps=DRIVE_FAKE_BANDA_MBPS, taxa_erros=DRIVE_FAKE_TAXA_ERROS):
+        self.latencia_ms = latencia_ms
+        self.variacao_ms = variacao_ms
+        self.banda_mbps = banda_mbps
+        self.taxa_erros = taxa_erros
+
+    def aplicar(self, bytes_transferidos=0):
+        """Latência da requisição (+ tempo de transferência) e, por sorteio, um 503"""
+        espera = (self.latencia_ms + random.uniform(-self.variacao_ms, self.variacao_ms)) / 1000
+        if espera > 0:
+            time.sleep(espera)
+        self.aplicar_banda(bytes_transferidos)
+        if self.taxa_erros > 0 and random.random() < self.taxa_erros:
+            raise _erro_http(503, 'backendError', 'Erro injetado pelo Drive falso')
+
+    def aplicar_banda(self, bytes_transferidos):
+        if self.banda_mbps > 0 and bytes_transferidos:
+            time.sleep(bytes_transferidos / (self.banda_mbps * 1024 * 1024))
+
+
+# ============================================================================
+# CONSULTAS (q=) E PROJEÇÃO (fields=)
+# ============================================================================
+
+class _Lexer:
+    SIMBOLOS = ('!=', '<=', '>=', '=', '<', '>', '(', ')', '{', '}')
+
+    def __init__(self, texto):
+        self.tokens = self._tokenizar(texto)
+        self.pos = 0
+
+    def _tokenizar(self, texto):
+        tokens = []
+        i = 0
+        while i < len(texto):
+            c = texto[i]
+            if c.isspace():
+                i += 1
+            elif c == "'":
+                valor = []
+                i += 1
+                while i < len(texto) and texto[i] != "'":
+                    if texto[i] == '\\' and i + 1 < len(texto):
+                        i += 1
+                    valor.append(texto[i])
+                    i += 1
+                if i >= len(texto):
+                    raise _erro_http(400, 'invalid', f"Consulta inválida (aspas abertas): {texto}")
+                tokens.append(('str', ''.join(valor)))
+                i += 1
+            else:
+                simbolo = next((s for s in self.SIMBOLOS if texto.startswith(s, i)), None)
+                if simbolo:
+                    tokens.append(('op', simbolo))
+                    i += len(simbolo)
+                    continue
+                inicio = i
+                while i < len(texto) and not texto[i].isspace() and texto[i] not in "'(){}=!<>":
+                    i += 1
+                if inicio == i:
+                    raise _erro_http(400, 'invalid', f"Consulta inválida perto de: {texto[i:]}")
+                tokens.append(('nome', texto[inicio:i]))
+        return tokens
+
+    def espiar(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def proximo(self):
+        token = self.espiar()
+        self.pos += 1
+        return token
+
+    def esperar(self, tipo, valor=None):
+        t, v = self.proximo()
+        if t != tipo or (valor is not None and v.lower() != valor):
+            raise _erro_http(400, 'invalid', f"Consulta inválida: esperado {valor or tipo}, encontrado {v}")
+        return v
+
+
+def compilar_consulta(texto):
+    """
+    Converte a consulta do Drive (q=) em uma função item -> bool
+
+    Suporta: '<id>' in parents, campo =/!=/</>/<=/>= valor, campo contains
+    'texto', appProperties/properties has { key='k' and value='v' },
+    and/or/not e parênteses.
+    """
+    if not texto or not texto.strip():
+        return lambda item: True
+    lexer = _Lexer(texto)
+
+    def ler_ou():
+        esquerda = ler_e()
+        while lexer.espiar() == ('nome', 'or'):
+            lexer.proximo()
+            direita = ler_e()
+            esquerda = (lambda a, b: lambda item: a(item) or b(item))(esquerda, direita)
+        return esquerda
+
+    def ler_e():
+        esquerda = ler_nao()
+        while lexer.espiar() == ('nome', 'and'):
+            lexer.proximo()
+            direita = ler_nao()
+            esquerda = (lambda a, b: lambda item: a(item) and b(item))(esquerda, direita)
+        return esquerda
+
+    def ler_nao():
+        if lexer.espiar() == ('nome', 'not'):
+            lexer.proximo()
+            interno = ler_nao()
+            return lambda item: not interno(item)
+        return ler_primario()
+
+    def ler_valor():
+        tipo, valor = lexer.proximo()
+        if tipo == 'str':
+            return valor
+        if tipo == 'nome' and valor in ('true', 'false'):
+            return valor == 'true'
+        if tipo == 'nome':
+            try:
+                return float(valor)
+            except ValueError:
+                pass
+        raise _erro_http(400, 'invalid', f"Valor inválido na consulta: {valor}")
+
+    def ler_primario():
+        tipo, valor = lexer.proximo()
+        if (tipo, valor) == ('op', '('):
+            interno = ler_ou()
+            lexer.esperar('op', ')')
+            return interno
+
+        if tipo == 'str':
+            lexer.esperar('nome', 'in')
+            campo = lexer.esperar('nome')
+            if campo != 'parents':
+                raise _erro_http(400, 'invalid', f"Campo não suportado em 'in': {campo}")
+            return lambda item: valor in item.get('parents', [])
+
+        if tipo != 'nome':
+            raise _erro_http(400, 'invalid', f"Consulta inválida perto de: {valor}")
+        campo = valor
+        tipo_op, operador = lexer.proximo()
+
+        if tipo_op == 'nome' and operador == 'has':
+            lexer.esperar('op', '{')
+            lexer.esperar('nome', 'key')
+            lexer.esperar('op', '=')
+            chave = lexer.esperar('str')
+            lexer.esperar('nome', 'and')
+            lexer.esperar('nome', 'value')
+            lexer.esperar('op', '=')
+            esperado = lexer.esperar('str')
+            lexer.esperar('op', '}')
+            return lambda item: (item.get(campo) or {}).get(chave) == esperado
+
+        if tipo_op == 'nome' and operador == 'contains':
+            trecho = lexer.esperar('str').lower()
+            return lambda item: trecho in str(item.get(campo, '')).lower()
+
+        if tipo_op != 'op':
+            raise _erro_http(400, 'invalid', f"Operador não suportado: {operador}")
+        esperado = ler_valor()
+        comparadores = {
+            '=': lambda a, b: a == b,
+            '!=': lambda a, b: a != b,
+            '<': lambda a, b: a < b,
+            '>': lambda a, b: a > b,
+            '<=': lambda a, b: a <= b,
+            '>=': lambda a, b: a >= b,
+        }
+        comparar = comparadores[operador]
+        padrao = False if isinstance(esperado, bool) else ''
+        return lambda item: comparar(item.get(campo, padrao), esperado)
+
+    predicado = ler_ou()
+    if lexer.espiar() != (None, None):
+        raise _erro_http(400, 'invalid', f"Consulta inválida perto de: {lexer.espiar()[1]}")
+    return predicado
+
+
+def _ler_campos(texto, pos=0):
+    """Interpreta fields= ('nextPageToken, files(id, name)') em árvore de dicts"""
+    campos = {}
+    nome = ''
+    while pos < len(texto):
+        c = texto[pos]
+        if c == '(':
+            campos[nome.strip()], pos = _ler_campos(texto, pos + 1)
+            nome = ''
+        elif c == ')':
+            if nome.strip():
+                campos[nome.strip()] = None
+            return campos, pos + 1
+        elif c == ',':
+            if nome.strip():
+                campos[nome.strip()] = None
+            nome = ''
+            pos += 1
+            continue
+        else:
+            nome += c
+            pos += 1
+            continue
+    if nome.strip():
+        campos[nome.strip()] = None
+    return campos, pos
+
+
+def interpretar_campos(texto):
+    if not texto or texto.strip() == '*':
+        return None
+    return _ler_campos(texto)[0]
+
+
+def projetar(objeto, campos):
+    """Mantém só os campos pedidos (None = tudo)"""
+    if campos is None or not isinstance(objeto, dict):
+        return objeto
+    resultado = {}
+    for nome, subcampos in campos.items():
+        if nome == '*':
+            return objeto
+        if nome not in objeto:
+            continue
+        valor = objeto[nome]
+        if isinstance(valor, list):
+            resultado[nome] = [projetar(v, subcampos) for v in valor]
+        else:
+            resultado[nome] = projetar(valor, subcampos)
+    return resultado
+
+
+def _chave_ordenacao(order_by):
+    """Função de ordenação para orderBy ('folder,name', 'createdTime desc', ...)"""
+    criterios = []
+    for parte in (order_by or 'name').split(','):
+        pedacos = parte.strip().split()
+        if not pedacos:
+            continue
+        campo = pedacos[0]
+        decrescente = len(pedacos) > 1 and pedacos[1].lower() == 'desc'
+        if campo == 'folder':
+            campo_item = lambda item: 0 if item.get('mimeType') == PASTA_MIME_TYPE else 1
+        elif campo in ('name', 'name_natural'):
+            campo_item = lambda item: item.get('name', '').lower()
+        else:
+            campo_item = (lambda c: lambda item: item.get(c) or '')(campo)
+        criterios.append((campo_item, decrescente))
+
+    def ordenar(itens):
+        # Ordenação estável: aplica os critérios do último para o primeiro
+        for campo_item, decrescente in reversed(criterios):
+            itens.sort(key=campo_item, reverse=decrescente)
+        return itens
+    return ordenar
+
+
+# ============================================================================
+# ARMAZENAMENTO (DIRETÓRIO + ÍNDICE)
+# ============================================================================
+
+class ArmazemDriveFake:
+    """
+    Estado do Drive falso: itens por ID sobre um diretório local
+
+    Cada entrada guarda caminho relativo, nome, pai, appProperties e
+    createdTime; tamanho, md5 e modifiedTime vêm do disco (o md5 é
+    recalculado só quando o arquivo muda).
+    """
+
+    def __init__(self, diretorio=DRIVE_FAKE_DIR, latencia=None):
+        self.raiz = os.path.abspath(diretorio)
+        self.latencia = latencia or LatenciaFake()
+        self.lock = threading.RLock()
+        self.entradas = {}
+        self.por_caminho = {}
+        self.mudancas = []
+        self.md5_cache = {}
+        os.makedirs(self.raiz, exist_ok=True)
+        self._carregar_indice()
+        self.sincronizar(registrar=False)
+
+    # -------------------------------------------------------------- índice
+
+    def _carregar_indice(self):
+        caminho = os.path.join(self.raiz, ARQUIVO_INDICE)
+        if not os.path.exists(caminho):
+            return
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                for entrada in json.load(f).get('itens', []):
+                    self._registrar_entrada(entrada)
+        except Exception as e:
+            print(f"[DRIVE FALSO] Índice ilegível ({e}), reconstruindo a partir do disco")
+            self.entradas.clear()
+            self.por_caminho.clear()
+
+    def _salvar_indice(self):
+        caminho = os.path.join(self.raiz, ARQUIVO_INDICE)
+        itens = [
+            {k: v for k, v in e.items() if k != 'assinatura'}
+            for e in self.entradas.values() if e['id'] != 'root'
+        ]
+        tmp = f"{caminho}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'itens': itens}, f, ensure_ascii=False)
+        os.replace(tmp, caminho)
+
+    def _registrar_entrada(self, entrada):
+        self.entradas[entrada['id']] = entrada
+        self.por_caminho[entrada['caminho']] = entrada['id']
+
+    def _remover_entrada(self, item_id):
+        entrada = self.entradas.pop(item_id, None)
+        if entrada:
+            self.por_caminho.pop(entrada['caminho'], None)
+        return entrada
+
+    # ---------------------------------------------------------- disco
+
+    def _absoluto(self, caminho_relativo):
+        return os.path.join(self.raiz, *caminho_relativo.split('/')) if caminho_relativo else self.raiz
+
+    def _assinatura(self, caminho_relativo):
+        try:
+            st = os.stat(self._absoluto(caminho_relativo))
+        except OSError:
+            return None
+        return [st.st_size, st.st_mtime_ns]
+
+    def sincronizar(self, registrar=True):
+        """
+        Reconcilia o índice com o disco (itens adicionados, removidos ou alterados
+        fora da API entram no log da Changes API)
+        """
+        with self.lock:
+            if 'root' not in self.entradas:
+                self._registrar_entrada({'id': 'root', 'caminho': '', 'name': 'Meu Drive', 'pai': None})
+
+            vistos = {''}
+            for raiz, pastas, arquivos in os.walk(self.raiz):
+                relativo_raiz = os.path.relpath(raiz, self.raiz).replace(os.sep, '/')
+                relativo_raiz = '' if relativo_raiz == '.' else relativo_raiz
+                pai_id = self.por_caminho.get(relativo_raiz)
+                for nome in pastas + [a for a in arquivos if a != ARQUIVO_INDICE and not a.endswith('.tmp')]:
+                    relativo = f"{relativo_raiz}/{nome}" if relativo_raiz else nome
+                    vistos.add(relativo)
+                    assinatura = self._assinatura(relativo)
+                    item_id = self.por_caminho.get(relativo)
+                    if item_id is None:
+                        st = os.stat(self._absoluto(relativo))
+                        item_id = id_do_caminho(relativo)
+                        self._registrar_entrada({
+                            'id': item_id, 'caminho': relativo, 'name': nome, 'pai': pai_id,
+                            'createdTime': _data_rfc3339(st.st_mtime), 'assinatura': assinatura,
+                        })
+                        if registrar:
+                            self.mudancas.append({'fileId': item_id, 'removed': False})
+                    else:
+                        entrada = self.entradas[item_id]
+                        if entrada.get('assinatura') != assinatura:
+                            if registrar and entrada.get('assinatura') is not None and nome in arquivos:
+                                self.mudancas.append({'fileId': item_id, 'removed': False})
+                            entrada['assinatura'] = assinatura
+
+            for item_id, entrada in list(self.entradas.items()):
+                if entrada['caminho'] not in vistos:
+                    self._remover_entrada(item_id)
+                    if registrar:
+                        self.mudancas.append({'fileId': item_id, 'removed': True})
+
+    # -------------------------------------------------------- metadados
+
+    def _md5(self, entrada):
+        assinatura = self._assinatura(entrada['caminho'])
+        guardado = self.md5_cache.get(entrada['id'])
+        if guardado and guardado[0] == assinatura:
+            return guardado[1]
+        h = hashlib.md5()
+        with open(self._absoluto(entrada['caminho']), 'rb') as f:
+            for bloco in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(bloco)
+        self.md5_cache[entrada['id']] = (assinatura, h.hexdigest())
+        return h.hexdigest()
+
+    def metadados(self, item_id, calcular_md5=True):
+        """Metadados completos do item no formato do Drive (ou None se não existir)"""
+        with self.lock:
+            entrada = self.entradas.get(item_id)
+            if entrada is None:
+                return None
+            absoluto = self._absoluto(entrada['caminho'])
+            try:
+                st = os.stat(absoluto)
+            except OSError:
+                return None
+            meta = {
+                'kind': 'drive#file',
+                'id': item_id,
+                'name': entrada['name'],
+                'parents': [entrada['pai']] if entrada['pai'] else [],
+                'trashed': False,
+                'createdTime': entrada.get('createdTime') or _data_rfc3339(st.st_mtime),
+                'modifiedTime': _data_rfc3339(st.st_mtime),
+                'webViewLink': f"file://{absoluto}",
+            }
+            if entrada.get('appProperties'):
+                meta['appProperties'] = dict(entrada['appProperties'])
+            if os.path.isdir(absoluto):
+                meta['mimeType'] = PASTA_MIME_TYPE
+            elif os.path.splitext(entrada['name'])[1].lower() in NATIVOS_POR_EXTENSAO:
+                # Nativos do Google: sem size/md5/headRevisionId, como no Drive
+                meta['mimeType'] = NATIVOS_POR_EXTENSAO[os.path.splitext(entrada['name'])[1].lower()]
+            else:
+                meta['mimeType'] = (entrada.get('mimeType')
+                                    or mimetypes.guess_type(entrada['name'])[0]
+                                    or 'application/octet-stream')
+                meta['size'] = str(st.st_size)
+                meta['headRevisionId'] = str(st.st_mtime_ns)
+                if calcular_md5:
+                    meta['md5Checksum'] = self._md5(entrada)
+            return meta
+
+    def exigir(self, item_id):
+        meta = self.metadados(item_id, calcular_md5=False)
+        if meta is None:
+            raise _erro_http(404, 'notFound', f"File not found: {item_id}.")
+        return meta
+
+    def listar(self, q=None, order_by=None, com_md5=True):
+        """Todos os itens que satisfazem a consulta, já ordenados"""
+        predicado = compilar_consulta(q)
+        with self.lock:
+            ids = [i for i in self.entradas if i != 'root']
+            itens = [m for m in (self.metadados(i, calcular_md5=False) for i in ids) if m and predicado(m)]
+            if com_md5:
+                for meta in itens:
+                    if not meta['mimeType'].startswith('application/vnd.google-apps.'):
+                        meta['md5Checksum'] = self._md5(self.entradas[meta['id']])
+        return _chave_ordenacao(order_by)(itens)
+
+    def ler_conteudo(self, item_id, inicio=0, fim=None):
+        """Bytes do arquivo (intervalo inclusivo, como no cabeçalho Range)"""
+        with self.lock:
+            meta = self.exigir(item_id)
+            if meta['mimeType'].startswith('application/vnd.google-apps.'):
+                raise _erro_http(403, 'fileNotDownloadable', 'Only files with binary content can be downloaded.')
+            absoluto = self._absoluto(self.entradas[item_id]['caminho'])
+        with open(absoluto, 'rb') as f:
+            f.seek(inicio)
+            return f.read() if fim is None else f.read(fim - inicio + 1)
+
+    def exportar(self, item_id, mime_type):
+        """Conteúdo de um arquivo nativo no formato pedido (o texto guardado no disco)"""
+        with self.lock:
+            meta = self.exigir(item_id)
+            if meta['mimeType'] not in NATIVOS_POR_EXTENSAO.values():
+                raise _erro_http(403, 'fileNotExportable', 'Export only supports Docs Editors files.')
+            if mime_type not in FORMATOS_EXPORTACAO:
+                raise _erro_http(400, 'badRequest', f"Unsupported export mimeType: {mime_type}")
+            absoluto = self._absoluto(self.entradas[item_id]['caminho'])
+        with open(absoluto, 'rb') as f:
+            return f.read()
+
+    # ------------------------------------------------------------ escrita
+
+    def _caminho_livre(self, pai_caminho, nome, item_id):
+        """O Drive aceita nomes repetidos na mesma pasta; no disco o repetido leva o ID"""
+        relativo = f"{pai_caminho}/{nome}" if pai_caminho else nome
+        if os.path.exists(self._absoluto(relativo)) or relativo in self.por_caminho:
+            relativo = f"{pai_caminho}/{item_id}_{nome}" if pai_caminho else f"{item_id}_{nome}"
+        return relativo
+
+    def criar(self, corpo, conteudo=None):
+        corpo = corpo or {}
+        with self.lock:
+            pai_id = (corpo.get('parents') or ['root'])[0]
+            pai = self.exigir(pai_id)
+            if pai['mimeType'] != PASTA_MIME_TYPE:
+                raise _erro_http(400, 'invalidParent', f"Parent is not a folder: {pai_id}")
+            item_id = 'fk' + uuid.uuid4().hex[:30]
+            nome = corpo.get('name') or 'Sem título'
+            relativo = self._caminho_livre(self.entradas[pai_id]['caminho'], nome, item_id)
+            absoluto = self._absoluto(relativo)
+            if corpo.get('mimeType') == PASTA_MIME_TYPE:
+                os.makedirs(absoluto)
+            else:
+                with open(absoluto, 'wb') as f:
+                    f.write(conteudo or b'')
+            self._registrar_entrada({
+                'id': item_id, 'caminho': relativo, 'name': nome, 'pai': pai_id,
+                'createdTime': _data_rfc3339(time.time()),
+                'mimeType': corpo.get('mimeType') if corpo.get('mimeType') != PASTA_MIME_TYPE else None,
+                'appProperties': dict(corpo.get('appProperties') or {}),
+                'assinatura': self._assinatura(relativo),
+            })
+            self.mudancas.append({'fileId': item_id, 'removed': False})
+            self._salvar_indice()
+            return self.metadados(item_id)
+
+    def _mover(self, item_id, novo_relativo):
+        """Move no disco e atualiza o caminho do item e de todos os descendentes"""
+        antigo = self.entradas[item_id]['caminho']
+        os.replace(self._absoluto(antigo), self._absoluto(novo_relativo))
+        for entrada in list(self.entradas.values()):
+            caminho = entrada['caminho']
+            if caminho == antigo or caminho.startswith(antigo + '/'):
+                self.por_caminho.pop(caminho, None)
+                entrada['caminho'] = novo_relativo + caminho[len(antigo):]
+                self.por_caminho[entrada['caminho']] = entrada['id']
+
+    def atualizar(self, item_id, corpo=None, conteudo=None, add_parents=None, remove_parents=None):
+        corpo = corpo or {}
+        with self.lock:
+            self.exigir(item_id)
+            entrada = self.entradas[item_id]
+
+            if 'appProperties' in corpo:
+                propriedades = dict(entrada.get('appProperties') or {})
+                for chave, valor in (corpo['appProperties'] or {}).items():
+                    if valor is None:
+                        propriedades.pop(chave, None)
+                    else:
+                        propriedades[chave] = str(valor)
+                entrada['appProperties'] = propriedades
+
+            novo_pai = entrada['pai']
+            if add_parents:
+                novo_pai = add_parents.split(',')[0].strip()
+                pai = self.exigir(novo_pai)
+                if pai['mimeType'] != PASTA_MIME_TYPE:
+                    raise _erro_http(400, 'invalidParent', f"Parent is not a folder: {novo_pai}")
+            elif remove_parents and entrada['pai'] in remove_parents.split(','):
+                novo_pai = 'root'
+
+            novo_nome = corpo.get('name') or entrada['name']
+            if novo_pai != entrada['pai'] or novo_nome != entrada['name']:
+                novo_relativo = self._caminho_livre(self.entradas[novo_pai]['caminho'], novo_nome, item_id)
+                self._mover(item_id, novo_relativo)
+                entrada['pai'] = novo_pai
+                entrada['name'] = novo_nome
+
+            if conteudo is not None:
+                with open(self._absoluto(entrada['caminho']), 'wb') as f:
+                    f.write(conteudo)
+            entrada['assinatura'] = self._assinatura(entrada['caminho'])
+
+            self.mudancas.append({'fileId': item_id, 'removed': False})
+            self._salvar_indice()
+            return self.metadados(item_id)
+
+    def excluir(self, item_id):
+        with self.lock:
+            self.exigir(item_id)
+            if item_id == 'root':
+                raise _erro_http(403, 'insufficientPermissions', 'The root folder cannot be deleted.')
+            caminho = self.entradas[item_id]['caminho']
+            absoluto = self._absoluto(caminho)
+            if os.path.isdir(absoluto):
+                shutil.rmtree(absoluto)
+            else:
+                os.remove(absoluto)
+            for outro_id, entrada in list(self.entradas.items()):
+                if entrada['caminho'] == caminho or entrada['caminho'].startswith(caminho + '/'):
+                    self._remover_entrada(outro_id)
+                    self.mudancas.append({'fileId': outro_id, 'removed': True})
+            self._salvar_indice()
+            return ''
+
+    # ------------------------------------------------------------ changes
+
+    def token_atual(self):
+        with self.lock:
+            self.sincronizar()
+            return str(len(self.mudancas))
+
+    def mudancas_desde(self, token, tamanho_pagina):
+        with self.lock:
+            self.sincronizar()
+            inicio = min(int(token), len(self.mudancas))
+            pagina = self.mudancas[inicio:inicio + tamanho_pagina]
+            resposta = {'kind': 'drive#changeList', 'changes': []}
+            for mudanca in pagina:
+                item = {'kind': 'drive#change', 'fileId': mudanca['fileId'], 'removed': mudanca['removed']}
+                meta = None if mudanca['removed'] else self.metadados(mudanca['fileId'])
+                if meta is None:
+                    item['removed'] = True
+                else:
+                    item['file'] = meta
+                resposta['changes'].append(item)
+            fim = inicio + len(pagina)
+            if fim < len(self.mudancas):
+                resposta['nextPageToken'] = str(fim)
+            else:
+                resposta['newStartPageToken'] = str(len(self.mudancas))
+            return resposta
+
+
+# ============================================================================
+# OBJETOS NO FORMATO DO googleapiclient
+# ============================================================================
+
+class HttpFake:
+    """Transporte usado pelo MediaIoBaseDownload (request(uri, method, headers))"""
+
+    def __init__(self, armazem):
+        self.armazem = armazem
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        item_id = uri.rsplit('/', 1)[-1]
+        intervalo = (headers or {}).get('range') or (headers or {}).get('Range')
+        tamanho = int(self.armazem.exigir(item_id).get('size', 0))
+        if intervalo and not tamanho:
+            self.armazem.latencia.aplicar()
+            return httplib2.Response({'status': 416, 'content-range': 'bytes */0'}), b''
+        if intervalo:
+            inicio, fim = intervalo.split('=', 1)[1].split('-')
+            inicio, fim = int(inicio), min(int(fim), tamanho - 1)
+        else:
+            inicio, fim = 0, tamanho - 1
+        conteudo = self.armazem.ler_conteudo(item_id, inicio, fim) if tamanho else b''
+        self.armazem.latencia.aplicar(len(conteudo))
+        if intervalo:
+            resp = httplib2.Response({
+                'status': 206,
+                'content-range': f"bytes {inicio}-{inicio + len(conteudo) - 1}/{tamanho}",
+                'content-length': str(len(conteudo)),
+            })
+        else:
+            resp = httplib2.Response({'status': 200, 'content-length': str(len(conteudo))})
+        return resp, conteudo
+
+
+class RequisicaoFake:
+    """Equivalente ao HttpRequest: execute() e, para uploads, next_chunk()"""
+
+    def __init__(self, armazem, metodo, funcao, media=None, uri=None):
+        self.armazem = armazem
+        self.methodId = metodo
+        self.funcao = funcao
+        self.media = media
+        self.uri = uri or f"fake://drive/{metodo}"
+        self.http = HttpFake(armazem)
+        self.headers = {}
+        self.resumable_progress = 0
+        self._recebido = io.BytesIO()
+
+    def _conteudo_media(self):
+        if self.media is None:
+            return None
+        return self.media.getbytes(0, self.media.size())
+
+    def execute(self, http=None, num_retries=0):
+        conteudo = self._conteudo_media()
+        self.armazem.latencia.aplicar(len(conteudo) if conteudo else 0)
+        resultado = self.funcao(conteudo)
+        if isinstance(resultado, bytes):
+            self.armazem.latencia.aplicar_banda(len(resultado))
+        return resultado
+
+    def next_chunk(self, http=None, num_retries=0):
+        """Upload em blocos: devolve (progresso, None) até o último bloco, depois (None, resposta)"""
+        if self.media is None:
+            return None, self.execute()
+        total = self.media.size()
+        bloco = self.media.getbytes(self.resumable_progress, self.media.chunksize())
+        self.armazem.latencia.aplicar(len(bloco))
+        self._recebido.write(bloco)
+        self.resumable_progress += len(bloco)
+        if total is not None and self.resumable_progress < total:
+            return MediaUploadProgress(self.resumable_progress, total), None
+        return None, self.funcao(self._recebido.getvalue())
+
+
+class ArquivosFake:
+    """service.files()"""
+
+    def __init__(self, armazem):
+        self.armazem = armazem
+
+    def list(self, q=None, fields=None, pageSize=TAMANHO_PAGINA_PADRAO, pageToken=None, orderBy=None, **kwargs):
+        campos = interpretar_campos(fields or 'nextPageToken, files(id, name, mimeType)')
+        campos_arquivo = (campos or {}).get('files')
+        com_md5 = campos is None or campos_arquivo is None or 'md5Checksum' in campos_arquivo
+
+        def executar(_):
+            itens = self.armazem.listar(q, orderBy, com_md5=com_md5)
+            inicio = int(pageToken or 0)
+            tamanho = max(1, min(int(pageSize or TAMANHO_PAGINA_PADRAO), TAMANHO_PAGINA_MAXIMO))
+            resposta = {'kind': 'drive#fileList', 'files': itens[inicio:inicio + tamanho]}
+            if inicio + tamanho < len(itens):
+                resposta['nextPageToken'] = str(inicio + tamanho)
+            return projetar(resposta, campos)
+        return RequisicaoFake(self.armazem, 'drive.files.list', executar)
+
+    def get(self, fileId, fields=None, **kwargs):
+        campos = interpretar_campos(fields or 'id, name, mimeType')
+
+        def executar(_):
+            self.armazem.exigir(fileId)
+            return projetar(self.armazem.metadados(fileId), campos)
+        return RequisicaoFake(self.armazem, 'drive.files.get', executar)
+
+    def get_media(self, fileId, **kwargs):
+        return RequisicaoFake(
+            self.armazem, 'drive.files.get_media',
+            lambda _: self.armazem.ler_conteudo(fileId),
+            uri=f"fake://drive/files/{fileId}"
+        )
+
+    def export(self, fileId, mimeType, **kwargs):
+        return RequisicaoFake(
+            self.armazem, 'drive.files.export',
+            lambda _: self.armazem.exportar(fileId, mimeType)
+        )
+
+    def create(self, body=None, media_body=None, fields=None, **kwargs):
+        campos = interpretar_campos(fields or 'id, name, mimeType')
+        return RequisicaoFake(
+            self.armazem, 'drive.files.create',
+            lambda conteudo: projetar(self.armazem.criar(body, conteudo), campos),
+            media=media_body
+        )
+
+    def update(self, fileId, body=None, media_body=None, addParents=None, removeParents=None, fields=None, **kwargs):
+        campos = interpretar_campos(fields or 'id, name, mimeType')
+        return RequisicaoFake(
+            self.armazem, 'drive.files.update',
+            lambda conteudo: projetar(
+                self.armazem.atualizar(fileId, body, conteudo, addParents, removeParents), campos
+            ),
+            media=media_body
+        )
+
+    def delete(self, fileId, **kwargs):
+        return RequisicaoFake(self.armazem, 'drive.files.delete', lambda _: self.armazem.excluir(fileId))
+
+
+class MudancasFake:
+    """service.changes()"""
+
+    def __init__(self, armazem):
+        self.armazem = armazem
+
+    def getStartPageToken(self, **kwargs):
+        return RequisicaoFake(
+            self.armazem, 'drive.changes.getStartPageToken',
+            lambda _: {'startPageToken': self.armazem.token_atual()}
+        )
+
+    def list(self, pageToken, pageSize=TAMANHO_PAGINA_PADRAO, fields=None, **kwargs):
+        campos = interpretar_campos(fields)
+        return RequisicaoFake(
+            self.armazem, 'drive.changes.list',
+            lambda _: projetar(self.armazem.mudancas_desde(pageToken, int(pageSize)), campos)
+        )
+
+
+class LoteFake:
+    """service.new_batch_http_request(): executa cada requisição e chama o callback"""
+
+    def __init__(self, armazem, callback=None):
+        self.armazem = armazem
+        self.callback = callback
+        self.requisicoes = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requisicoes.append((request_id or str(len(self.requisicoes) + 1), request, callback))
+
+    def execute(self, http=None):
+        self.armazem.latencia.aplicar()
+        for request_id, request, callback in self.requisicoes:
+            resposta, erro = None, None
+            try:
+                resposta = request.funcao(None)
+            except HttpError as e:
+                erro = e
+            destino = callback or self.callback
+            if destino:
+                destino(request_id, resposta, erro)
+
+
+class ServicoDriveFake:
+    """Substituto do objeto devolvido por build('drive', 'v3', ...)"""
+
+    def __init__(self, armazem):
+        self.armazem = armazem
+
+    def files(self):
+        return ArquivosFake(self.armazem)
+
+    def changes(self):
+        return MudancasFake(self.armazem)
+
+    def new_batch_http_request(self, callback=None):
+        return LoteFake(self.armazem, callback)
+
+
+# ============================================================================
+# INSTÂNCIA COMPARTILHADA DO PROCESSO
+# ============================================================================
+
+_SERVICO = None
+_LOCK_SERVICO = threading.Lock()
+
+
+def obter_drive_fake(diretorio=None):
+    """Retorna o Drive falso do processo (criado na primeira chamada, thread-safe)"""
+    global _SERVICO
+    with _LOCK_SERVICO:
+        if _SERVICO is None:
+            _SERVICO = ServicoDriveFake(ArmazemDriveFake(diretorio or DRIVE_FAKE_DIR))
+            print(f"[DRIVE FALSO] Usando o diretório {_SERVICO.armazem.raiz}")
+        return _SERVICO
@@ -0,0 +1,412 @@
+"""
+ÍNDICE LOCAL DE METADADOS DO GOOGLE DRIVE
+Cópia em SQLite da árvore CLIENTES, semeada uma vez e mantida atualizada
+pela Changes API (changes.list a partir de um startPageToken salvo)
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from dotenv import load_dotenv
+from limitador_drive import executar_drive
+from drive_utils import (
+    listar_filhos_em_lote, iterar_arquivos_drive, normalizar_texto, pastas_tipos_acao, PASTA_MIME_TYPE
+)
+
+load_dotenv()
+
+# Campos guardados de cada arquivo/pasta
+CAMPOS_INDICE = "id, name, parents, mimeType, md5Checksum, modifiedTime, createdTime, size, trashed"
+
+INDICE_DRIVE_DB = os.getenv('INDICE_DRIVE_DB', 'indice_drive.db')
+
+# Intervalo mínimo entre duas consultas à Changes API (segundos)
+INTERVALO_SINCRONIZACAO = float(os.getenv('INDICE_DRIVE_INTERVALO_SEG', '15'))
+
+
+class IndiceDrive:
+    """
+    Índice persistente (SQLite) dos metadados da árvore de clientes
+
+    Tabelas:
+        arquivos: id, nome, nome_normalizado, mime_type, md5, modificado_em, criado_em, tamanho
+        parentes: relação arquivo -> pasta pai (um arquivo pode ter vários pais)
+        meta: start_page_token e raízes indexadas
+    """
+
+    def __init__(self, caminho_db, raizes):
+        """
+        Args:
+            caminho_db: Caminho do arquivo SQLite
+            raizes: IDs das pastas raiz indexadas (CLIENTES e pastas de tipo)
+        """
+        self.raizes = [r for r in raizes if r]
+        self.lock = threading.RLock()
+        self.ultima_sincronizacao = 0
+        self.conn = sqlite3.connect(caminho_db, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self._criar_tabelas()
+
+    def _criar_tabelas(self):
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS arquivos (
+                    id TEXT PRIMARY KEY,
+                    nome TEXT NOT NULL,
+                    mime_type TEXT,
+                    md5 TEXT,
+                    modificado_em TEXT,
+                    criado_em TEXT,
+                    tamanho TEXT
+                )""")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS parentes (
+                    arquivo_id TEXT NOT NULL,
+                    pasta_id TEXT NOT NULL,
+                    PRIMARY KEY (arquivo_id, pasta_id)
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_parentes_pasta ON parentes (pasta_id)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    chave TEXT PRIMARY KEY,
+                    valor TEXT
+                )""")
+
+            # Nome sem acentos/maiúsculas para busca de clientes (bancos antigos
+            # ganham a coluna e são preenchidos aqui)
+            colunas = [c[1] for c in self.conn.execute("PRAGMA table_info(arquivos)")]
+            if 'nome_normalizado' not in colunas:
+                self.conn.execute("ALTER TABLE arquivos ADD COLUMN nome_normalizado TEXT")
+                self.conn.create_function('normalizar_texto', 1, normalizar_texto)
+                self.conn.execute("UPDATE arquivos SET nome_normalizado = normalizar_texto(nome)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_arquivos_nome ON arquivos (nome_normalizado)")
+
+    # ------------------------------------------------------------------
+    # Metadados do próprio índice
+    # ------------------------------------------------------------------
+
+    def _ler_meta(self, chave):
+        row = self.conn.execute("SELECT valor FROM meta WHERE chave = ?", (chave,)).fetchone()
+        return row[0] if row else None
+
+    def _gravar_meta(self, chave, valor):
+        self.conn.execute(
+            "INSERT INTO meta (chave, valor) VALUES (?, ?) "
+            "ON CONFLICT(chave) DO UPDATE SET valor = excluded.valor",
+            (chave, valor)
+        )
+
+    def esta_semeado(self):
+        """True se o índice já foi semeado para as mesmas raízes"""
+        with self.lock:
+            return (self._ler_meta('start_page_token') is not None and
+                    self._ler_meta('raizes') == ','.join(sorted(self.raizes)))
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def _gravar_arquivo(self, arquivo):
+        self.conn.execute(
+            "INSERT INTO arquivos (id, nome, nome_normalizado, mime_type, md5, modificado_em, criado_em, tamanho) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET nome = excluded.nome, nome_normalizado = excluded.nome_normalizado, "
+            "mime_type = excluded.mime_type, md5 = excluded.md5, modificado_em = excluded.modificado_em, "
+            "criado_em = excluded.criado_em, tamanho = excluded.tamanho",
+            (arquivo['id'], arquivo.get('name', ''), normalizar_texto(arquivo.get('name', '')).strip(),
+             arquivo.get('mimeType'), arquivo.get('md5Checksum'), arquivo.get('modifiedTime'),
+             arquivo.get('createdTime'), arquivo.get('size'))
+        )
+        self.conn.execute("DELETE FROM parentes WHERE arquivo_id = ?", (arquivo['id'],))
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO parentes (arquivo_id, pasta_id) VALUES (?, ?)",
+            [(arquivo['id'], pai) for pai in arquivo.get('parents', [])]
+        )
+
+    def _remover_subarvore(self, arquivo_id):
+        pendentes = [arquivo_id]
+        while pendentes:
+            atual = pendentes.pop()
+            filhos = self.conn.execute(
+                "SELECT arquivo_id FROM parentes WHERE pasta_id = ?", (atual,)
+            ).fetchall()
+            pendentes.extend(f[0] for f in filhos)
+            self.conn.execute("DELETE FROM arquivos WHERE id = ?", (atual,))
+            self.conn.execute("DELETE FROM parentes WHERE arquivo_id = ?", (atual,))
+
+    def _indexar_subarvore(self, service, pastas_ids):
+        """Percorre em largura as pastas informadas gravando tudo que encontrar"""
+        visitadas = set(pastas_ids)
+        nivel_atual = list(pastas_ids)
+        total = 0
+        while nivel_atual:
+            proximo_nivel = []
+            for item in listar_filhos_em_lote(service, nivel_atual, CAMPOS_INDICE):
+                self._gravar_arquivo(item)
+                total += 1
+                if item.get('mimeType') == PASTA_MIME_TYPE and item['id'] not in visitadas:
+                    visitadas.add(item['id'])
+                    proximo_nivel.append(item['id'])
+            nivel_atual = proximo_nivel
+        return total
+
+    def semear(self, service):
+        """Indexa a árvore inteira a partir das raízes (executado uma única vez)"""
+        print(f"    [INDICE DRIVE] Semeando índice local ({len(self.raizes)} raiz(es))...")
+        inicio = time.time()
+        # Pegar o token ANTES de listar: mudanças feitas durante a carga
+        # aparecem na primeira sincronização
+        token = executar_drive(service.changes().getStartPageToken()).get('startPageToken')
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM arquivos")
+            self.conn.execute("DELETE FROM parentes")
+            total = self._indexar_subarvore(service, self.raizes)
+            self._gravar_meta('start_page_token', token)
+            self._gravar_meta('raizes', ','.join(sorted(self.raizes)))
+        self.ultima_sincronizacao = time.time()
+        print(f"    [INDICE DRIVE] {total} item(ns) indexado(s) em {time.time() - inicio:.1f}s")
+
+    def _pertence_a_arvore(self, pastas_ids):
+        return any(self.contem_pasta(pid) for pid in pastas_ids)
+
+    def _aplicar_mudanca(self, service, mudanca):
+        arquivo_id = mudanca.get('fileId')
+        arquivo = mudanca.get('file')
+        if not arquivo_id or arquivo_id in self.raizes:
+            return
+
+        if mudanca.get('removed') or not arquivo or arquivo.get('trashed'):
+            self._remover_subarvore(arquivo_id)
+            return
+
+        if not self._pertence_a_arvore(arquivo.get('parents', [])):
+            # Saiu da árvore de clientes (movido ou nunca pertenceu)
+            self._remover_subarvore(arquivo_id)
+            return
+
+        pasta_nova = (arquivo.get('mimeType') == PASTA_MIME_TYPE and
+                      not self.contem_pasta(arquivo_id))
+        self._gravar_arquivo(arquivo)
+        if pasta_nova:
+            # Pasta movida para dentro da árvore: o conteúdo dela não gera
+            # mudanças próprias, então é listado agora
+            self._indexar_subarvore(service, [arquivo_id])
+
+    def sincronizar(self, service):
+        """Aplica as mudanças ocorridas desde o último startPageToken salvo"""
+        with self.lock:
+            token = self._ler_meta('start_page_token')
+            aplicadas = 0
+            with self.conn:
+                while token:
+                    resposta = executar_drive(service.changes().list(
+                        pageToken=token,
+                        spaces='drive',
+                        includeRemoved=True,
+                        pageSize=1000,
+                        fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({CAMPOS_INDICE}))"
+                    ))
+                    for mudanca in resposta.get('changes', []):
+                        self._aplicar_mudanca(service, mudanca)
+                        aplicadas += 1
+                    if resposta.get('newStartPageToken'):
+                        self._gravar_meta('start_page_token', resposta['newStartPageToken'])
+                        break
+                    token = resposta.get('nextPageToken')
+                    self._gravar_meta('start_page_token', token)
+            self.ultima_sincronizacao = time.time()
+            if aplicadas:
+                print(f"    [INDICE DRIVE] {aplicadas} mudança(s) aplicada(s)")
+            return aplicadas
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def contem_pasta(self, pasta_id):
+        """True se o conteúdo da pasta está coberto pelo índice"""
+        if pasta_id in self.raizes:
+            return True
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM arquivos WHERE id = ? AND mime_type = ?", (pasta_id, PASTA_MIME_TYPE)
+            ).fetchone()
+        return row is not None
+
+    def _montar_itens(self, rows):
+        itens = {}
+        for arquivo_id, nome, mime_type, md5, modificado_em, criado_em, tamanho in rows:
+            item = {'id': arquivo_id, 'name': nome, 'mimeType': mime_type}
+            if md5:
+                item['md5Checksum'] = md5
+            if modificado_em:
+                item['modifiedTime'] = modificado_em
+            if criado_em:
+                item['createdTime'] = criado_em
+            if tamanho:
+                item['size'] = tamanho
+            itens[arquivo_id] = item
+        if itens:
+            marcadores = ','.join('?' * len(itens))
+            for arquivo_id, pasta_id in self.conn.execute(
+                f"SELECT arquivo_id, pasta_id FROM parentes WHERE arquivo_id IN ({marcadores})",
+                list(itens)
+            ):
+                itens[arquivo_id].setdefault('parents', []).append(pasta_id)
+        return list(itens.values())
+
+    def listar_filhos_em_lote(self, pastas_ids, somente_pastas=None):
+        """
+        Lista os filhos de várias pastas direto do índice (sem chamadas ao Drive)
+
+        Args:
+            pastas_ids: IDs das pastas pai
+            somente_pastas: True = só pastas, False = só arquivos, None = tudo
+
+        Returns:
+            Lista de dicionários no mesmo formato do files().list
+        """
+        if not pastas_ids:
+            return []
+        marcadores = ','.join('?' * len(pastas_ids))
+        sql = (
+            "SELECT DISTINCT a.id, a.nome, a.mime_type, a.md5, a.modificado_em, a.criado_em, a.tamanho "
+            "FROM parentes p JOIN arquivos a ON a.id = p.arquivo_id "
+            f"WHERE p.pasta_id IN ({marcadores})"
+        )
+        parametros = list(pastas_ids)
+        if somente_pastas is True:
+            sql += " AND a.mime_type = ?"
+            parametros.append(PASTA_MIME_TYPE)
+        elif somente_pastas is False:
+            sql += " AND a.mime_type != ?"
+            parametros.append(PASTA_MIME_TYPE)
+        sql += " ORDER BY a.nome"
+        with self.lock:
+            return self._montar_itens(self.conn.execute(sql, parametros).fetchall())
+
+    def listar_filhos(self, pasta_id, somente_pastas=None):
+        """Atalho de listar_filhos_em_lote para uma única pasta"""
+        return self.listar_filhos_em_lote([pasta_id], somente_pastas)
+
+    def buscar_pastas_por_nome(self, nome, pastas_pai_ids):
+        """
+        Busca subpastas pelo nome normalizado (sem acentos, sem maiúsculas)
+
+        Consulta indexada: não percorre as pastas de clientes.
+
+        Returns:
+            Lista de (pasta_pai_id, item no formato do files().list)
+        """
+        if not pastas_pai_ids:
+            return []
+        marcadores = ','.join('?' * len(pastas_pai_ids))
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT p.pasta_id, a.id, a.nome FROM arquivos a "
+                "JOIN parentes p ON p.arquivo_id = a.id "
+                f"WHERE a.nome_normalizado = ? AND a.mime_type = ? AND p.pasta_id IN ({marcadores}) "
+                "ORDER BY a.criado_em",
+                [normalizar_texto(nome).strip(), PASTA_MIME_TYPE] + list(pastas_pai_ids)
+            ).fetchall()
+        return [(pai, {'id': pasta_id, 'name': nome_pasta}) for pai, pasta_id, nome_pasta in rows]
+
+
+# ============================================================================
+# INSTÂNCIA COMPARTILHADA DO PROCESSO
+# ============================================================================
+
+_INDICE = None
+_LOCK_INDICE = threading.Lock()
+
+
+def raizes_indice_drive():
+    """Pastas indexadas: CLIENTES e as três pastas de tipo de ação"""
+    raizes = [
+        os.getenv('PASTA_CLIENTES'),
+        os.getenv('PASTA_RECONHECIMENTO_VINCULO'),
+        os.getenv('PASTA_ACAO_ACIDENTARIA'),
+        os.getenv('PASTA_DIFERENCAS_CONTRATUAIS')
+    ]
+    return list(dict.fromkeys(r for r in raizes if r))
+
+
+def obter_indice_drive(service, forcar_sincronizacao=False):
+    """
+    Retorna o índice local já sincronizado com o Drive
+
+    Semeia o índice na primeira chamada e, nas seguintes, consulta a Changes
+    API no máximo a cada INTERVALO_SINCRONIZACAO segundos (ou sempre, com
+    forcar_sincronizacao=True).
+
+    Returns:
+        IndiceDrive, ou None se o índice estiver desativado
+        (INDICE_DRIVE_ATIVO=0) ou indisponível. Quem chama deve então
+        consultar o Drive diretamente.
+    """
+    global _INDICE
+    # Só para o Drive: o armazenamento local (armazenamento.py) não tem files()
+    if os.getenv('INDICE_DRIVE_ATIVO', '1') != '1' or not hasattr(service, 'files'):
+        return None
+
+    try:
+        with _LOCK_INDICE:
+            if _INDICE is None:
+                raizes = raizes_indice_drive()
+                if not raizes:
+                    return None
+                _INDICE = IndiceDrive(INDICE_DRIVE_DB, raizes)
+
+            if not _INDICE.esta_semeado():
+                _INDICE.semear(service)
+            elif forcar_sincronizacao or time.time() - _INDICE.ultima_sincronizacao >= INTERVALO_SINCRONIZACAO:
+                _INDICE.sincronizar(service)
+
+        return _INDICE
+    except Exception as e:
+        print(f"    [INDICE DRIVE] Índice indisponível, consultando o Drive: {e}")
+        return None
+
+
+def buscar_pasta_cliente(service, cliente_nome, tipo_acao=None):
+    """
+    Localiza a pasta de um cliente pelo nome nas pastas de tipo de ação
+
+    A comparação ignora acentos e maiúsculas (normalizar_texto). Com o índice
+    ativo é uma consulta local; sem ele, lista as pastas de tipo no Drive.
+
+    Args:
+        service: Google Drive service
+        cliente_nome: Nome do cliente (como digitado no dashboard)
+        tipo_acao: Restringe a busca a um tipo (ex: 'ACAO_ACIDENTARIA')
+
+    Returns:
+        Dicionário {'id', 'name', 'tipo_acao', 'pasta_tipo_id'} ou None
+    """
+    tipos = [(t, pid) for t, pid in pastas_tipos_acao() if tipo_acao in (None, t)]
+    tipo_por_pasta = {pid: t for t, pid in tipos}
+    if not tipos:
+        return None
+
+    indice = obter_indice_drive(service)
+    if indice and all(indice.contem_pasta(pid) for pid in tipo_por_pasta):
+        encontrados = indice.buscar_pastas_por_nome(cliente_nome, list(tipo_por_pasta))
+        # Mantém a prioridade entre os tipos na mesma ordem do .env
+        encontrados.sort(key=lambda e: list(tipo_por_pasta).index(e[0]))
+    else:
+        alvo = normalizar_texto(cliente_nome).strip()
+        encontrados = []
+        for tipo, pasta_tipo_id in tipos:
+            query = f"'{pasta_tipo_id}' in parents and trashed=false and mimeType='{PASTA_MIME_TYPE}'"
+            for pasta in iterar_arquivos_drive(service, query, "id, name"):
+                if normalizar_texto(pasta['name']).strip() == alvo:
+                    encontrados.append((pasta_tipo_id, pasta))
+                    break
+            if encontrados:
+                break
+
+    if not encontrados:
+        return None
+    pasta_tipo_id, pasta = encontrados[0]
+    return dict(pasta, tipo_acao=tipo_por_pasta[pasta_tipo_id], pasta_tipo_id=pasta_tipo_id)
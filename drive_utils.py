@@ -0,0 +1,520 @@
+"""
+UTILITÁRIOS GOOGLE DRIVE
+Funções compartilhadas entre o worker (main_v10_fase3.py) e o dashboard (dashboard_server.py)
+"""
+
+import io
+import os
+import json
+import threading
+import unicodedata
+from datetime import datetime
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
+from dotenv import load_dotenv
+from limitador_drive import executar_drive, executar_drive_chamada
+
+load_dotenv()
+
+# Pastas de cada tipo de ação (variável de ambiente com o ID da pasta)
+VARIAVEIS_PASTAS_TIPOS = [
+    ('RECONHECIMENTO_VINCULO', 'PASTA_RECONHECIMENTO_VINCULO'),
+    ('ACAO_ACIDENTARIA', 'PASTA_ACAO_ACIDENTARIA'),
+    ('DIFERENCAS_CONTRATUAIS', 'PASTA_DIFERENCAS_CONTRATUAIS'),
+]
+
+# Pastas de petições geradas por tipo (auditoria e destino quando a
+# subpasta "Petições" do cliente não pode ser usada)
+VARIAVEIS_PASTAS_PETICOES = [
+    ('RECONHECIMENTO_VINCULO', 'PASTA_PETICOES_VINCULO'),
+    ('ACAO_ACIDENTARIA', 'PASTA_PETICOES_ACIDENTARIA'),
+    ('DIFERENCAS_CONTRATUAIS', 'PASTA_PETICOES_DIFERENCAS'),
+]
+
+# Maior pageSize aceito pelo files().list da API v3
+TAMANHO_PAGINA_MAXIMO = 1000
+
+# Quantas pastas entram em uma única consulta "'<id>' in parents or ..."
+# (mantém a query bem abaixo do limite de tamanho da API do Drive)
+MAX_PASTAS_POR_CONSULTA = 40
+
+# Limite de requisições por chamada batch da API do Drive
+MAX_REQUISICOES_POR_LOTE = 100
+
+MIME_DOCX = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# Uploads resumable: tamanho do bloco (múltiplo de 256 KB)
+TAMANHO_CHUNK_UPLOAD = 8 * 1024 * 1024
+
+PASTA_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# Arquivos nativos do Google (sem conteúdo binário): formato pedido ao files().export
+EXPORTACAO_NATIVOS = {
+    'application/vnd.google-apps.document': 'text/plain',
+    'application/vnd.google-apps.spreadsheet': 'text/csv',
+    'application/vnd.google-apps.presentation': 'text/plain',
+}
+
+# Estado processado: appProperty da pasta do cliente e o marcador antigo
+CHAVE_PROCESSADO = 'processado'
+NOME_MARCADOR_LEGADO = '_PROCESSADO.txt'
+
+# Cache persistente (pasta pai, nome) -> id das subpastas criadas pelo sistema
+CACHE_PASTAS_ARQUIVO = os.getenv('CACHE_PASTAS_ARQUIVO', 'cache_pastas.json')
+
+
+def normalizar_texto(texto):
+    """Remove acentos e caracteres especiais para comparação"""
+    if not texto:
+        return ""
+    # Normaliza para NFD (decompõe caracteres acentuados)
+    nfd = unicodedata.normalize('NFD', texto)
+    # Remove marcas diacríticas (acentos)
+    sem_acentos = ''.join(char for char in nfd if unicodedata.category(char) != 'Mn')
+    return sem_acentos.lower()
+
+
+def pastas_tipos_acao():
+    """Lista [(tipo_acao, pasta_id)] das pastas de tipo configuradas no .env"""
+    return [(tipo, os.getenv(variavel)) for tipo, variavel in VARIAVEIS_PASTAS_TIPOS if os.getenv(variavel)]
+
+
+def pastas_peticoes_geradas():
+    """{tipo_acao: pasta_id} das pastas de petições geradas configuradas no .env"""
+    return {tipo: os.getenv(variavel) for tipo, variavel in VARIAVEIS_PASTAS_PETICOES if os.getenv(variavel)}
+
+
+def iterar_paginas_drive(service, query, campos="id, name", tamanho_pagina=TAMANHO_PAGINA_MAXIMO, **kwargs):
+    """
+    Gerador que percorre TODAS as páginas de um files().list seguindo o nextPageToken
+
+    Args:
+        service: Google Drive service
+        query: Consulta do Drive (parâmetro q)
+        campos: Campos de cada arquivo (projeção mínima, ex: "id, name")
+        tamanho_pagina: pageSize de cada chamada
+        **kwargs: Parâmetros extras do files().list (ex: orderBy)
+
+    Yields:
+        Lista de arquivos de cada página
+    """
+    page_token = None
+    while True:
+        results = executar_drive(service.files().list(
+            q=query,
+            fields=f"nextPageToken, files({campos})",
+            pageSize=tamanho_pagina,
+            pageToken=page_token,
+            **kwargs
+        ))
+        yield results.get('files', [])
+
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+
+
+def iterar_arquivos_drive(service, query, campos="id, name", tamanho_pagina=TAMANHO_PAGINA_MAXIMO, **kwargs):
+    """
+    Gerador arquivo a arquivo sobre iterar_paginas_drive
+
+    Quem chama pode interromper a iteração (break) assim que encontrar o que
+    procura; as páginas seguintes não são buscadas.
+    """
+    for pagina in iterar_paginas_drive(service, query, campos, tamanho_pagina, **kwargs):
+        for item in pagina:
+            yield item
+
+
+def listar_filhos_em_lote(service, pastas_ids, campos="id, name, mimeType, parents"):
+    """
+    Lista arquivos E subpastas de várias pastas com uma consulta por lote
+
+    As pastas são agrupadas em cláusulas "'<id>' in parents" unidas por OR,
+    em lotes de MAX_PASTAS_POR_CONSULTA. O campo 'parents' deve estar na
+    projeção para que o chamador saiba a qual pasta cada item pertence.
+
+    Returns:
+        Lista de dicionários com os campos pedidos
+    """
+    itens = []
+    for i in range(0, len(pastas_ids), MAX_PASTAS_POR_CONSULTA):
+        lote = pastas_ids[i:i + MAX_PASTAS_POR_CONSULTA]
+        clausulas = " or ".join(f"'{pid}' in parents" for pid in lote)
+        query = f"({clausulas}) and trashed=false"
+        itens.extend(iterar_arquivos_drive(service, query, campos))
+    return itens
+
+
+def resolver_metadados_em_lote(service, arquivos_ids, campos="id, webViewLink, createdTime"):
+    """
+    Busca metadados de vários arquivos agrupando os files().get em BatchHttpRequest
+
+    Cada lote leva até MAX_REQUISICOES_POR_LOTE ids em uma única requisição HTTP.
+    Falhas individuais são ignoradas (o id simplesmente não aparece no retorno).
+
+    Returns:
+        Dicionário {id: metadados}
+    """
+    resultado = {}
+    ids = list(dict.fromkeys(arquivos_ids))
+
+    def _callback(request_id, resposta, exception):
+        if exception is not None:
+            print(f"Erro ao buscar metadados de {request_id}: {exception}")
+            return
+        resultado[request_id] = resposta
+
+    for i in range(0, len(ids), MAX_REQUISICOES_POR_LOTE):
+        lote = service.new_batch_http_request(callback=_callback)
+        for arquivo_id in ids[i:i + MAX_REQUISICOES_POR_LOTE]:
+            lote.add(service.files().get(fileId=arquivo_id, fields=campos), request_id=arquivo_id)
+        executar_drive_chamada(lote.execute, 'drive.batch', custo=len(ids[i:i + MAX_REQUISICOES_POR_LOTE]))
+
+    return resultado
+
+
+def completar_metadados(service, arquivos, campos_necessarios=('webViewLink', 'createdTime')):
+    """
+    Garante que cada arquivo da lista tenha os campos pedidos
+
+    Normalmente os campos já vêm na projeção da listagem; só os arquivos que
+    chegaram sem eles (ex: vindos do índice local) são resolvidos, em lote.
+    A lista é alterada no lugar e também devolvida.
+    """
+    faltantes = [a['id'] for a in arquivos if any(c not in a for c in campos_necessarios)]
+    if faltantes:
+        campos = "id, " + ", ".join(campos_necessarios)
+        metadados = resolver_metadados_em_lote(service, faltantes, campos)
+        for arquivo in arquivos:
+            for campo in campos_necessarios:
+                if campo not in arquivo and campo in metadados.get(arquivo['id'], {}):
+                    arquivo[campo] = metadados[arquivo['id']][campo]
+    return arquivos
+
+
+def documento_para_bytes(doc):
+    """Serializa um Document do python-docx direto em memória (sem arquivo temporário)"""
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def enviar_arquivo_drive(service, metadados, conteudo, mimetype, campos="id",
+                         tamanho_chunk=TAMANHO_CHUNK_UPLOAD):
+    """
+    Cria um arquivo no Drive com upload resumable a partir da memória
+
+    O envio é feito em blocos de tamanho_chunk; se um bloco falhar por erro
+    transitório (5xx, 429, conexão), executar_drive_chamada repete só aquele
+    bloco, retomando a sessão de upload em vez de recomeçar do zero.
+
+    Args:
+        service: Google Drive service
+        metadados: Corpo do files().create (name, parents, ...)
+        conteudo: bytes ou arquivo aberto em modo binário
+        mimetype: Tipo do conteúdo
+        campos: Campos devolvidos do arquivo criado
+
+    Returns:
+        Dicionário com os campos pedidos do arquivo criado
+    """
+    if isinstance(conteudo, (bytes, bytearray)):
+        conteudo = io.BytesIO(conteudo)
+    media = MediaIoBaseUpload(conteudo, mimetype=mimetype, chunksize=tamanho_chunk, resumable=True)
+    request = service.files().create(body=metadados, media_body=media, fields=campos)
+
+    resposta = None
+    while resposta is None:
+        status, resposta = executar_drive_chamada(request.next_chunk, 'drive.files.create.upload')
+    return resposta
+
+
+# ============================================================================
+# SUBPASTAS COM CACHE DE ID
+# ============================================================================
+
+class CachePastas:
+    """
+    Cache persistente (pasta pai, nome) -> folder_id em arquivo JSON
+
+    Compartilhado entre worker e dashboard (processos diferentes): cada gravação
+    relê o arquivo e mescla antes de substituir, para não perder entradas.
+    """
+
+    def __init__(self, caminho=CACHE_PASTAS_ARQUIVO):
+        self.caminho = caminho
+        self.lock = threading.Lock()
+        self.pastas = self._ler()
+        # Um lock por (pai, nome) para threads do mesmo processo não criarem em dobro
+        self.locks_chave = {}
+
+    @staticmethod
+    def _chave(pasta_pai_id, nome):
+        return f"{pasta_pai_id}/{nome}"
+
+    def _ler(self):
+        try:
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _gravar(self, alterar):
+        with self.lock:
+            self.pastas = self._ler()
+            alterar(self.pastas)
+            tmp = f"{self.caminho}.{os.getpid()}.tmp"
+            try:
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(self.pastas, f, ensure_ascii=False, indent=2)
+                os.replace(tmp, self.caminho)
+            except OSError as e:
+                print(f"[CACHE PASTAS] Não foi possível salvar {self.caminho}: {e}")
+
+    def lock_da_chave(self, pasta_pai_id, nome):
+        with self.lock:
+            return self.locks_chave.setdefault(self._chave(pasta_pai_id, nome), threading.Lock())
+
+    def obter(self, pasta_pai_id, nome):
+        with self.lock:
+            return self.pastas.get(self._chave(pasta_pai_id, nome))
+
+    def guardar(self, pasta_pai_id, nome, pasta_id):
+        chave = self._chave(pasta_pai_id, nome)
+        self._gravar(lambda pastas: pastas.__setitem__(chave, pasta_id))
+
+    def invalidar(self, pasta_pai_id, nome):
+        chave = self._chave(pasta_pai_id, nome)
+        self._gravar(lambda pastas: pastas.pop(chave, None))
+
+    def invalidar_id(self, pasta_id):
+        """Remove as entradas que apontam para pasta_id (pasta excluída)"""
+        def remover(pastas):
+            for chave in [c for c, valor in pastas.items() if valor == pasta_id]:
+                del pastas[chave]
+        self._gravar(remover)
+
+
+_CACHE_PASTAS = None
+_LOCK_CACHE_PASTAS = threading.Lock()
+
+
+def obter_cache_pastas():
+    """Retorna o cache de pastas do processo (criado na primeira chamada)"""
+    global _CACHE_PASTAS
+    with _LOCK_CACHE_PASTAS:
+        if _CACHE_PASTAS is None:
+            _CACHE_PASTAS = CachePastas()
+        return _CACHE_PASTAS
+
+
+def _buscar_pastas_por_nome(service, nome, pasta_pai_id):
+    """Pastas com esse nome dentro da pai, da mais antiga para a mais nova"""
+    nome_escapado = nome.replace("\\", "\\\\").replace("'", "\\'")
+    query = (
+        f"name='{nome_escapado}' and '{pasta_pai_id}' in parents "
+        f"and mimeType='{PASTA_MIME_TYPE}' and trashed=false"
+    )
+    return list(iterar_arquivos_drive(service, query, "id, name, createdTime", orderBy="createdTime"))
+
+
+def buscar_ou_criar_subpasta(service, nome, pasta_pai_id):
+    """
+    Retorna o id da subpasta 'nome' dentro de pasta_pai_id, criando se não existir
+
+    Para as subpastas do sistema (Cronologia, Resumos, petições...), onde o
+    nome identifica a pasta. Pastas criadas pelo usuário (clientes, "nova
+    pasta") usam criar_pasta: nomes repetidos são pastas diferentes.
+
+    Ordem: cache -> busca no Drive -> criação. O id em cache é usado sem
+    consulta ao Drive: se a pasta tiver sido excluída, o envio dentro dela dá
+    404 e enviar_arquivo_em_subpasta invalida a entrada e tenta de novo uma
+    vez; exclusões pelo dashboard já tiram o id do cache (esquecer_pasta).
+    Se dois jobs criarem a mesma pasta ao mesmo tempo, ambos refazem a busca
+    depois de criar, ficam com a MAIS ANTIGA e quem criou a duplicada a remove.
+
+    Returns:
+        Tupla (pasta_id, criada) onde criada indica se a pasta foi criada agora
+    """
+    cache = obter_cache_pastas()
+    pasta_id = cache.obter(pasta_pai_id, nome)
+    if pasta_id:
+        return pasta_id, False
+
+    with cache.lock_da_chave(pasta_pai_id, nome):
+        # Outra thread pode ter resolvido enquanto esperávamos o lock
+        pasta_id = cache.obter(pasta_pai_id, nome)
+        if pasta_id:
+            return pasta_id, False
+
+        existentes = _buscar_pastas_por_nome(service, nome, pasta_pai_id)
+        if existentes:
+            pasta_id = existentes[0]['id']
+            cache.guardar(pasta_pai_id, nome, pasta_id)
+            return pasta_id, False
+
+        criada = executar_drive(service.files().create(
+            body={'name': nome, 'mimeType': PASTA_MIME_TYPE, 'parents': [pasta_pai_id]},
+            fields='id'
+        ))
+        pasta_id = criada['id']
+
+        # Corrida entre processos: a mais antiga vence, a nossa duplicada sai
+        existentes = _buscar_pastas_por_nome(service, nome, pasta_pai_id)
+        if existentes and existentes[0]['id'] != pasta_id:
+            try:
+                executar_drive(service.files().delete(fileId=pasta_id))
+            except HttpError as e:
+                print(f"[CACHE PASTAS] Não foi possível remover pasta duplicada {pasta_id}: {e}")
+            pasta_id = existentes[0]['id']
+            cache.guardar(pasta_pai_id, nome, pasta_id)
+            return pasta_id, False
+
+        cache.guardar(pasta_pai_id, nome, pasta_id)
+        return pasta_id, True
+
+
+def criar_pasta(service, nome, pasta_pai_id):
+    """Cria sempre uma pasta nova (sem cache nem reaproveitamento por nome)"""
+    pasta = executar_drive(service.files().create(
+        body={'name': nome, 'mimeType': PASTA_MIME_TYPE, 'parents': [pasta_pai_id]},
+        fields='id'
+    ))
+    return pasta['id']
+
+
+def esquecer_pasta(pasta_id):
+    """Tira do cache de subpastas um id excluído pelo dashboard"""
+    obter_cache_pastas().invalidar_id(pasta_id)
+
+
+def enviar_arquivo_em_subpasta(service, nome_subpasta, pasta_pai_id, metadados, conteudo, mimetype, campos="id"):
+    """
+    enviar_arquivo_drive dentro da subpasta 'nome_subpasta' (resolvida pelo cache)
+
+    Se o id em cache não existir mais no Drive (404, pasta apagada), a entrada
+    é invalidada, a subpasta é resolvida de novo e o envio é repetido uma vez.
+
+    Returns:
+        Tupla (arquivo criado, pasta_id usada)
+    """
+    for tentativa in range(2):
+        pasta_id, _ = buscar_ou_criar_subpasta(service, nome_subpasta, pasta_pai_id)
+        corpo = dict(metadados, parents=[pasta_id])
+        try:
+            return enviar_arquivo_drive(service, corpo, conteudo, mimetype, campos), pasta_id
+        except HttpError as e:
+            if tentativa == 1 or e.resp.status != 404:
+                raise
+            print(f"[CACHE PASTAS] Pasta '{nome_subpasta}' ({pasta_id}) não existe mais, buscando de novo...")
+            obter_cache_pastas().invalidar(pasta_pai_id, nome_subpasta)
+
+
+# ============================================================================
+# ESTADO "PROCESSADO" DOS CLIENTES (appProperties da pasta)
+# ============================================================================
+
+def _limitar_bytes(texto, limite):
+    """Corta o texto em 'limite' bytes UTF-8 sem quebrar caracteres"""
+    return str(texto).encode('utf-8')[:limite].decode('utf-8', 'ignore')
+
+
+def marcar_pasta_processada(service, pasta_id, info_peticao=None):
+    """
+    Grava o estado processado como appProperties da pasta do cliente
+
+    O Drive limita chave + valor de cada appProperty a 124 bytes.
+    """
+    propriedades = {
+        CHAVE_PROCESSADO: '1',
+        'processado_em': datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    if info_peticao:
+        propriedades['peticao'] = _limitar_bytes(info_peticao.get('nome_arquivo', ''), 110)
+    executar_drive(service.files().update(fileId=pasta_id, body={'appProperties': propriedades}, fields='id'))
+
+
+def desmarcar_pasta_processada(service, pasta_id):
+    """
+    Tira o estado processado da pasta (o cliente volta a ser gerado)
+
+    Remove as appProperties gravadas por marcar_pasta_processada (valor None
+    apaga a chave) e exclui o _PROCESSADO.txt antigo, se houver.
+
+    Returns:
+        Quantos marcadores _PROCESSADO.txt foram excluídos
+    """
+    executar_drive(service.files().update(
+        fileId=pasta_id,
+        body={'appProperties': {CHAVE_PROCESSADO: None, 'processado_em': None, 'peticao': None}},
+        fields='id'
+    ))
+    query = f"'{pasta_id}' in parents and name='{NOME_MARCADOR_LEGADO}' and trashed=false"
+    marcadores = list(iterar_arquivos_drive(service, query, "id"))
+    for marcador in marcadores:
+        executar_drive(service.files().delete(fileId=marcador['id']))
+    return len(marcadores)
+
+
+def pasta_esta_processada(service, pasta_id):
+    """True se a pasta tem appProperties processado=1"""
+    meta = executar_drive(service.files().get(fileId=pasta_id, fields='appProperties'))
+    return meta.get('appProperties', {}).get(CHAVE_PROCESSADO) == '1'
+
+
+def listar_pastas_processadas(service, pasta_tipo_id):
+    """IDs das pastas de cliente marcadas como processadas (uma consulta por pasta de tipo)"""
+    query = (
+        f"'{pasta_tipo_id}' in parents and mimeType='{PASTA_MIME_TYPE}' and trashed=false "
+        f"and appProperties has {{ key='{CHAVE_PROCESSADO}' and value='1' }}"
+    )
+    return {pasta['id'] for pasta in iterar_arquivos_drive(service, query, "id")}
+
+
+def listar_pastas_com_marcador_legado(service, pastas_tipos_ids):
+    """
+    Pastas de clientes que ainda usam o arquivo _PROCESSADO.txt (formato antigo)
+
+    Uma consulta pelo nome do arquivo no Drive inteiro; o pai de cada
+    marcador só conta se for uma pasta de cliente (filha direta de uma das
+    pastas de tipo), para não marcar pastas de fora da árvore de clientes.
+    """
+    ids_tipos = [pasta_id for pasta_id in pastas_tipos_ids if pasta_id]
+    if not ids_tipos:
+        return set()
+    pastas_clientes = {
+        item['id'] for item in listar_filhos_em_lote(service, ids_tipos, "id, mimeType, parents")
+        if item.get('mimeType') == PASTA_MIME_TYPE
+    }
+
+    query = f"name='{NOME_MARCADOR_LEGADO}' and trashed=false"
+    pastas = set()
+    for marcador in iterar_arquivos_drive(service, query, "id, parents"):
+        pastas.update(marcador.get('parents', []))
+    return pastas & pastas_clientes
+
+
+def listar_clientes_processados(service, pastas_tipos_ids, migrar=False):
+    """
+    Conjunto de IDs das pastas de clientes já processadas
+
+    Consulta as appProperties de cada pasta de tipo e, para compatibilidade,
+    os marcadores _PROCESSADO.txt antigos. Só leitura por padrão (dashboard);
+    com migrar=True (worker), as pastas que só têm o marcador antigo recebem
+    as appProperties e na próxima vez saem da primeira consulta.
+    """
+    processados = set()
+    for pasta_tipo_id in pastas_tipos_ids:
+        if pasta_tipo_id:
+            processados |= listar_pastas_processadas(service, pasta_tipo_id)
+
+    legados = listar_pastas_com_marcador_legado(service, pastas_tipos_ids) - processados
+    if legados and migrar:
+        print(f"[PROCESSADO] Migrando {len(legados)} pasta(s) de _PROCESSADO.txt para appProperties...")
+        for pasta_id in legados:
+            try:
+                marcar_pasta_processada(service, pasta_id)
+            except HttpError as e:
+                print(f"[PROCESSADO] Não foi possível migrar {pasta_id}: {e}")
+    return processados | legados
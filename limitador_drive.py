@@ -0,0 +1,167 @@
+"""
+LIMITADOR DE COTA E NOVAS TENTATIVAS DO GOOGLE DRIVE
+Toda chamada ao Drive (worker e dashboard) passa por executar_drive:
+  - balde de fichas (token bucket) dimensionado pela cota do projeto
+  - backoff exponencial com jitter em erros temporários (429, 5xx,
+    403 rateLimitExceeded, quedas de conexão)
+  - contadores de chamadas/erros/novas tentativas por endpoint
+
+Com isso os downloads paralelos e as listagens em lote podem usar a cota
+inteira sem estourá-la, e um erro temporário não derruba o job.
+"""
+
+import os
+import ssl
+import json
+import time
+import random
+import socket
+import threading
+from googleapiclient.errors import HttpError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Cota: requisições por segundo em regime e tamanho máximo da rajada
+DRIVE_REQUISICOES_POR_SEGUNDO = float(os.getenv('DRIVE_REQUISICOES_POR_SEGUNDO', '10'))
+DRIVE_RAJADA_MAXIMA = int(os.getenv('DRIVE_RAJADA_MAXIMA', '20'))
+
+# Tentativas por chamada (a primeira + novas tentativas) e teto da espera
+DRIVE_MAX_TENTATIVAS = int(os.getenv('DRIVE_MAX_TENTATIVAS', '6'))
+ESPERA_MAXIMA_SEG = 32
+
+STATUS_REPETIVEIS = {429, 500, 502, 503, 504}
+MOTIVOS_403_REPETIVEIS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+
+class BaldeDeFichas:
+    """Token bucket thread-safe: 'taxa' fichas por segundo, até 'capacidade' acumuladas"""
+
+    def __init__(self, taxa, capacidade):
+        self.taxa = taxa
+        self.capacidade = max(1, capacidade)
+        self.fichas = float(self.capacidade)
+        self.atualizado_em = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consumir(self, quantidade=1):
+        """Bloqueia até haver 'quantidade' fichas disponíveis"""
+        if self.taxa <= 0:
+            return
+        quantidade = min(quantidade, self.capacidade)
+        while True:
+            with self.lock:
+                agora = time.monotonic()
+                self.fichas = min(self.capacidade, self.fichas + (agora - self.atualizado_em) * self.taxa)
+                self.atualizado_em = agora
+                if self.fichas >= quantidade:
+                    self.fichas -= quantidade
+                    return
+                espera = (quantidade - self.fichas) / self.taxa
+            time.sleep(espera)
+
+
+class ContadoresDrive:
+    """Chamadas, novas tentativas, erros e tempo acumulado por endpoint"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.por_endpoint = {}
+
+    def _entrada(self, endpoint):
+        return self.por_endpoint.setdefault(
+            endpoint, {'chamadas': 0, 'novas_tentativas': 0, 'erros': 0, 'tempo_total_seg': 0.0}
+        )
+
+    def registrar(self, endpoint, duracao, erro=False):
+        with self.lock:
+            entrada = self._entrada(endpoint)
+            entrada['chamadas'] += 1
+            entrada['tempo_total_seg'] += duracao
+            if erro:
+                entrada['erros'] += 1
+
+    def registrar_nova_tentativa(self, endpoint):
+        with self.lock:
+            self._entrada(endpoint)['novas_tentativas'] += 1
+
+    def resumo(self):
+        with self.lock:
+            return {
+                endpoint: dict(valores, tempo_total_seg=round(valores['tempo_total_seg'], 3))
+                for endpoint, valores in sorted(self.por_endpoint.items())
+            }
+
+
+_BALDE = BaldeDeFichas(DRIVE_REQUISICOES_POR_SEGUNDO, DRIVE_RAJADA_MAXIMA)
+_CONTADORES = ContadoresDrive()
+
+
+def _motivo_erro(erro):
+    """Extrai o 'reason' do corpo de um HttpError (ex: rateLimitExceeded)"""
+    try:
+        corpo = json.loads(erro.content.decode('utf-8') if isinstance(erro.content, bytes) else erro.content)
+        detalhes = corpo.get('error', {}).get('errors', [])
+        return detalhes[0].get('reason') if detalhes else None
+    except Exception:
+        return None
+
+
+def erro_repetivel(erro):
+    """True para erros temporários que valem nova tentativa"""
+    if isinstance(erro, HttpError):
+        status = erro.resp.status
+        if status in STATUS_REPETIVEIS:
+            return True
+        return status == 403 and _motivo_erro(erro) in MOTIVOS_403_REPETIVEIS
+    return isinstance(erro, (ConnectionError, TimeoutError, socket.timeout, ssl.SSLError))
+
+
+def nome_endpoint(requisicao):
+    """Nome do endpoint para os contadores (ex: drive.files.list)"""
+    return getattr(requisicao, 'methodId', None) or type(requisicao).__name__
+
+
+def executar_drive_chamada(funcao, endpoint, custo=1):
+    """
+    Executa funcao() respeitando a cota e repetindo em erros temporários
+
+    Usado diretamente para o que não é um HttpRequest comum, como o
+    next_chunk de downloads/uploads (que retoma do ponto onde parou).
+
+    Args:
+        funcao: Chamada sem argumentos que faz a requisição
+        endpoint: Nome para os contadores
+        custo: Quantas fichas da cota a chamada consome (ex: tamanho do batch)
+    """
+    for tentativa in range(DRIVE_MAX_TENTATIVAS):
+        _BALDE.consumir(custo)
+        inicio = time.monotonic()
+        try:
+            resultado = funcao()
+        except Exception as e:
+            _CONTADORES.registrar(endpoint, time.monotonic() - inicio, erro=True)
+            if tentativa == DRIVE_MAX_TENTATIVAS - 1 or not erro_repetivel(e):
+                raise
+            _CONTADORES.registrar_nova_tentativa(endpoint)
+            espera = min(ESPERA_MAXIMA_SEG, 2 ** tentativa) + random.uniform(0, 1)
+            print(f"    [DRIVE] {endpoint}: erro temporário ({e}). Nova tentativa em {espera:.1f}s...")
+            time.sleep(espera)
+            continue
+        _CONTADORES.registrar(endpoint, time.monotonic() - inicio)
+        return resultado
+
+
+def executar_drive(requisicao, custo=1):
+    """
+    Substituto de requisicao.execute() com limitador de cota e backoff
+
+    Exemplo:
+        executar_drive(service.files().get(fileId=arquivo_id, fields='id, name'))
+    """
+    return executar_drive_chamada(requisicao.execute, nome_endpoint(requisicao), custo)
+
+
+def estatisticas_drive():
+    """Contadores por endpoint desde o início do processo"""
+    return _CONTADORES.resumo()
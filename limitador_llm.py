@@ -0,0 +1,142 @@
+"""
+LIMITADOR DE CONCORRÊNCIA E TOKENS DAS CHAMADAS DE IA
+Com várias solicitações (flags) processadas ao mesmo tempo, toda chamada
+ao Claude (petição, cronologia, auditoria) e ao Gemini (transcrição) passa
+por vaga_llm:
+  - semáforo global: no máximo LLM_MAX_CONCORRENCIA requisições em voo
+  - balde de fichas de tokens de entrada por minuto (LLM_TOKENS_POR_MINUTO),
+    para respeitar o limite de taxa da conta em vez de tomar 429
+  - contadores de chamadas, tokens e tempo de espera na fila
+
+A estimativa de tokens (estimar_tokens) é local: ~3,5 caracteres por token
+no texto em português e, nas imagens, largura x altura / 750 (a regra da
+Anthropic), limitado ao custo de uma imagem no tamanho máximo.
+"""
+
+import io
+import os
+import time
+import base64
+import threading
+from contextlib import contextmanager
+from PIL import Image
+from dotenv import load_dotenv
+from limitador_drive import BaldeDeFichas
+
+load_dotenv()
+
+LLM_MAX_CONCORRENCIA = int(os.getenv('LLM_MAX_CONCORRENCIA', '4'))
+
+# Tokens de entrada por minuto da conta (0 = sem limite local)
+LLM_TOKENS_POR_MINUTO = int(os.getenv('LLM_TOKENS_POR_MINUTO', '0'))
+
+CARACTERES_POR_TOKEN = 3.5
+TOKENS_POR_IMAGEM = 1600
+PIXELS_POR_TOKEN = 750
+
+
+def tokens_imagem(dados_base64):
+    """Tokens de uma imagem em base64 pelo tamanho em pixels (só lê o cabeçalho)"""
+    try:
+        largura, altura = Image.open(io.BytesIO(base64.b64decode(dados_base64))).size
+    except Exception:
+        return TOKENS_POR_IMAGEM
+    return min(TOKENS_POR_IMAGEM, int(largura * altura / PIXELS_POR_TOKEN) + 1)
+
+
+def estimar_tokens_conteudo(conteudo):
+    """Tokens de um conteúdo de mensagem/system (texto ou lista de blocos)"""
+    if isinstance(conteudo, str):
+        return int(len(conteudo) / CARACTERES_POR_TOKEN) + 1
+    total = 0
+    for bloco in conteudo or []:
+        tipo = bloco.get('type')
+        if tipo == 'text':
+            total += estimar_tokens_conteudo(bloco.get('text', ''))
+        elif tipo == 'image':
+            total += tokens_imagem(bloco.get('source', {}).get('data', ''))
+        elif tipo == 'document':
+            total += TOKENS_POR_IMAGEM
+    return total
+
+
+def estimar_tokens(parametros):
+    """Tokens de entrada estimados de uma chamada messages.create/stream"""
+    total = estimar_tokens_conteudo(parametros.get('system', ''))
+    for mensagem in parametros.get('messages', []):
+        total += estimar_tokens_conteudo(mensagem.get('content'))
+    return total
+
+
+class ContadoresLLM:
+    """Chamadas, tokens estimados e espera na fila por etapa"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.em_andamento = 0
+        self.por_etapa = {}
+
+    def registrar(self, etapa, tokens, espera):
+        with self.lock:
+            entrada = self.por_etapa.setdefault(
+                etapa, {'chamadas': 0, 'tokens_estimados': 0, 'espera_total_seg': 0.0}
+            )
+            entrada['chamadas'] += 1
+            entrada['tokens_estimados'] += tokens
+            entrada['espera_total_seg'] += espera
+
+    def resumo(self):
+        with self.lock:
+            return {
+                'em_andamento': self.em_andamento,
+                'por_etapa': {
+                    etapa: dict(valores, espera_total_seg=round(valores['espera_total_seg'], 3))
+                    for etapa, valores in sorted(self.por_etapa.items())
+                },
+            }
+
+
+_SEMAFORO = threading.BoundedSemaphore(max(1, LLM_MAX_CONCORRENCIA))
+_BALDE = BaldeDeFichas(LLM_TOKENS_POR_MINUTO / 60.0, LLM_TOKENS_POR_MINUTO)
+_CONTADORES = ContadoresLLM()
+
+
+@contextmanager
+def vaga_llm(etapa, parametros=None):
+    """
+    Reserva uma vaga de requisição e as fichas de tokens antes de chamar a IA
+
+    A vaga fica presa durante todo o bloco (inclusive o consumo de um
+    stream). Exemplo:
+        with vaga_llm("cronologia", parametros):
+            message = anthropic_client.messages.create(**parametros)
+
+    Args:
+        etapa: Nome para os contadores/logs
+        parametros: Argumentos da chamada Claude, para estimar os tokens
+            (None para chamadas sem estimativa, como o Gemini)
+    """
+    tokens = estimar_tokens(parametros) if parametros else 0
+    inicio = time.monotonic()
+    _SEMAFORO.acquire()
+    try:
+        if tokens:
+            _BALDE.consumir(tokens)
+        espera = time.monotonic() - inicio
+        if espera >= 1:
+            print(f"        [IA] {etapa}: {espera:.1f}s na fila (limite de concorrência/tokens)")
+        _CONTADORES.registrar(etapa, tokens, espera)
+        with _CONTADORES.lock:
+            _CONTADORES.em_andamento += 1
+        try:
+            yield
+        finally:
+            with _CONTADORES.lock:
+                _CONTADORES.em_andamento -= 1
+    finally:
+        _SEMAFORO.release()
+
+
+def estatisticas_llm():
+    """Contadores desde o início do processo"""
+    return _CONTADORES.resumo()
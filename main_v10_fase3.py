@@ -9,14 +9,8 @@ import time
 import json
 import schedule
 import glob
-import unicodedata
 from datetime import datetime
 from dotenv import load_dotenv
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
 from anthropic import Anthropic
 import httpx  # Para configurar timeout
 import io
@@ -27,10 +21,25 @@ import tempfile
 import base64
 import google.generativeai as genai
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from limitador_drive import estatisticas_drive
+from limitador_llm import vaga_llm
+from orcamento_tokens import criar_item, montar_conteudo_no_orcamento
+from drive_utils import (normalizar_texto, documento_para_bytes, pastas_peticoes_geradas,
+                         MIME_DOCX, NOME_MARCADOR_LEGADO, EXPORTACAO_NATIVOS)
+from drive_index import obter_indice_drive
+from armazenamento import obter_armazenamento, obter_service_armazenamento
+from cache_downloads import obter_cache_downloads, versao_drive
+from cache_modelos import obter_cache_modelos
+from auditoria_lote import (AUDITORIA_MODO, AUDITORIA_LOTE_INTERVALO_SEG, obter_cliente_lotes, enviar_lote,
+                            aguardar_lote, iterar_resultados, carregar_lote_pendente, limpar_lote_pendente)
+from deduplicacao import (deduplicar_arquivos, deduplicar_imagens, imprimir_duplicados,
+                          DEDUP_IMAGENS_DISTANCIA_MAXIMA, EXTENSOES_IMAGEM)
 
 # Importar módulo Prompt Master (opcional - para petições de alto nível)
 try:
-    from prompt_master import gerar_prompt_master
+    from prompt_master import gerar_prompt_master_em_blocos
     from validacao_prompt_master import gerar_relatorio_validacao_master, imprimir_relatorio_validacao
     PROMPT_MASTER_DISPONIVEL = True
 except ImportError:
@@ -39,7 +48,6 @@ except ImportError:
 
 load_dotenv()
 
-SCOPES = ['https://www.googleapis.com/auth/drive']
 ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
 
 # Configurar cliente Anthropic com timeout para evitar travamentos
@@ -54,16 +62,6 @@ GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
 
-def normalizar_texto(texto):
-    """Remove acentos e caracteres especiais para comparação"""
-    if not texto:
-        return ""
-    # Normaliza para NFD (decompõe caracteres acentuados)
-    nfd = unicodedata.normalize('NFD', texto)
-    # Remove marcas diacríticas (acentos)
-    sem_acentos = ''.join(char for char in nfd if unicodedata.category(char) != 'Mn')
-    return sem_acentos.lower()
-
 # ============================================================================
 # CHECKLIST V4.0 - SISTEMA DE 3 PRIORIDADES
 # ============================================================================
@@ -111,17 +109,47 @@ def agente_cronologia(texto_transcricao, cliente_nome):
         {texto_transcricao[:50000]}
         """
         
-        message = anthropic_client.messages.create(
+        parametros = dict(
             model="claude-sonnet-4-20250514",
             max_tokens=16000,
             system="Você é um especialista em extração de fatos cronológicos.",
             messages=[{"role": "user", "content": prompt}]
         )
+        with vaga_llm("cronologia", parametros):
+            message = anthropic_client.messages.create(**parametros)
         return message.content[0].text
     except Exception as e:
         print(f"         Erro na cronologia: {e}")
         return None
 
+def montar_system_com_cache(parte_fixa, dados_cliente=None):
+    """
+    System prompt em blocos para o cache de prompt da Anthropic
+    
+    A parte fixa (protocolo, instruções, modelo do tipo de processo) é igual
+    para todos os clientes do tipo e leva o breakpoint cache_control: nas
+    chamadas seguintes (dentro do TTL do cache) ela é lida do cache, mais
+    barata e com menor tempo até o primeiro token. Os dados do cliente vêm
+    depois do breakpoint e não invalidam o cache.
+    """
+    blocos = [{"type": "text", "text": parte_fixa, "cache_control": {"type": "ephemeral"}}]
+    if dados_cliente:
+        blocos.append({"type": "text", "text": dados_cliente})
+    return blocos
+
+def registrar_uso_tokens(message, etapa, duracao_seg=None):
+    """Loga os tokens da chamada, inclusive leitura/gravação do cache de prompt"""
+    uso = getattr(message, 'usage', None)
+    if uso is None:
+        return
+    lidos = getattr(uso, 'cache_read_input_tokens', None) or 0
+    gravados = getattr(uso, 'cache_creation_input_tokens', None) or 0
+    linha = (f"        - Tokens ({etapa}): entrada {uso.input_tokens}, saída {uso.output_tokens}, "
+             f"cache lido {lidos}, cache gravado {gravados}")
+    if duracao_seg is not None:
+        linha += f" - {duracao_seg:.1f}s"
+    print(linha)
+
 def salvar_cronologia_docx(service, texto_cronologia, cliente_nome, pasta_id):
     """Salva a cronologia em DOCX no Drive"""
     print(f"        [AGENTE CRONOLOGIA] Salvando arquivo...")
@@ -134,46 +162,14 @@ def salvar_cronologia_docx(service, texto_cronologia, cliente_nome, pasta_id):
             if paragrafo.strip():
                 doc.add_paragraph(paragrafo.strip())
                 
-        # Salvar temporariamente
-        temp_filename = f'Cronologia_Fatos_{int(time.time())}.docx'
-        temp_path = os.path.join(tempfile.gettempdir(), temp_filename)
-        doc.save(temp_path)
-        
-        # Criar/buscar subpasta "Cronologia dos Fatos" dentro da pasta do cliente
-        pasta_cronologia_id = buscar_ou_criar_pasta(service, "Cronologia dos Fatos", pasta_id)
+        # Upload para a subpasta "Cronologia dos Fatos" dentro da pasta do cliente
+        file_metadata = {'name': 'Cronologia_Fatos.docx'}
+        arquivo, pasta_cronologia_id = obter_armazenamento(service).enviar_em_subpasta(
+            "Cronologia dos Fatos", pasta_id,
+            file_metadata, documento_para_bytes(doc), MIME_DOCX
+        )
         print(f"        [AGENTE CRONOLOGIA] Pasta destino: {pasta_cronologia_id}")
-
-        # Upload para o Drive
-        file_metadata = {
-            'name': 'Cronologia_Fatos.docx',
-            'parents': [pasta_cronologia_id]
-        }
-        
-        # Usar try-finally para garantir que recursos sejam liberados
-        media = None
-        try:
-            media = MediaFileUpload(temp_path, mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-            
-            arquivo = service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id'
-            ).execute()
-            
-            print(f"         Cronologia salva! ID: {arquivo.get('id')}")
-            
-        finally:
-            # Tentar fechar o media se possível (algumas implementações exigem)
-            if media and hasattr(media, 'stream') and media.stream:
-                try:
-                    media.stream.close()
-                except:
-                    pass
-
-        try:
-            os.remove(temp_path)
-        except Exception as e:
-            print(f"         Aviso: Não foi possível remover arquivo temporário {temp_path}: {e}")
+        print(f"         Cronologia salva! ID: {arquivo.get('id')}")
             
         return True
     except Exception as e:
@@ -185,48 +181,19 @@ def salvar_cronologia_docx(service, texto_cronologia, cliente_nome, pasta_id):
 # ============================================================================
 
 def buscar_ou_criar_pasta(service, nome_pasta, pasta_pai_id):
-    """Busca uma pasta pelo nome dentro de uma pasta pai, ou cria se não existir"""
+    """Busca uma pasta pelo nome dentro de uma pasta pai (cache de ids), ou cria se não existir"""
     try:
-        # Buscar pasta existente
-        query = f"name='{nome_pasta}' and '{pasta_pai_id}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false"
-        results = service.files().list(q=query, fields="files(id, name)").execute()
-        items = results.get('files', [])
-        
-        if items:
-            print(f"         Pasta '{nome_pasta}' encontrada: {items[0]['id']}")
-            return items[0]['id']
-        
-        # Criar nova pasta
-        file_metadata = {
-            'name': nome_pasta,
-            'mimeType': 'application/vnd.google-apps.folder',
-            'parents': [pasta_pai_id]
-        }
-        folder = service.files().create(body=file_metadata, fields='id').execute()
-        print(f"         Pasta '{nome_pasta}' criada: {folder.get('id')}")
-        return folder.get('id')
+        pasta_id, criada = obter_armazenamento(service).buscar_ou_criar_subpasta(nome_pasta, pasta_pai_id)
+        if criada:
+            print(f"         Pasta '{nome_pasta}' criada: {pasta_id}")
+        else:
+            print(f"         Pasta '{nome_pasta}' encontrada: {pasta_id}")
+        return pasta_id
         
     except Exception as e:
         print(f"         Erro ao buscar/criar pasta: {e}")
         return None
 
-def baixar_arquivo(service, file_id):
-    """Baixa arquivo do Google Drive"""
-    try:
-        request = service.files().get_media(fileId=file_id)
-        file_stream = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_stream, request)
-        
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-        
-        file_stream.seek(0)
-        return file_stream.read()
-    except Exception as e:
-        print(f"         Erro ao baixar arquivo: {e}")
-        return None
-
 def agente_transcricao_video(service, video_id, video_nome, cliente_nome, pasta_cliente_id):
     """
     Transcreve vídeo usando Gemini API e salva em pasta dedicada
@@ -289,22 +256,23 @@ def agente_transcricao_video(service, video_id, video_nome, cliente_nome, pasta_
         # 3. Baixar vídeo do Drive
         print(f"        ⬇ Baixando vídeo do Drive...")
         atualizar_progresso("Baixando vídeo do Google Drive...", 1)
-        video_bytes = baixar_arquivo(service, video_id)
+        # 4. Salvar temporariamente (download em stream direto para o disco)
+        extensao = os.path.splitext(video_nome)[1]
+        temp_video_path = os.path.join(tempfile.gettempdir(), f'video_temp_{int(time.time())}{extensao}')
+        
+        tamanho_video = baixar_arquivo_para_caminho(service, video_id, temp_video_path)
         
-        if not video_bytes:
+        if not tamanho_video:
+            try:
+                os.remove(temp_video_path)
+            except:
+                pass
             return {
                 'success': False,
                 'error': 'Não foi possível baixar o vídeo do Drive'
             }
         
-        # 4. Salvar temporariamente
-        extensao = os.path.splitext(video_nome)[1]
-        temp_video_path = os.path.join(tempfile.gettempdir(), f'video_temp_{int(time.time())}{extensao}')
-        
-        with open(temp_video_path, 'wb') as f:
-            f.write(video_bytes)
-        
-        print(f"         Vídeo salvo: {temp_video_path} ({len(video_bytes) / (1024*1024):.2f} MB)")
+        print(f"         Vídeo salvo: {temp_video_path} ({tamanho_video / (1024*1024):.2f} MB)")
         
         # 5. Upload para Gemini e transcrever
         print(f"         Enviando para Gemini API...")
@@ -381,10 +349,11 @@ def agente_transcricao_video(service, video_id, video_nome, cliente_nome, pasta_
                     }
                 ]
 
-                response = model.generate_content(
-                    [video_file, prompt],
-                    safety_settings=safety_settings
-                )
+                with vaga_llm("transcrição"):
+                    response = model.generate_content(
+                        [video_file, prompt],
+                        safety_settings=safety_settings
+                    )
                 texto_transcricao = response.text
             except Exception as api_error:
                 print(f"         ERRO na API Gemini: {api_error}")
@@ -417,36 +386,18 @@ def agente_transcricao_video(service, video_id, video_nome, cliente_nome, pasta_
             if paragrafo.strip():
                 doc.add_paragraph(paragrafo.strip())
         
-        # Salvar temporariamente
-        nome_base = os.path.splitext(video_nome)[0]
         # MUDANÇA: Prefixo RESUMO_
-        temp_docx_filename = f'RESUMO_{nome_base}_{int(time.time())}.docx'
-        temp_docx_path = os.path.join(tempfile.gettempdir(), temp_docx_filename)
-        doc.save(temp_docx_path)
+        nome_base = os.path.splitext(video_nome)[0]
         
         # Upload para Drive na pasta de transcrições
-        file_metadata = {
-            'name': f'RESUMO_{nome_base}.docx',
-            'parents': [pasta_transcricoes_id]
-        }
+        file_metadata = {'name': f'RESUMO_{nome_base}.docx'}
         
-        media = MediaFileUpload(
-            temp_docx_path,
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+        arquivo, pasta_transcricoes_id = obter_armazenamento(service).enviar_em_subpasta(
+            "Transcrições de Vídeo", pasta_cliente_id,
+            file_metadata, documento_para_bytes(doc), MIME_DOCX,
+            campos='id, name, webViewLink'
         )
         
-        arquivo = service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id, name, webViewLink'
-        ).execute()
-        
-        # Limpar arquivo temporário
-        try:
-            os.remove(temp_docx_path)
-        except:
-            pass
-        
         print(f"         Resumo salvo no Drive!")
         print(f"         Arquivo: {arquivo.get('name')}")
         print(f"         ID: {arquivo.get('id')}")
@@ -614,6 +565,29 @@ PRINTS_POR_TIPO = {
 
 ESTATISTICAS_FILE = 'estatisticas_escritorio.json'
 
+# Várias flags processadas em paralelo: leitura-modificação-escrita dos JSON sob lock
+LOCK_ESTATISTICAS = threading.RLock()
+
+def gravar_json(caminho, dados):
+    """
+    Escrita atômica (o dashboard nunca lê um JSON pela metade)
+    
+    No docker-compose o histórico e as estatísticas são montados como
+    arquivo único (bind mount), onde o rename falha com EBUSY: nesse caso
+    grava no próprio arquivo (os writers do processo já estão sob lock).
+    """
+    tmp = f"{caminho}.tmp.{threading.get_ident()}"
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(dados, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, caminho)
+    except OSError:
+        with open(caminho, 'w', encoding='utf-8') as f:
+            json.dump(dados, f, indent=2, ensure_ascii=False)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
 def carregar_estatisticas():
     """Carrega estatísticas globais do escritório"""
     try:
@@ -639,50 +613,50 @@ def carregar_estatisticas():
 def atualizar_estatisticas(tipo_processo, score, aprovada, tempo_geracao=0):
     """Atualiza estatísticas globais após cada petição"""
     try:
-        stats = carregar_estatisticas()
-        
-        # Totais gerais
-        stats['total_peticoes'] = stats.get('total_peticoes', 0) + 1
-        if aprovada:
-            stats['total_aprovadas'] = stats.get('total_aprovadas', 0) + 1
-        else:
-            stats['total_rejeitadas'] = stats.get('total_rejeitadas', 0) + 1
-        
-        # Por tipo
-        if 'por_tipo' not in stats:
-            stats['por_tipo'] = {}
-        if tipo_processo not in stats['por_tipo']:
-            stats['por_tipo'][tipo_processo] = {'total': 0, 'aprovadas': 0, 'score_medio': 0, 'scores': []}
-        
-        tipo_stats = stats['por_tipo'][tipo_processo]
-        tipo_stats['total'] += 1
-        if aprovada:
-            tipo_stats['aprovadas'] += 1
-        tipo_stats['scores'].append(score)
-        tipo_stats['score_medio'] = sum(tipo_stats['scores']) / len(tipo_stats['scores'])
-        
-        # Score médio geral
-        todos_scores = []
-        for tipo_data in stats['por_tipo'].values():
-            todos_scores.extend(tipo_data.get('scores', []))
-        if todos_scores:
-            stats['score_medio_geral'] = sum(todos_scores) / len(todos_scores)
-        
-        # Tempo médio
-        if tempo_geracao > 0:
-            if 'tempos' not in stats:
-                stats['tempos'] = []
-            stats['tempos'].append(tempo_geracao)
-            stats['tempo_medio_geracao'] = sum(stats['tempos']) / len(stats['tempos'])
-        
-        # Taxa de aprovação
-        if stats['total_peticoes'] > 0:
-            stats['taxa_aprovacao'] = (stats['total_aprovadas'] / stats['total_peticoes']) * 100
-        
-        with open(ESTATISTICAS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(stats, f, indent=2, ensure_ascii=False)
-        
-        return stats
+        with LOCK_ESTATISTICAS:
+            stats = carregar_estatisticas()
+            
+            # Totais gerais
+            stats['total_peticoes'] = stats.get('total_peticoes', 0) + 1
+            if aprovada:
+                stats['total_aprovadas'] = stats.get('total_aprovadas', 0) + 1
+            else:
+                stats['total_rejeitadas'] = stats.get('total_rejeitadas', 0) + 1
+            
+            # Por tipo
+            if 'por_tipo' not in stats:
+                stats['por_tipo'] = {}
+            if tipo_processo not in stats['por_tipo']:
+                stats['por_tipo'][tipo_processo] = {'total': 0, 'aprovadas': 0, 'score_medio': 0, 'scores': []}
+            
+            tipo_stats = stats['por_tipo'][tipo_processo]
+            tipo_stats['total'] += 1
+            if aprovada:
+                tipo_stats['aprovadas'] += 1
+            tipo_stats['scores'].append(score)
+            tipo_stats['score_medio'] = sum(tipo_stats['scores']) / len(tipo_stats['scores'])
+            
+            # Score médio geral
+            todos_scores = []
+            for tipo_data in stats['por_tipo'].values():
+                todos_scores.extend(tipo_data.get('scores', []))
+            if todos_scores:
+                stats['score_medio_geral'] = sum(todos_scores) / len(todos_scores)
+            
+            # Tempo médio
+            if tempo_geracao > 0:
+                if 'tempos' not in stats:
+                    stats['tempos'] = []
+                stats['tempos'].append(tempo_geracao)
+                stats['tempo_medio_geracao'] = sum(stats['tempos']) / len(stats['tempos'])
+            
+            # Taxa de aprovação
+            if stats['total_peticoes'] > 0:
+                stats['taxa_aprovacao'] = (stats['total_aprovadas'] / stats['total_peticoes']) * 100
+            
+            gravar_json(ESTATISTICAS_FILE, stats)
+            
+            return stats
     except Exception as e:
         print(f"Erro ao atualizar estatísticas: {e}")
         return None
@@ -895,8 +869,9 @@ def inserir_marcadores_prints(texto_peticao, tipo_acao, arquivos_cliente):
         # Retornar valores seguros
         return texto_peticao, [], {'ALTA': [], 'MEDIA': [], 'BAIXA': []}, False
 
-def gerar_relatorio_prints(tipo_acao, marcadores_inseridos, prints_faltantes, tem_criticos_faltantes, cliente_nome):
-    """Gera relatório detalhado de prints"""
+def gerar_relatorio_prints(tipo_acao, marcadores_inseridos, prints_faltantes, tem_criticos_faltantes, cliente_nome,
+                           duplicados=None):
+    """Gera relatório detalhado de prints (e das duplicatas ignoradas, ver deduplicacao.py)"""
     
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     arquivo_log = f"logs_prints/prints_{cliente_nome}_{timestamp}.txt"
@@ -969,6 +944,23 @@ PRINTS FALTANTES POR PRIORIDADE
             conteudo += f"   • {print_nome}\n"
         conteudo += "\n"
     
+    if duplicados:
+        conteudo += f"""
+{'='*80}
+ARQUIVOS DUPLICADOS IGNORADOS
+{'='*80}
+
+Não enviados à IA por serem cópia de outro arquivo do cliente: {len(duplicados)}
+
+"""
+        for dup in duplicados:
+            criterio = 'conteúdo idêntico (md5)' if dup['criterio'] == 'md5' else 'imagem semelhante'
+            conteudo += f"   • {dup['arquivo']}"
+            if dup.get('pasta_origem'):
+                conteudo += f" ({dup['pasta_origem']})"
+            conteudo += f"\n     = {dup['igual_a']} - {criterio}\n"
+        conteudo += "\n"
+    
     conteudo += f"""
 {'='*80}
 DECISÃO FINAL
@@ -1024,16 +1016,14 @@ MODELOS_IDS = {
     'DIFERENCAS_CONTRATUAIS': os.getenv('MODELO_DIFERENCAS_ID')
 }
 
-PASTAS_PETICOES_GERADAS = {
-    'RECONHECIMENTO_VINCULO': '1ya29qkIu8J2O1idmlco9HwSqCFKSsxTm',
-    'ACAO_ACIDENTARIA': '1OE_MFrNmzrDKTQ4iJN30qhMc95cEfI1P',
-    'DIFERENCAS_CONTRATUAIS': '1edqtmAgtZI_B4GvcmXrn8mSRK9DpU-BE'
-}
+# PASTA_PETICOES_VINCULO / _ACIDENTARIA / _DIFERENCAS (IDs do Drive ou caminhos no modo local)
+PASTAS_PETICOES_GERADAS = pastas_peticoes_geradas()
 
 CLIENTES_PROCESSADOS_SESSAO = set()
 
 # Sistema de histórico de petições
 HISTORICO_FILE = 'historico_peticoes.json'
+LOCK_HISTORICO = threading.RLock()
 
 def carregar_historico():
     """Carrega histórico de petições geradas"""
@@ -1048,24 +1038,24 @@ def carregar_historico():
 def salvar_no_historico(cliente_nome, tipo_processo, arquivo_info):
     """Salva petição no histórico"""
     try:
-        historico = carregar_historico()
-        
-        entrada = {
-            'cliente': cliente_nome,
-            'tipo_processo': tipo_processo,
-            'arquivo_nome': arquivo_info.get('name'),
-            'arquivo_id': arquivo_info.get('id'),
-            'link': arquivo_info.get('webViewLink'),
-            'data_geracao': datetime.now().isoformat(),
-            'status': 'gerada'  # gerada, auditada, aprovada, rejeitada
-        }
-        
-        historico.append(entrada)
-        
-        with open(HISTORICO_FILE, 'w', encoding='utf-8') as f:
-            json.dump(historico, f, indent=2, ensure_ascii=False)
-        
-        return True
+        with LOCK_HISTORICO:
+            historico = carregar_historico()
+            
+            entrada = {
+                'cliente': cliente_nome,
+                'tipo_processo': tipo_processo,
+                'arquivo_nome': arquivo_info.get('name'),
+                'arquivo_id': arquivo_info.get('id'),
+                'link': arquivo_info.get('webViewLink'),
+                'data_geracao': datetime.now().isoformat(),
+                'status': 'gerada'  # gerada, auditada, aprovada, rejeitada
+            }
+            
+            historico.append(entrada)
+            
+            gravar_json(HISTORICO_FILE, historico)
+            
+            return True
     except Exception as e:
         print(f"Erro ao salvar histórico: {e}")
         return False
@@ -1073,39 +1063,39 @@ def salvar_no_historico(cliente_nome, tipo_processo, arquivo_info):
 def atualizar_status_historico(arquivo_id, status, score=None, erros=None, relatorio=None):
     """Atualiza status de uma petição no histórico"""
     try:
-        historico = carregar_historico()
-        
-        for entrada in historico:
-            if entrada.get('arquivo_id') == arquivo_id:
-                entrada['status'] = status
-                entrada['data_auditoria'] = datetime.now().isoformat()
-                if score is not None:
-                    entrada['score'] = score
-                    # Adicionar ranking baseado no score
-                    if score >= 90:
-                        entrada['ranking'] = "EXCELENTE"
-                    elif score >= 80:
-                        entrada['ranking'] = "MUITO BOM"
-                    elif score >= 70:
-                        entrada['ranking'] = "BOM"
-                    elif score >= 60:
-                        entrada['ranking'] = "SATISFATÓRIO"
-                    else:
-                        entrada['ranking'] = "PRECISA MELHORAR"
+        with LOCK_HISTORICO:
+            historico = carregar_historico()
+            
+            for entrada in historico:
+                if entrada.get('arquivo_id') == arquivo_id:
+                    entrada['status'] = status
+                    entrada['data_auditoria'] = datetime.now().isoformat()
+                    if score is not None:
+                        entrada['score'] = score
+                        # Adicionar ranking baseado no score
+                        if score >= 90:
+                            entrada['ranking'] = "EXCELENTE"
+                        elif score >= 80:
+                            entrada['ranking'] = "MUITO BOM"
+                        elif score >= 70:
+                            entrada['ranking'] = "BOM"
+                        elif score >= 60:
+                            entrada['ranking'] = "SATISFATÓRIO"
+                        else:
+                            entrada['ranking'] = "PRECISA MELHORAR"
                     
-                    # DEBUG: Verificar ranking calculado
-                    print(f"   Histórico atualizado: Status={status}, Score={score}, Ranking={entrada['ranking']}")
+                        # DEBUG: Verificar ranking calculado
+                        print(f"   Histórico atualizado: Status={status}, Score={score}, Ranking={entrada['ranking']}")
                     
-                if erros:
-                    entrada['erros'] = erros
-                if relatorio:
-                    entrada['relatorio_auditoria'] = relatorio
-                break
-        
-        with open(HISTORICO_FILE, 'w', encoding='utf-8') as f:
-            json.dump(historico, f, indent=2, ensure_ascii=False)
-        
-        return True
+                    if erros:
+                        entrada['erros'] = erros
+                    if relatorio:
+                        entrada['relatorio_auditoria'] = relatorio
+                    break
+            
+            gravar_json(HISTORICO_FILE, historico)
+            
+            return True
     except Exception as e:
         print(f"Erro ao atualizar histórico: {e}")
         return False
@@ -1116,34 +1106,34 @@ def atualizar_status_processamento(cliente_nome, tipo_processo, status_texto):
     Usado para feedback em tempo real
     """
     try:
-        historico = carregar_historico()
-        
-        # Procurar por cliente e tipo
-        encontrou = False
-        for entrada in historico:
-            if (entrada.get('cliente', '').lower() == cliente_nome.lower() and 
-                entrada.get('tipo_processo') == tipo_processo):
-                entrada['status_processamento'] = status_texto
-                entrada['ultima_atualizacao'] = datetime.now().isoformat()
-                encontrou = True
-                break
-        
-        # Se não encontrou, criar entrada temporária
-        if not encontrou:
-            entrada_temp = {
-                'cliente': cliente_nome,
-                'tipo_processo': tipo_processo,
-                'status': 'processando',
-                'status_processamento': status_texto,
-                'data_geracao': datetime.now().isoformat(),
-                'ultima_atualizacao': datetime.now().isoformat()
-            }
-            historico.append(entrada_temp)
-        
-        with open(HISTORICO_FILE, 'w', encoding='utf-8') as f:
-            json.dump(historico, f, indent=2, ensure_ascii=False)
-        
-        return True
+        with LOCK_HISTORICO:
+            historico = carregar_historico()
+            
+            # Procurar por cliente e tipo
+            encontrou = False
+            for entrada in historico:
+                if (entrada.get('cliente', '').lower() == cliente_nome.lower() and 
+                    entrada.get('tipo_processo') == tipo_processo):
+                    entrada['status_processamento'] = status_texto
+                    entrada['ultima_atualizacao'] = datetime.now().isoformat()
+                    encontrou = True
+                    break
+            
+            # Se não encontrou, criar entrada temporária
+            if not encontrou:
+                entrada_temp = {
+                    'cliente': cliente_nome,
+                    'tipo_processo': tipo_processo,
+                    'status': 'processando',
+                    'status_processamento': status_texto,
+                    'data_geracao': datetime.now().isoformat(),
+                    'ultima_atualizacao': datetime.now().isoformat()
+                }
+                historico.append(entrada_temp)
+            
+            gravar_json(HISTORICO_FILE, historico)
+            
+            return True
     except Exception as e:
         print(f"Erro ao atualizar status processamento: {e}")
         return False
@@ -1635,139 +1625,136 @@ def aplicar_formatacoes_especiais_word(doc):
         return doc
 
 def autenticar_google_drive():
-    print(f"    [DEBUG AUTH] Iniciando autenticação...")
-    print(f"    [DEBUG AUTH] Diretório atual: {os.getcwd()}")
-    print(f"    [DEBUG AUTH] Arquivos no diretório: {os.listdir('.')}")
+    """
+    Drive service da thread atual via gerenciador de credenciais do processo
+    (token lido uma vez, renovado antes de expirar, service reaproveitado)
     
-    creds = None
-    if os.path.exists('token.json'):
-        print(f"    [DEBUG AUTH] token.json encontrado.")
-        try:
-            creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-            print(f"    [DEBUG AUTH] Credenciais carregadas. Válidas: {creds.valid}, Expiradas: {creds.expired}")
-        except Exception as e:
-             print(f"    [DEBUG AUTH] Erro ao ler token.json: {e}")
-    else:
-        print(f"    [DEBUG AUTH] token.json NÃO encontrado.")
-
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            print(f"    [DEBUG AUTH] Token expirado, tentando refresh...")
-            try:
-                creds.refresh(Request())
-                print(f"    [DEBUG AUTH] Refresh com sucesso!")
-            except Exception as e:
-                print(f"    [DEBUG AUTH] Falha no refresh ({e}). Forçando login via browser...")
-                if os.path.exists('credentials.json'):
-                    flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
-                    creds = flow.run_local_server(port=8080)
-                else:
-                    print(f"    [DEBUG AUTH] CRÍTICO: credentials.json também não encontrado!")
-                    return None
-        else:
-            print(f"    [DEBUG AUTH] Sem credenciais válidas ou refresh token. Tentando login via browser...")
-            if os.path.exists('credentials.json'):
-                try:
-                    flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
-                    creds = flow.run_local_server(port=8080)
-                except Exception as e:
-                     print(f"    [DEBUG AUTH] Erro ao iniciar server local: {e}")
-                     # Tentar method console se disponivel ou falhar
-                     raise e
-            else:
-                 print(f"    [DEBUG AUTH] CRÍTICO: credentials.json não encontrado para iniciar login!")
-                 return None
-                 
-        # Salvar token atualizado
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
-            
-    return build('drive', 'v3', credentials=creds)
+    Com ARMAZENAMENTO_BACKEND=local devolve o armazenamento em disco, que os
+    helpers abaixo aceitam no lugar do service (ver armazenamento.py)
+    """
+    try:
+        service = obter_service_armazenamento(permitir_login=True)
+        if service is None:
+            print(f"    [DEBUG AUTH] Não foi possível autenticar no Google Drive")
+        return service
+    except Exception as e:
+        print(f"    [DEBUG AUTH] Erro ao autenticar: {e}")
+        raise
 
 def listar_pastas(service, pasta_pai_id):
     try:
-        query = f"'{pasta_pai_id}' in parents and trashed=false and mimeType='application/vnd.google-apps.folder'"
-        results = service.files().list(q=query, fields="files(id, name)", pageSize=100).execute()
-        return results.get('files', [])
-    except:
-        return []
+        # No Drive, pastas dentro da árvore CLIENTES são respondidas pelo índice local
+        return obter_armazenamento(service).listar_pastas(pasta_pai_id)
+    except Exception as e:
+        # Não devolver [] em erro: pareceria uma pasta vazia
+        print(f"         Erro ao listar pastas de {pasta_pai_id}: {e}")
+        raise
+
+def iterar_arquivos_pasta(service, pasta_id):
+    """Gerador sobre os arquivos de uma pasta (permite parar na primeira ocorrência)"""
+    return obter_armazenamento(service).iterar_arquivos(pasta_id)
 
 def listar_arquivos_pasta(service, pasta_id):
     try:
-        query = f"'{pasta_id}' in parents and trashed=false and mimeType != 'application/vnd.google-apps.folder'"
-        results = service.files().list(q=query, fields="files(id, name, mimeType)", pageSize=100).execute()
-        return results.get('files', [])
-    except:
-        return []
+        return list(iterar_arquivos_pasta(service, pasta_id))
+    except Exception as e:
+        print(f"         Erro ao listar arquivos de {pasta_id}: {e}")
+        raise
 
 def listar_arquivos_recursivo(service, pasta_id, _nivel=0, _max_nivel=3):
     """
-    Lista TODOS os arquivos de uma pasta, incluindo subpastas (recursivo)
+    Lista TODOS os arquivos de uma pasta, incluindo subpastas
+    
+    A árvore é percorrida em largura: cada nível é listado com uma única
+    consulta (pastas agrupadas com OR), trazendo arquivos e pastas juntos.
+    A ordem do resultado continua a mesma da antiga listagem recursiva.
     
     Args:
         service: Google Drive service
         pasta_id: ID da pasta raiz
-        _nivel: Nível atual de recursão (interno)
-        _max_nivel: Profundidade máxima de recursão
+        _nivel: Nível inicial (mantido por compatibilidade)
+        _max_nivel: Profundidade máxima
     
     Returns:
-        Lista de dicionários com 'id', 'name', 'mimeType', 'pasta_origem'
+        Lista de dicionários com 'id', 'name', 'mimeType', 'versao', 'md5', 'pasta_origem'
     """
     try:
-        # Proteção contra recursão infinita
-        if _nivel > _max_nivel:
-            return []
+        # No Drive, com o índice local ativo a árvore é lida do SQLite, sem chamadas à API
+        listar_nivel = obter_armazenamento(service).listar_filhos_em_lote
+        
+        arquivos_por_pasta = {}
+        subpastas_por_pasta = {}
+        visitadas = {pasta_id}
+        
+        # 1. Listar a árvore nível a nível (uma consulta por nível)
+        nivel_atual = [pasta_id]
+        nivel = _nivel
+        while nivel_atual and nivel <= _max_nivel:
+            for pid in nivel_atual:
+                arquivos_por_pasta[pid] = []
+                subpastas_por_pasta[pid] = []
+            
+            proximo_nivel = []
+            for item in listar_nivel(nivel_atual):
+                for pai in item.get('parents', []):
+                    if pai not in arquivos_por_pasta:
+                        continue
+                    if item['mimeType'] == 'application/vnd.google-apps.folder':
+                        subpastas_por_pasta[pai].append(item)
+                        if item['id'] not in visitadas:
+                            visitadas.add(item['id'])
+                            proximo_nivel.append(item['id'])
+                    else:
+                        arquivos_por_pasta[pai].append(item)
+            
+            nivel_atual = proximo_nivel
+            nivel += 1
         
+        # 2. Montar o resultado na mesma ordem da busca em profundidade
         arquivos_totais = []
         
-        # 1. Listar arquivos na pasta atual
-        arquivos_raiz = listar_arquivos_pasta(service, pasta_id)
+        def _coletar(pid, nivel_pasta):
+            for arq in arquivos_por_pasta.get(pid, []):
+                # Filtrar arquivos que começam com "não juntar" ou "nao juntar"
+                nome_lower = arq['name'].lower()
+                if nome_lower.startswith('não juntar') or nome_lower.startswith('nao juntar'):
+                    continue  # Ignorar este arquivo
+                
+                arquivos_totais.append({
+                    'id': arq['id'],
+                    'name': arq['name'],
+                    'mimeType': arq['mimeType'],
+                    'versao': versao_drive(arq),
+                    'md5': arq.get('md5Checksum'),
+                    # Adicionar informação de pasta de origem
+                    'pasta_origem': 'raiz' if nivel_pasta == 0 else f'subpasta_nivel_{nivel_pasta}'
+                })
+            for subpasta in subpastas_por_pasta.get(pid, []):
+                if subpasta['id'] in arquivos_por_pasta and nivel_pasta < _max_nivel:
+                    _coletar(subpasta['id'], nivel_pasta + 1)
         
-        # Filtrar arquivos que começam com "não juntar" ou "nao juntar"
-        for arq in arquivos_raiz:
-            nome_lower = arq['name'].lower()
-            if nome_lower.startswith('não juntar') or nome_lower.startswith('nao juntar'):
-                continue  # Ignorar este arquivo
-            
-            # Adicionar informação de pasta de origem
-            arq['pasta_origem'] = 'raiz' if _nivel == 0 else f'subpasta_nivel_{_nivel}'
-            arquivos_totais.append(arq)
-        
-        # 2. Listar subpastas
-        subpastas = listar_pastas(service, pasta_id)
-        
-        # 3. Recursivamente listar arquivos de cada subpasta
-        for subpasta in subpastas:
-            arquivos_subpasta = listar_arquivos_recursivo(
-                service, 
-                subpasta['id'], 
-                _nivel=_nivel + 1,
-                _max_nivel=_max_nivel
-            )
-            
-            # Marcar de qual subpasta vieram
-            for arq in arquivos_subpasta:
-                if arq.get('pasta_origem') == 'raiz':
-                    arq['pasta_origem'] = subpasta['name']
-            
-            arquivos_totais.extend(arquivos_subpasta)
+        _coletar(pasta_id, _nivel)
         
         return arquivos_totais
         
     except Exception as e:
         print(f"         Erro ao listar recursivamente: {e}")
-        return []
+        raise
 
 def verificar_cliente_ja_processado(service, pasta_cliente_id):
     try:
-        # Verificar na sessão atual
-        if pasta_cliente_id in CLIENTES_PROCESSADOS_SESSAO:
+        # Sem atalho pela sessão: o dashboard pode ter desmarcado o cliente
+        # (/api/desmarcar-processado) depois de ele entrar em CLIENTES_PROCESSADOS_SESSAO
+        
+        # Verificar appProperties da pasta (processado=1)
+        if obter_armazenamento(service).pasta_esta_processada(pasta_cliente_id):
+            CLIENTES_PROCESSADOS_SESSAO.add(pasta_cliente_id)
             return True
         
-        # Verificar arquivo _PROCESSADO.txt
-        arquivos = listar_arquivos_pasta(service, pasta_cliente_id)
-        for arquivo in arquivos:
-            if arquivo['name'] == '_PROCESSADO.txt':
+        # Compatibilidade: arquivo _PROCESSADO.txt antigo (migra para appProperties)
+        for arquivo in iterar_arquivos_pasta(service, pasta_cliente_id):
+            if arquivo['name'] == NOME_MARCADOR_LEGADO:
+                obter_armazenamento(service).marcar_pasta_processada(pasta_cliente_id)
                 CLIENTES_PROCESSADOS_SESSAO.add(pasta_cliente_id)
                 return True
         return False
@@ -1779,51 +1766,211 @@ def marcar_cliente_como_processado(service, pasta_cliente_id, info_peticao):
         # Adicionar à sessão
         CLIENTES_PROCESSADOS_SESSAO.add(pasta_cliente_id)
         
-        # Verificar se já existe e deletar para não duplicar
-        try:
-            arquivos = listar_arquivos_pasta(service, pasta_cliente_id)
-            for arq in arquivos:
-                if arq['name'] == '_PROCESSADO.txt':
-                    print(f"[INFO] Removendo arquivo _PROCESSADO.txt antigo: {arq['id']}")
-                    service.files().delete(fileId=arq['id']).execute()
-        except Exception as e:
-            print(f"[AVISO] Erro ao limpar _PROCESSADO.txt antigo: {e}")
-
-        conteudo = f"""PROCESSADO EM: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}
-Petição: {info_peticao.get('nome_arquivo', 'N/A')}
-Link: {info_peticao.get('link', 'N/A')}
-"""
-        tmp_fd, tmp_path = tempfile.mkstemp(suffix='.txt')
-        os.close(tmp_fd)
-        with open(tmp_path, 'w', encoding='utf-8') as f:
-            f.write(conteudo)
-        file_metadata = {'name': '_PROCESSADO.txt', 'parents': [pasta_cliente_id]}
-        media = MediaFileUpload(tmp_path, mimetype='text/plain')
-        service.files().create(body=file_metadata, media_body=media).execute()
-        try:
-            os.unlink(tmp_path)
-        except:
-            pass
+        # Estado gravado nas appProperties da pasta (não cria mais _PROCESSADO.txt)
+        obter_armazenamento(service).marcar_pasta_processada(pasta_cliente_id, info_peticao)
         return True
     except Exception as e:
+        print(f"[AVISO] Erro ao marcar cliente como processado: {e}")
         return False
 
-def baixar_arquivo(service, file_id):
+def baixar_arquivo(service, file_id, versao=None, mime_type=None):
+    """
+    Baixa arquivo do Google Drive (com cache local por versão)
+    
+    Args:
+        service: Google Drive service
+        file_id: ID do arquivo
+        versao: Versão já conhecida da listagem (versao_drive); se omitida, é consultada
+        mime_type: mimeType da listagem; Google Docs/Planilhas vêm exportados como texto
+    """
+    try:
+        return obter_armazenamento(service).ler(file_id, versao, mime_type)
+    except Exception as e:
+        print(f"         Erro ao baixar arquivo: {e}")
+        return None
+
+def baixar_arquivo_para_caminho(service, file_id, caminho):
+    """
+    Baixa arquivo do Google Drive direto para um caminho em disco (ex: vídeos grandes)
+    
+    Returns:
+        Tamanho em bytes ou None em caso de erro
+    """
     try:
-        request = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-        fh.seek(0)
-        return fh.read()
-    except:
+        return obter_armazenamento(service).copiar_para_caminho(file_id, caminho)
+    except Exception as e:
+        print(f"         Erro ao baixar arquivo: {e}")
         return None
 
-def converter_pdf_para_imagens(conteudo_bytes):
+# ============================================================================
+# DOCUMENTOS SOB DEMANDA E DOWNLOAD PARALELO
+# ============================================================================
+
+# Quantos downloads simultâneos o pool faz (httplib2 não é thread-safe:
+# cada thread do pool usa o seu próprio service)
+DOWNLOAD_MAX_PARALELO = max(1, int(os.getenv('DOWNLOAD_MAX_PARALELO', '6')))
+
+_POOL_DOWNLOADS = None
+_POOL_DOWNLOADS_LOCK = threading.Lock()
+
+def _obter_pool_downloads():
+    """Pool de threads reaproveitado entre clientes (mantém os services por thread)"""
+    global _POOL_DOWNLOADS
+    with _POOL_DOWNLOADS_LOCK:
+        if _POOL_DOWNLOADS is None:
+            _POOL_DOWNLOADS = ThreadPoolExecutor(
+                max_workers=DOWNLOAD_MAX_PARALELO,
+                thread_name_prefix='download_drive'
+            )
+        return _POOL_DOWNLOADS
+
+# Tipos que nunca vão para a IA: só o nome entra no prompt, o arquivo não é baixado
+TIPOS_SEM_CONTEUDO = {'VIDEO', 'DOCUMENTO_GENERICO'}
+
+# Arquivos dos quais não se extrai texto (ex: vídeo chamado "entrevista.mp4")
+EXTENSOES_SEM_TEXTO = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.flv', '.wmv', '.m4v', '.mpeg', '.mpg',
+                       '.mp3', '.m4a', '.ogg', '.opus', '.wav') + EXTENSOES_IMAGEM
+
+class DocumentoSobDemanda:
+    """
+    Documento classificado cujo conteúdo só é baixado quando alguma etapa pede
+    
+    Cada etapa pede só a representação que usa:
+      - texto(): procuração, resumo, cronologia, transcrição e trecho no prompt
+      - imagem_pagina(): primeira página do PDF como imagem no prompt
+    O download acontece uma vez, na primeira chamada (pelo cache de downloads),
+    e liberar() descarta os bytes quando a etapa termina.
+    
+    doc['tipo'], doc['nome'], doc.get('mimeType') etc. continuam funcionando.
+    """
+    
+    def __init__(self, service, doc):
+        self.service = service
+        self.dados = doc
+        self.erro = None
+        self._conteudo = None
+        self._baixado = False
+        self._texto = None
+        self._imagem = None
+        self._lock = threading.Lock()
+    
+    def __getitem__(self, chave):
+        return self.dados[chave]
+    
+    def get(self, chave, padrao=None):
+        return self.dados.get(chave, padrao)
+    
+    @property
+    def eh_pdf(self):
+        return self.dados['nome'].lower().endswith('.pdf')
+    
+    @property
+    def eh_nativo(self):
+        return self.dados.get('mimeType') in EXPORTACAO_NATIVOS
+    
+    @property
+    def vai_para_prompt(self):
+        """Só PDFs e Google Docs têm conteúdo no prompt; o resto entra só pelo nome"""
+        return self.dados['tipo'] not in TIPOS_SEM_CONTEUDO and (self.eh_pdf or self.eh_nativo)
+    
+    def conteudo(self):
+        """Bytes do arquivo (None se o download falhar)"""
+        with self._lock:
+            if not self._baixado:
+                self._baixado = True
+                try:
+                    # Chamado também pelas threads do pool: cada uma usa o seu service
+                    self._conteudo = obter_armazenamento(self.service).para_thread().ler(
+                        self.dados['id'], self.dados.get('versao'), self.dados.get('mimeType')
+                    )
+                except Exception as e:
+                    self.erro = str(e)
+                    print(f"         Erro ao baixar {self.dados['nome'][:50]}: {e}")
+            return self._conteudo
+    
+    def texto(self):
+        """Texto do documento: exportado (Google Docs), PDF, DOCX ou texto puro"""
+        if self._texto is None:
+            nome = self.dados['nome'].lower()
+            texto = ""
+            conteudo = None if nome.endswith(EXTENSOES_SEM_TEXTO) else self.conteudo()
+            if conteudo:
+                if self.eh_nativo:
+                    texto = conteudo.decode('utf-8-sig', errors='ignore')
+                elif self.eh_pdf:
+                    texto = extrair_texto_pdf(conteudo)
+                elif nome.endswith('.docx'):
+                    try:
+                        texto = '\n'.join([p.text for p in Document(io.BytesIO(conteudo)).paragraphs])
+                    except Exception as e:
+                        print(f"   Erro ao ler DOCX: {e}")
+                else:
+                    texto = conteudo.decode('utf-8', errors='ignore')
+            self._texto = texto
+        return self._texto
+    
+    def imagem_pagina(self):
+        """Primeira página do PDF em JPEG base64 (None se não for PDF ou falhar)"""
+        if self._imagem is None and self.eh_pdf:
+            conteudo = self.conteudo()
+            imagens = converter_pdf_para_imagens(conteudo, max_paginas=1) if conteudo else []
+            self._imagem = imagens[0] if imagens else ""
+        return self._imagem or None
+    
+    def liberar(self):
+        """Descarta os bytes (texto e imagem já extraídos continuam)"""
+        with self._lock:
+            self._conteudo = None
+            self._baixado = False
+
+def criar_documentos_sob_demanda(service, docs):
+    """Envolve os documentos classificados ({'id', 'nome', 'tipo', ...}) sem baixar nada"""
+    return [DocumentoSobDemanda(service, doc) for doc in docs]
+
+def preparar_documentos_em_paralelo(documentos, etapa=None):
+    """
+    Executa etapa(doc) para cada documento com até DOWNLOAD_MAX_PARALELO simultâneos
+    
+    Usado para antecipar, em paralelo, só o que a próxima etapa vai pedir
+    (ex: lambda d: d.texto()). Sem etapa, apenas baixa o conteúdo.
+    """
+    if not documentos:
+        return
+    etapa = etapa or (lambda doc: doc.conteudo())
+    pool = _obter_pool_downloads()
+    for futuro in [pool.submit(etapa, doc) for doc in documentos]:
+        futuro.result()
+
+def preparar_para_prompt(doc):
+    """Representação do documento usada por gerar_peticao_com_claude"""
+    if doc.eh_pdf:
+        doc.imagem_pagina()
+    doc.texto()
+    doc.liberar()
+
+def deduplicar_prints(documentos):
+    """
+    Descarta os prints quase idênticos (ver deduplicacao.py)
+    
+    As imagens entram no prompt só pelo nome: baixá-las aqui é o único
+    download delas. Por isso só acontece com DEDUP_IMAGENS_DISTANCIA_MAXIMA
+    configurado (>= 0) e quando há ao menos duas imagens e alguma que
+    poderia ser descartada (as de prioridade ALTA nunca são).
     """
-    Converte primeiras 3 páginas do PDF em imagens otimizadas para IA
+    if DEDUP_IMAGENS_DISTANCIA_MAXIMA < 0:
+        return documentos, []
+    imagens = [d for d in documentos if d['nome'].lower().endswith(EXTENSOES_IMAGEM)]
+    if len(imagens) < 2 or all(d.get('prioridade') == 'ALTA' for d in imagens):
+        return documentos, []
+    preparar_documentos_em_paralelo(imagens)
+    mantidos, duplicados = deduplicar_imagens(documentos, obter_conteudo=lambda doc: doc.conteudo())
+    for doc in imagens:
+        doc.liberar()
+    return mantidos, duplicados
+
+def converter_pdf_para_imagens(conteudo_bytes, max_paginas=3):
+    """
+    Converte as primeiras páginas (até max_paginas) do PDF em imagens otimizadas para IA
     Limite: 4MB por imagem (API do Claude aceita ~5MB)
     """
     try:
@@ -1833,8 +1980,8 @@ def converter_pdf_para_imagens(conteudo_bytes):
         pdf_document = fitz.open(stream=conteudo_bytes, filetype="pdf")
         imagens = []
         
-        # Limitar a 3 páginas para não estourar contexto
-        for page_num in range(min(3, len(pdf_document))):
+        # Limitar as páginas para não estourar contexto
+        for page_num in range(min(max_paginas, len(pdf_document))):
             page = pdf_document[page_num]
             
             # Tentar primeiro com resolução média (1.5x - bom para leitura)
@@ -1881,19 +2028,11 @@ def extrair_texto_pdf(conteudo_bytes):
         return ""
 
 def carregar_modelo_peticao(service, modelo_id):
+    """Texto do modelo (interpretado uma vez por revisão, ver cache_modelos.py)"""
     try:
-        conteudo = baixar_arquivo(service, modelo_id)
-        if not conteudo:
-            return None
-        tmp_fd, tmp_path = tempfile.mkstemp(suffix='.docx')
-        os.close(tmp_fd)
-        with open(tmp_path, 'wb') as f:
-            f.write(conteudo)
-        doc = Document(tmp_path)
-        texto = "\n".join([p.text for p in doc.paragraphs])
-        os.unlink(tmp_path)
-        return texto
-    except:
+        return obter_cache_modelos().texto(service, modelo_id)
+    except Exception as e:
+        print(f"         Erro ao carregar modelo {modelo_id}: {e}")
         return None
 
 def classificar_documento(nome_arquivo):
@@ -2052,14 +2191,108 @@ def verificar_documentacao_completa_v10(documentos_cliente, tipo_processo):
     return resultado
     return completo, faltantes, presentes
 
+# ============================================================================
+# GERAÇÃO EM STREAMING
+# ============================================================================
+
+# Com streaming (messages.stream) o texto chega aos poucos: há progresso ao vivo e
+# o timeout do cliente vale entre trechos, não para a petição inteira
+GERACAO_STREAMING = os.getenv('GERACAO_STREAMING', '1') == '1'
+
+# Intervalo mínimo entre atualizações do status no histórico durante a geração
+STREAMING_INTERVALO_STATUS_SEG = float(os.getenv('STREAMING_INTERVALO_STATUS_SEG', '5'))
+
+# Títulos de seção da petição (ex: "**II. DOS FATOS**", "III - DO MÉRITO")
+PADRAO_SECAO_PETICAO = re.compile(r'^[\*#\s]*([IVXL]+)\s*[\.\-–]\s*([^a-z]+?)[\*\s]*$')
+
+class PosProcessamentoIncremental:
+    """
+    Pós-processamento linha a linha enquanto a petição chega pelo stream
+    
+    Cada linha completa passa por limpar_marcadores_quebra_linha (os
+    marcadores nunca atravessam linhas, então o resultado é o mesmo de
+    processar o texto inteiro no fim). Também acompanha a seção atual
+    da petição para o status de progresso.
+    """
+    
+    def __init__(self):
+        self.trechos = []
+        self.linhas = []
+        self.pendente = ""
+        self.caracteres = 0
+        self.secao = None
+    
+    def adicionar(self, trecho):
+        self.trechos.append(trecho)
+        self.caracteres += len(trecho)
+        self.pendente += trecho
+        if '\n' not in self.pendente:
+            return
+        completas, self.pendente = self.pendente.rsplit('\n', 1)
+        for linha in completas.split('\n'):
+            self._processar_linha(linha)
+    
+    def _processar_linha(self, linha):
+        secao = PADRAO_SECAO_PETICAO.match(linha.strip())
+        if secao:
+            self.secao = f"{secao.group(1)}. {secao.group(2).strip()}"[:60]
+        self.linhas.append(limpar_marcadores_quebra_linha(linha))
+    
+    def texto_bruto(self):
+        return ''.join(self.trechos)
+    
+    def finalizar(self):
+        """Texto já sem marcadores de quebra de linha"""
+        self._processar_linha(self.pendente)
+        self.pendente = ""
+        return '\n'.join(self.linhas)
+
+def gerar_texto_em_streaming(parametros, ao_progresso=None, etapa="petição"):
+    """
+    Chama o Claude com messages.stream, acumulando e pós-processando o texto
+    
+    Args:
+        parametros: Mesmos argumentos de messages.create (model, system, messages...)
+        ao_progresso: Função (texto_status) chamada a cada STREAMING_INTERVALO_STATUS_SEG
+            com caracteres gerados e seção atual (ex: atualizar_status_processamento)
+    
+    Returns:
+        (texto bruto, texto sem marcadores de quebra de linha, mensagem final)
+    """
+    pos = PosProcessamentoIncremental()
+    inicio = time.time()
+    ultimo_status = inicio
+    primeiro_trecho = True
+    with vaga_llm(etapa, parametros), anthropic_client.beta.prompt_caching.messages.stream(**parametros) as stream:
+        for trecho in stream.text_stream:
+            if primeiro_trecho:
+                primeiro_trecho = False
+                print(f"        - Primeiro token em {time.time() - inicio:.1f}s")
+            pos.adicionar(trecho)
+            agora = time.time()
+            if agora - ultimo_status >= STREAMING_INTERVALO_STATUS_SEG:
+                ultimo_status = agora
+                status = f"Gerando petição com IA... {pos.caracteres} caracteres"
+                if pos.secao:
+                    status += f" ({pos.secao})"
+                print(f"        - {status}")
+                if ao_progresso:
+                    ao_progresso(status)
+        message = stream.get_final_message()
+    registrar_uso_tokens(message, etapa, time.time() - inicio)
+    if message.stop_reason == 'max_tokens':
+        print(f"        [AVISO] Geração interrompida no limite de max_tokens ({parametros.get('max_tokens')})")
+    return pos.texto_bruto(), pos.finalizar(), message
+
 def gerar_peticao_com_claude(service, cliente_info, documentos_completos, tipo_processo, 
                               cronologia_fatos=None, resumo_video=None, procuracao=None, 
-                              usar_prompt_master=False):
+                              usar_prompt_master=False, ao_progresso=None):
     """
     Gera petição com PROMPT MELHORADO - dados completos obrigatórios
     
     Args:
         usar_prompt_master: Se True, usa o Prompt Master para petições de 12-18 páginas de alto nível
+        ao_progresso: Função (texto_status) para o progresso da geração em streaming
     """
     modo = "PROMPT MASTER" if usar_prompt_master else "PADRÃO"
     print(f"        [GERANDO PETICAO COM CLAUDE + VISAO - MODO: {modo}]")
@@ -2072,12 +2305,23 @@ def gerar_peticao_com_claude(service, cliente_info, documentos_completos, tipo_p
         if not modelo_texto:
             return None
         
-        prompt_inicial = f"""
-TIPO: {tipo_processo}
-CLIENTE: {cliente_info['cliente_nome']}
-PROCURAÇÃO: {procuracao or "Nenhuma procuração disponível. Busque dados nos documentos individuais."}
+        # Dados deste cliente: ficam DEPOIS da parte fixa do system prompt
+        # (a parte fixa, igual para todo cliente do tipo, vai para o cache de prompt)
+        dados_cliente = f"""
+===================================================================
+DADOS DO CLIENTE DESTA PETIÇÃO
+===================================================================
+
+CLIENTE: {cliente_info['cliente_nome']}
+PROCURAÇÃO: {procuracao or "Nenhuma procuração disponível. Busque dados nos documentos individuais."}
 RESUMO DO VÍDEO: {resumo_video or "Nenhum resumo de vídeo disponível."}
 CRONOLOGIA DOS FATOS: {cronologia_fatos or "Nenhuma cronologia disponível."}
+"""
+        
+        prompt_inicial = f"""
+TIPO: {tipo_processo}
+(Os dados do cliente - nome, procuração, resumo do vídeo e cronologia - estão
+na seção DADOS DO CLIENTE DESTA PETIÇÃO, ao final destas instruções.)
 
 ---------------------------------------------------------------------------------------------------
 IDENTIDADE E PAPEL
@@ -3059,26 +3303,24 @@ Retornar APENAS a petição pronta, sem comentários.
 """
         # Mover para system prompt para evitar erro de roles
         system_prompt = prompt_inicial
-        conteudo_mensagem = []
+        itens_prompt = []
         
         print(f"        - Processando {len(documentos_completos)} documentos...")
+        # Baixa em paralelo só o que vai para o prompt (texto e 1ª página dos PDFs);
+        # vídeos, genéricos, imagens e DOCX entram só pelo nome
+        com_conteudo = [doc for doc in documentos_completos if doc.vai_para_prompt]
+        preparar_documentos_em_paralelo(com_conteudo, preparar_para_prompt)
+        # Cada documento vira um item com prioridade: o tamanho final (imagem,
+        # trecho de texto) é decidido pelo orçamento de tokens antes do envio
         for doc in documentos_completos:
-            conteudo_mensagem.append({
-                "type": "text",
-                "text": f"\n=== DOCUMENTO: {doc['tipo']} - {doc['nome']} ==="
-            })
-            if doc['nome'].lower().endswith('.pdf'):
-                imagens = converter_pdf_para_imagens(doc['conteudo'])
-                if imagens:
-                    conteudo_mensagem.append({
-                        "type": "image",
-                        "source": {"type": "base64", "media_type": "image/jpeg", "data": imagens[0]}
-                    })
-            if doc.get('texto'):
-                conteudo_mensagem.append({
-                    "type": "text",
-                    "text": f"Texto extraído:\n{doc['texto'][:1500]}"
-                })
+            if doc.erro:
+                continue
+            cabecalho = f"\n=== DOCUMENTO: {doc['tipo']} - {doc['nome']} ==="
+            if not doc.vai_para_prompt:
+                itens_prompt.append(criar_item(cabecalho, doc.get('prioridade')))
+                continue
+            itens_prompt.append(criar_item(cabecalho, doc.get('prioridade'),
+                                           imagem=doc.imagem_pagina(), texto=doc.texto()))
         
         instrucoes = f"""
 
@@ -3485,11 +3727,10 @@ RETORNE APENAS A PETIÇÃO COMPLETA, PERFEITA E PRONTA PARA PROTOCOLO.
         if usar_prompt_master and PROMPT_MASTER_DISPONIVEL:
             print(f"         Usando PROMPT MASTER para petição de alto nível (12-18 páginas)")
             
-            # Gerar prompt master completo
-            prompt_master_instrucoes = gerar_prompt_master(
+            # Prompt master: parte fixa do tipo + dados do caso (cronologia, resumo)
+            prompt_master_instrucoes, dados_cliente = gerar_prompt_master_em_blocos(
                 tipo_processo=tipo_processo,
                 cliente_info=cliente_info,
-                documentos=documentos_completos,
                 cronologia=cronologia_fatos,
                 resumo_video=resumo_video
             )
@@ -3512,13 +3753,26 @@ RETORNE APENAS A PETIÇÃO COMPLETA, PERFEITA E PRONTA PARA PROTOCOLO.
         
         print(f"        - Enviando para Claude AI (Modelo Claude Sonnet 4)...")
         print(f"        - Max tokens: {max_tokens_config}")
-        message = anthropic_client.messages.create(
+        system_blocos = montar_system_com_cache(system_prompt, dados_cliente)
+        conteudo_mensagem = montar_conteudo_no_orcamento(
+            itens_prompt, "claude-sonnet-4-20250514", system_blocos, max_tokens_config, anthropic_client
+        )
+        parametros = dict(
             model="claude-sonnet-4-20250514",
             max_tokens=max_tokens_config,
-            system=system_prompt,
+            system=system_blocos,
             messages=[{"role": "user", "content": conteudo_mensagem}]
         )
-        peticao = message.content[0].text
+        peticao_limpa = None
+        if GERACAO_STREAMING:
+            # Marcadores de quebra de linha já removidos linha a linha durante o stream
+            peticao, peticao_limpa, message = gerar_texto_em_streaming(parametros, ao_progresso)
+        else:
+            with vaga_llm("petição", parametros):
+                inicio_chamada = time.time()
+                message = anthropic_client.beta.prompt_caching.messages.create(**parametros)
+            registrar_uso_tokens(message, "petição", time.time() - inicio_chamada)
+            peticao = message.content[0].text
         print(f"        - Petição gerada! ({len(peticao)} chars)")
         
         # VALIDAÇÃO PROMPT MASTER (se ativado)
@@ -3537,7 +3791,7 @@ RETORNE APENAS A PETIÇÃO COMPLETA, PERFEITA E PRONTA PARA PROTOCOLO.
             peticao_validacao_master = None
         
         # PÓS-PROCESSAMENTO: Limpar marcadores de quebra de linha
-        peticao = limpar_marcadores_quebra_linha(peticao)
+        peticao = peticao_limpa if peticao_limpa is not None else limpar_marcadores_quebra_linha(peticao)
         print(f"        - Marcadores de quebra de linha removidos")
 
         # PÓS-PROCESSAMENTO: Fundir fragmentos da qualificação em um único parágrafo
@@ -3896,39 +4150,12 @@ def salvar_peticao_no_drive(service, peticao_texto, cliente_info, arquivos_clien
         if modelo_id:
             print(f"        - Usando modelo como base (ID: {modelo_id[:20]}...)")
             try:
-                # Baixar modelo
-                modelo_conteudo = baixar_arquivo(service, modelo_id)
-                if modelo_conteudo:
-                    # Salvar modelo temporariamente
-                    tmp_modelo_fd, tmp_modelo_path = tempfile.mkstemp(suffix='.docx')
-                    os.close(tmp_modelo_fd)
-                    with open(tmp_modelo_path, 'wb') as f:
-                        f.write(modelo_conteudo)
-                    
-                    # Abrir modelo
-                    doc = Document(tmp_modelo_path)
-                    
-                    # Limpar TODO o conteúdo do corpo (parágrafos E tabelas)
-                    # Isso mantém apenas cabeçalho e rodapé
-                    
-                    # 1. Remover todas as tabelas
-                    for table in doc.tables:
-                        table._element.getparent().remove(table._element)
-                    
-                    # 2. Remover todos os parágrafos
-                    for _ in range(len(doc.paragraphs)):
-                        p = doc.paragraphs[0]
-                        p._element.getparent().remove(p._element)
-                    
-                    # 3. Adicionar novo conteúdo (formatação será aplicada depois)
+                # Clone do modelo já sem corpo (parágrafos e tabelas), só cabeçalho e rodapé
+                doc = obter_cache_modelos().novo_documento(service, modelo_id)
+                if doc is not None:
+                    # Adicionar novo conteúdo (formatação será aplicada depois)
                     _popular_doc_com_texto(doc, texto_final, negrito_primeiro=True)
                     
-                    # Limpar arquivo temporário do modelo
-                    try:
-                        os.unlink(tmp_modelo_path)
-                    except:
-                        pass
-                    
                     print(f"         Cabeçalho e rodapé preservados do modelo")
                     print(f"         Tabelas do modelo removidas")
                     print(f"         Formatação aplicada")
@@ -3952,33 +4179,41 @@ def salvar_peticao_no_drive(service, peticao_texto, cliente_info, arquivos_clien
         doc = aplicar_formatacoes_especiais_word(doc)
 
         
-        # Salvar documento final
-        tmp_fd, tmp_path = tempfile.mkstemp(suffix='.docx')
-        os.close(tmp_fd)
-        doc.save(tmp_path)
+        # Salvar documento final (em memória)
+        conteudo_docx = documento_para_bytes(doc)
         nome = f"Peticao_{cliente_info['tipo_processo']}_{cliente_info['cliente_nome'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
 
         # Salvar dentro da pasta do próprio cliente em subpasta "Petições"
         pasta_cliente_id = cliente_info.get('pasta_cliente_id')
         print(f"        [DEBUG PASTA] cliente_info keys: {list(cliente_info.keys())}")
         print(f"        [DEBUG PASTA] pasta_cliente_id recebido: {pasta_cliente_id}")
+        campos_peticao = 'id, name, webViewLink, md5Checksum'
+        file = None
         if pasta_cliente_id:
-            pasta = buscar_ou_criar_pasta(service, "Petições", pasta_cliente_id)
-            print(f"        [DEBUG PASTA] Subpasta 'Petições' ID: {pasta}")
-            if not pasta:
+            try:
+                file, pasta = obter_armazenamento(service).enviar_em_subpasta(
+                    "Petições", pasta_cliente_id,
+                    {'name': nome}, conteudo_docx, MIME_DOCX, campos=campos_peticao
+                )
+                print(f"        [DEBUG PASTA] Subpasta 'Petições' ID: {pasta}")
+            except Exception as e:
                 pasta = PASTAS_PETICOES_GERADAS.get(cliente_info['tipo_processo'])
-                print(f"        [DEBUG PASTA] buscar_ou_criar_pasta falhou, fallback: {pasta}")
+                print(f"        [DEBUG PASTA] Subpasta 'Petições' falhou ({e}), fallback: {pasta}")
         else:
             pasta = PASTAS_PETICOES_GERADAS.get(cliente_info['tipo_processo'])
             print(f"        [DEBUG PASTA] pasta_cliente_id ausente, fallback global: {pasta}")
 
-        metadata = {'name': nome, 'parents': [pasta]}
-        media = MediaFileUpload(tmp_path, mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-        file = service.files().create(body=metadata, media_body=media, fields='id, name, webViewLink').execute()
-        try:
-            os.unlink(tmp_path)
-        except:
-            pass
+        if file is None:
+            if not pasta:
+                raise ValueError(f"Pasta de petições geradas de {cliente_info['tipo_processo']} não configurada "
+                                 f"(PASTA_PETICOES_* no .env)")
+            metadata = {'name': nome, 'parents': [pasta]}
+            file = obter_armazenamento(service).enviar(metadata, conteudo_docx, MIME_DOCX, campos=campos_peticao)
+        
+        # Já deixar no cache: a auditoria relê esta petição logo em seguida
+        cache = obter_cache_downloads()
+        if cache and file.get('md5Checksum'):
+            cache.guardar(file['id'], versao_drive(file), conteudo_docx)
         print(f"        - Salvo: {file.get('name')}")
         
         # Adicionar info de marcadores ao retorno
@@ -4292,28 +4527,14 @@ def salvar_relatorio_auditoria_docx(service, resultado_auditoria, cliente_nome,
 
         # -- Salvar e fazer upload ---------------------------------------------
         nome_relatorio = f'Relatorio_Auditoria_{cliente_nome.replace(" ", "_")}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.docx'
-        tmp_fd, tmp_path = tempfile.mkstemp(suffix='.docx')
-        os.close(tmp_fd)
-        doc.save(tmp_path)
-
         file_metadata = {
             'name'   : nome_relatorio,
             'parents': [pasta_id]
         }
-        media = MediaFileUpload(
-            tmp_path,
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+        uploaded = obter_armazenamento(service).enviar(
+            file_metadata, documento_para_bytes(doc), MIME_DOCX,
+            campos='id, name'
         )
-        uploaded = service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id, name'
-        ).execute()
-
-        try:
-            os.unlink(tmp_path)
-        except:
-            pass
 
         print(f"        [RELATÓRIO] Salvo: {uploaded.get('name')} (ID: {uploaded.get('id')})")
         return uploaded.get('id')
@@ -4325,27 +4546,34 @@ def salvar_relatorio_auditoria_docx(service, resultado_auditoria, cliente_nome,
         return None
 
 
-def auditar_peticao_com_claude(service, arquivo_id, tipo_processo, cliente_nome):
-    """Audita petição - CHECKLIST V4.0 FASE 3 PERFEITA"""
-    print(f"        [AUDITANDO - FASE 3: Qualidade Extra + Comparações]")
-    try:
-        conteudo = baixar_arquivo(service, arquivo_id)
-        if not conteudo:
-            return None
-        tmp_fd, tmp_path = tempfile.mkstemp(suffix='.docx')
-        os.close(tmp_fd)
-        with open(tmp_path, 'wb') as f:
-            f.write(conteudo)
-        doc = Document(tmp_path)
-        peticao_texto = "\n".join([p.text for p in doc.paragraphs])
-        os.unlink(tmp_path)
-        
-        # Estatísticas para comparação
-        stats = carregar_estatisticas()
-        score_medio = SCORES_MEDIOS.get(tipo_processo, 75)
-        score_medio_escritorio = stats.get('por_tipo', {}).get(tipo_processo, {}).get('score_medio', score_medio)
-        
-        prompt = f"""AUDITOR ESPECIALIZADO - CHECKLIST V4.0 FASE 3 PERFEITA
+MODELO_AUDITORIA = "claude-sonnet-4-20250514"
+MAX_TOKENS_AUDITORIA = 6000
+
+def preparar_auditoria(service, arquivo_id, tipo_processo):
+    """
+    Baixa a petição e monta o prompt do auditor (CHECKLIST V4.0 FASE 3)
+    
+    Returns:
+        {'params': argumentos de messages.create, 'score_medio', 'score_medio_escritorio'}
+        ou None se a petição não pôde ser baixada
+    """
+    conteudo = baixar_arquivo(service, arquivo_id)
+    if not conteudo:
+        return None
+    tmp_fd, tmp_path = tempfile.mkstemp(suffix='.docx')
+    os.close(tmp_fd)
+    with open(tmp_path, 'wb') as f:
+        f.write(conteudo)
+    doc = Document(tmp_path)
+    peticao_texto = "\n".join([p.text for p in doc.paragraphs])
+    os.unlink(tmp_path)
+    
+    # Estatísticas para comparação
+    stats = carregar_estatisticas()
+    score_medio = SCORES_MEDIOS.get(tipo_processo, 75)
+    score_medio_escritorio = stats.get('por_tipo', {}).get(tipo_processo, {}).get('score_medio', score_medio)
+    
+    prompt = f"""AUDITOR ESPECIALIZADO - CHECKLIST V4.0 FASE 3 PERFEITA
 
 TIPO: {tipo_processo} 
 SCORE MÉDIO CHECKLIST: {score_medio}/100
@@ -4423,73 +4651,101 @@ RETORNE JSON:
   "melhorias_100": ["Quantificar HE (2h/dia)","Reflexos FGTS explícito","Adicionar 2-3 jurisprudências TST"],
   "resumo": "Aprovada 88/100, acima de {score_medio_escritorio:.1f}. Forte: estrutura+narrativa. Melhorar: reflexos+jurisprudência."
 }}"""
+    
+    return {
+        'params': {
+            'model': MODELO_AUDITORIA,
+            'max_tokens': MAX_TOKENS_AUDITORIA,
+            'messages': [{"role": "user", "content": prompt}]
+        },
+        'score_medio': score_medio,
+        'score_medio_escritorio': score_medio_escritorio
+    }
+
+def processar_resposta_auditoria(resposta, tipo_processo, score_medio, score_medio_escritorio):
+    """
+    Interpreta o JSON devolvido pelo auditor e completa ranking, comparações e relatório
+    
+    Usado tanto na auditoria individual quanto nos resultados do lote.
+    """
+    resposta = resposta.strip()
+    if resposta.startswith('```'):
+        linhas = resposta.split('\n')
+        resposta = '\n'.join(linhas[1:-1])
+    resposta = resposta.replace('```json', '').replace('```', '').strip()
+    resultado = json.loads(resposta)
+    
+    score = resultado.get('score', 0)
+    
+    # Calcular comparações
+    comparacao_base = "⬆" if score > score_medio else "⬇" if score < score_medio else ""
+    ranking_percentil = calcular_ranking(score, tipo_processo)  # "Top 81%"
+    
+    # CALCULAR RANKING PARA O DASHBOARD (baseado no score)
+    if score >= 90:
+        ranking_dashboard = "EXCELENTE"
+    elif score >= 80:
+        ranking_dashboard = "MUITO BOM"
+    elif score >= 70:
+        ranking_dashboard = "BOM"
+    elif score >= 60:
+        ranking_dashboard = "SATISFATÓRIO"
+    else:
+        ranking_dashboard = "PRECISA MELHORAR"
+    
+    # SEMPRE APROVAR (sistema mudou para não rejeitar)
+    resultado['aprovada'] = True
+    
+    print(f"        - Score: {score}/100 (base: {score_medio}, escritório: {score_medio_escritorio:.1f}) {comparacao_base}")
+    print(f"        - Ranking: {ranking_percentil}")
+    print(f"        - APROVADA ")
+    print(f"        - Classificação: {ranking_dashboard}")
+    
+    # Qualidade extra
+    if resultado.get('qualidade_extra'):
+        bonus = resultado['qualidade_extra'].get('bonus_pontos', 0)
+        if bonus > 0:
+            print(f"        - Bônus Qualidade: +{bonus} pontos")
+    
+    # Mostrar resumo
+    if resultado.get('reflexos_he_detalhados'):
+        reflexos_ok = sum(1 for r in resultado['reflexos_he_detalhados'] if r.get('presente') == True)
+        reflexos_total = sum(1 for r in resultado['reflexos_he_detalhados'] if r.get('presente') is not None)
+        if reflexos_total > 0:
+            print(f"        - Reflexos HE: {reflexos_ok}/{reflexos_total}")
+    
+    if resultado.get('pedidos_validacao'):
+        print(f"        - Pedidos validados: {len(resultado['pedidos_validacao'])}")
+    
+    # Gerar relatório detalhado para o dashboard
+    relatorio_detalhado = gerar_relatorio_score(resultado, score_medio, score_medio_escritorio)
+    
+    # Adicionar informações extras ao resultado
+    resultado['ranking'] = ranking_dashboard  #  USAR RANKING DO DASHBOARD
+    resultado['ranking_percentil'] = ranking_percentil  #  Guardar o percentil também
+    resultado['comparacao_base'] = score_medio
+    resultado['comparacao_escritorio'] = score_medio_escritorio
+    resultado['relatorio_detalhado'] = relatorio_detalhado
+    
+    return resultado
+
+def auditar_peticao_com_claude(service, arquivo_id, tipo_processo, cliente_nome):
+    """Audita petição - CHECKLIST V4.0 FASE 3 PERFEITA"""
+    print(f"        [AUDITANDO - FASE 3: Qualidade Extra + Comparações]")
+    try:
+        auditoria = preparar_auditoria(service, arquivo_id, tipo_processo)
+        if not auditoria:
+            return None
         
-        message = anthropic_client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=6000,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        resposta = message.content[0].text.strip()
-        if resposta.startswith('```'):
-            linhas = resposta.split('\n')
-            resposta = '\n'.join(linhas[1:-1])
-        resposta = resposta.replace('```json', '').replace('```', '').strip()
-        resultado = json.loads(resposta)
-        
-        score = resultado.get('score', 0)
-        
-        # Calcular comparações
-        comparacao_base = "⬆" if score > score_medio else "⬇" if score < score_medio else ""
-        ranking_percentil = calcular_ranking(score, tipo_processo)  # "Top 81%"
-        
-        # CALCULAR RANKING PARA O DASHBOARD (baseado no score)
-        if score >= 90:
-            ranking_dashboard = "EXCELENTE"
-        elif score >= 80:
-            ranking_dashboard = "MUITO BOM"
-        elif score >= 70:
-            ranking_dashboard = "BOM"
-        elif score >= 60:
-            ranking_dashboard = "SATISFATÓRIO"
-        else:
-            ranking_dashboard = "PRECISA MELHORAR"
-        
-        # SEMPRE APROVAR (sistema mudou para não rejeitar)
-        resultado['aprovada'] = True
-        
-        print(f"        - Score: {score}/100 (base: {score_medio}, escritório: {score_medio_escritorio:.1f}) {comparacao_base}")
-        print(f"        - Ranking: {ranking_percentil}")
-        print(f"        - APROVADA ")
-        print(f"        - Classificação: {ranking_dashboard}")
-        
-        # Qualidade extra
-        if resultado.get('qualidade_extra'):
-            bonus = resultado['qualidade_extra'].get('bonus_pontos', 0)
-            if bonus > 0:
-                print(f"        - Bônus Qualidade: +{bonus} pontos")
-        
-        # Mostrar resumo
-        if resultado.get('reflexos_he_detalhados'):
-            reflexos_ok = sum(1 for r in resultado['reflexos_he_detalhados'] if r.get('presente') == True)
-            reflexos_total = sum(1 for r in resultado['reflexos_he_detalhados'] if r.get('presente') is not None)
-            if reflexos_total > 0:
-                print(f"        - Reflexos HE: {reflexos_ok}/{reflexos_total}")
-        
-        if resultado.get('pedidos_validacao'):
-            print(f"        - Pedidos validados: {len(resultado['pedidos_validacao'])}")
-        
-        # Gerar relatório detalhado para o dashboard
-        relatorio_detalhado = gerar_relatorio_score(resultado, score_medio, score_medio_escritorio)
-        
-        # Adicionar informações extras ao resultado
-        resultado['ranking'] = ranking_dashboard  #  USAR RANKING DO DASHBOARD
-        resultado['ranking_percentil'] = ranking_percentil  #  Guardar o percentil também
-        resultado['comparacao_base'] = score_medio
-        resultado['comparacao_escritorio'] = score_medio_escritorio
-        resultado['relatorio_detalhado'] = relatorio_detalhado
+        with vaga_llm("auditoria", auditoria['params']):
+            message = anthropic_client.messages.create(**auditoria['params'])
         
-        return resultado
+        return processar_resposta_auditoria(
+            message.content[0].text,
+            tipo_processo,
+            auditoria['score_medio'],
+            auditoria['score_medio_escritorio']
+        )
         
     except Exception as e:
         print(f"        ERRO: {e}")
@@ -4505,17 +4761,8 @@ def mover_peticao(service, arquivo_id, aprovada):
         else:
             pasta_destino = os.getenv('PASTA_04_REJEITADAS')
             status = "REJEITADAS"
-        file = service.files().get(fileId=arquivo_id, fields='parents').execute()
-        pastas_atuais = file.get('parents', [])
-        if not pastas_atuais:
+        if not obter_armazenamento(service).mover(arquivo_id, pasta_destino):
             return False
-        previous_parents = ",".join(pastas_atuais)
-        service.files().update(
-            fileId=arquivo_id,
-            addParents=pasta_destino,
-            removeParents=previous_parents,
-            fields='id, parents'
-        ).execute()
         print(f"        - Movida para: {status}")
         return True
     except Exception as e:
@@ -4530,6 +4777,8 @@ def agente_gerador():
     
     try:
         service = autenticar_google_drive()
+        # Trazer o índice local em dia com as mudanças do Drive antes de listar
+        obter_indice_drive(service, forcar_sincronizacao=True)
         pastas = [
             (os.getenv('PASTA_RECONHECIMENTO_VINCULO'), 'RECONHECIMENTO_VINCULO'),
             (os.getenv('PASTA_ACAO_ACIDENTARIA'), 'ACAO_ACIDENTARIA'),
@@ -4538,6 +4787,19 @@ def agente_gerador():
         
         total_geradas = 0
         
+        # Clientes já processados: uma consulta de appProperties por pasta de tipo
+        try:
+            # Só o worker migra os _PROCESSADO.txt antigos para appProperties
+            processados = obter_armazenamento(service).listar_clientes_processados(
+                [p for p, _ in pastas], migrar=True
+            )
+            # A sessão só cobre as marcações ainda não visíveis na consulta;
+            # clientes desmarcados pelo dashboard voltam a ser gerados
+            CLIENTES_PROCESSADOS_SESSAO.intersection_update(processados)
+        except Exception as e:
+            print(f"  Erro ao consultar clientes processados ({e}), verificando um a um")
+            processados = None
+        
         for pasta_id, tipo in pastas:
             if not pasta_id:
                 continue
@@ -4547,19 +4809,24 @@ def agente_gerador():
             
             for pasta_cliente in pastas_clientes:
                 # VERIFICAR SE JÁ PROCESSADO (evita duplicatas)
-                if verificar_cliente_ja_processado(service, pasta_cliente['id']):
+                if processados is not None:
+                    if pasta_cliente['id'] in processados or pasta_cliente['id'] in CLIENTES_PROCESSADOS_SESSAO:
+                        continue
+                elif verificar_cliente_ja_processado(service, pasta_cliente['id']):
                     continue
                 
                 # MUDANÇA: Usar listagem recursiva para pegar arquivos de subpastas também
                 arquivos = listar_arquivos_recursivo(service, pasta_cliente['id'])
                 if not arquivos:
                     continue
+                # Cópias do mesmo arquivo em várias subpastas: baixar/enviar uma só
+                arquivos, duplicados = deduplicar_arquivos(arquivos)
                 
                 docs = []
                 for arq in arquivos:
                     classif = classificar_documento(arq['name'])
                     if classif['prioridade'] != 'IGNORAR':
-                        docs.append({'id': arq['id'], 'nome': arq['name'], 'tipo': classif['tipo'], 'prioridade': classif['prioridade']})
+                        docs.append({'id': arq['id'], 'nome': arq['name'], 'tipo': classif['tipo'], 'prioridade': classif['prioridade'], 'versao': arq.get('versao'), 'mimeType': arq.get('mimeType')})
                 
                 # DEBUG: Mostrar documentos reconhecidos
                 print(f"\n     [CLIENTE: {pasta_cliente['name']}]")
@@ -4605,12 +4872,11 @@ def agente_gerador():
                 print(f"         Documentação COMPLETA - Gerando petição...")
                 print(f"        >> GERANDO PETICAO <<")
                 
-                docs_completos = []
-                for doc in docs:
-                    cont = baixar_arquivo(service, doc['id'])
-                    if cont:
-                        texto = extrair_texto_pdf(cont) if doc['nome'].lower().endswith('.pdf') else ""
-                        docs_completos.append({'tipo': doc['tipo'], 'nome': doc['nome'], 'conteudo': cont, 'texto': texto})
+                # Nada é baixado aqui: cada etapa pede o que precisa (DocumentoSobDemanda)
+                docs_completos = criar_documentos_sob_demanda(service, docs)
+                docs_completos, imagens_duplicadas = deduplicar_prints(docs_completos)
+                duplicados += imagens_duplicadas
+                imprimir_duplicados(duplicados)
                 
                 cliente_info = {
                     'cliente_nome': pasta_cliente['name'],
@@ -4632,7 +4898,8 @@ def agente_gerador():
                                 info_prints['marcadores'],
                                 info_prints['faltantes'],
                                 info_prints['criticos_faltantes'],
-                                pasta_cliente['name']
+                                pasta_cliente['name'],
+                                duplicados=duplicados
                             )
                             print(f"         Relatório de prints: {relatorio_prints}")
                         
@@ -4658,17 +4925,204 @@ def agente_gerador():
     except Exception as e:
         print(f"[ERRO GERADOR] {e}")
 
+def registrar_resultado_auditoria(arquivo, tipo, cliente_nome, resultado):
+    """Grava o resultado de uma auditoria (relatório, histórico e estatísticas)"""
+    # Salvar relatório
+    log_auditoria(cliente_nome, tipo, resultado, arquivo['name'])
+    
+    # SEMPRE APROVAR - Status baseado no score
+    score = resultado.get('score', 0)
+    
+    # Determinar ranking baseado no score
+    if score >= 90:
+        ranking = "EXCELENTE"
+    elif score >= 80:
+        ranking = "MUITO BOM"
+    elif score >= 70:
+        ranking = "BOM"
+    elif score >= 60:
+        ranking = "SATISFATÓRIO"
+    else:
+        ranking = "PRECISA MELHORAR"
+    
+    # Atualizar histórico como APROVADA
+    atualizar_status_historico(
+        arquivo['id'],
+        'aprovada',  # Sempre aprovada
+        score,
+        resultado.get('erros_criticos', []),
+        resultado.get('relatorio_detalhado', '')
+    )
+    
+    # FASE 3: Atualizar estatísticas globais
+    atualizar_estatisticas(
+        tipo,
+        score,
+        True,  # Sempre True
+        tempo_geracao=0
+    )
+    
+    # Petição permanece na subpasta do cliente (não move para pasta global)
+    
+    # Mostrar resultado
+    print(f"         APROVADA! Score: {score}/100")
+    print(f"         Ranking: {ranking}")
+    
+    # Mostrar pontos de melhoria se score < 90
+    if score < 90 and resultado.get('pontos_melhoria'):
+        print(f"         Pontos de melhoria:")
+        for ponto in resultado['pontos_melhoria'][:2]:
+            print(f"           • {ponto}")
+
+def nome_cliente_da_peticao(nome_arquivo):
+    """Extrai o nome do cliente do nome do arquivo da petição"""
+    parts = nome_arquivo.split('_')
+    return parts[2] if len(parts) > 2 else 'Desconhecido'
+
+def concluir_lote_auditoria(cliente_lotes, lote, esperar=True):
+    """
+    Espera o lote terminar e distribui os resultados
+    
+    Args:
+        esperar: False consulta o lote uma única vez, sem bloquear (worker)
+    
+    Returns:
+        Número de auditorias registradas, ou None se o lote ainda não terminou
+        (continua em LOTE_AUDITORIA_FILE para a próxima execução)
+    """
+    if esperar:
+        terminou = aguardar_lote(cliente_lotes, lote['lote_id'])
+    else:
+        terminou = aguardar_lote(cliente_lotes, lote['lote_id'], espera_max=0)
+    if not terminou:
+        return None
+    
+    total = 0
+    for custom_id, resposta, erro in iterar_resultados(cliente_lotes, lote['lote_id']):
+        item = lote['itens'].get(custom_id)
+        if not item:
+            continue
+        arquivo = item['arquivo']
+        print(f"\n     [PETIÇÃO: {arquivo['name']}]")
+        if erro:
+            print(f"        ERRO no lote: {erro}")
+            continue
+        try:
+            resultado = processar_resposta_auditoria(
+                resposta, item['tipo'], item['score_medio'], item['score_medio_escritorio']
+            )
+        except Exception as e:
+            print(f"        ERRO: {e}")
+            continue
+        registrar_resultado_auditoria(arquivo, item['tipo'], item['cliente_nome'], resultado)
+        total += 1
+    
+    limpar_lote_pendente()
+    return total
+
+def auditar_em_lote(service, pendentes, esperar=True):
+    """
+    Audita as petições pendentes pela Message Batches API (AUDITORIA_MODO=lote)
+    
+    Um lote enviado em execução anterior e ainda não processado é retomado
+    primeiro; as petições dele não são reenviadas.
+    
+    Args:
+        pendentes: Lista de (tipo, arquivo)
+        esperar: False envia o lote, consulta uma vez e retorna; o lote fica em
+            LOTE_AUDITORIA_FILE e o worker o conclui (verificar_lote_auditoria_pendente)
+    
+    Returns:
+        Número de auditorias registradas
+    """
+    cliente_lotes = obter_cliente_lotes(anthropic_client)
+    total = 0
+    
+    lote = carregar_lote_pendente()
+    if lote:
+        print(f"\n  -> Retomando lote {lote['lote_id']} ({len(lote['itens'])} auditoria(s))")
+        try:
+            concluidas = concluir_lote_auditoria(cliente_lotes, lote, esperar)
+        except Exception as e:
+            print(f"     Erro ao retomar lote ({e}), descartando")
+            limpar_lote_pendente()
+            concluidas = 0
+        if concluidas is None:
+            return 0
+        total += concluidas
+        ja_auditados = {item['arquivo']['id'] for item in lote['itens'].values()}
+        pendentes = [(tipo, arq) for tipo, arq in pendentes if arq['id'] not in ja_auditados]
+    
+    if not pendentes:
+        return total
+    
+    print(f"\n  -> Preparando lote com {len(pendentes)} petição(ões)")
+    itens = []
+    for tipo, arquivo in pendentes:
+        try:
+            auditoria = preparar_auditoria(service, arquivo['id'], tipo)
+        except Exception as e:
+            print(f"     Erro ao preparar {arquivo['name']}: {e}")
+            continue
+        if not auditoria:
+            continue
+        itens.append((auditoria['params'], {
+            'arquivo': {'id': arquivo['id'], 'name': arquivo['name']},
+            'tipo': tipo,
+            'cliente_nome': nome_cliente_da_peticao(arquivo['name']),
+            'score_medio': auditoria['score_medio'],
+            'score_medio_escritorio': auditoria['score_medio_escritorio'],
+        }))
+    if not itens:
+        return total
+    
+    lote = enviar_lote(cliente_lotes, itens)
+    concluidas = concluir_lote_auditoria(cliente_lotes, lote, esperar)
+    return total + (concluidas or 0)
+
+_ULTIMA_CONSULTA_LOTE = None
+
+def verificar_lote_auditoria_pendente():
+    """
+    Conclui, sem bloquear, o lote de auditoria enviado por uma flag do dashboard
+    
+    Chamado a cada ciclo do worker; consulta a API no máximo a cada
+    AUDITORIA_LOTE_INTERVALO_SEG e só distribui os resultados quando o lote
+    terminou.
+    """
+    global _ULTIMA_CONSULTA_LOTE
+    if _ULTIMA_CONSULTA_LOTE is not None and time.monotonic() - _ULTIMA_CONSULTA_LOTE < AUDITORIA_LOTE_INTERVALO_SEG:
+        return
+    lote = carregar_lote_pendente()
+    if not lote:
+        return
+    _ULTIMA_CONSULTA_LOTE = time.monotonic()
+    try:
+        concluidas = concluir_lote_auditoria(obter_cliente_lotes(anthropic_client), lote, esperar=False)
+        if concluidas is not None:
+            print(f"  AUDITOR (lote {lote['lote_id']}): {concluidas} auditada(s)")
+    except Exception as e:
+        print(f"[ERRO AUDITOR] Lote {lote.get('lote_id')}: {e}")
+
 # AGENTE 2: AUDITOR
-def agente_auditor():
+def agente_auditor(modo=None, esperar=True):
+    """
+    Audita as petições pendentes em PASTAS_PETICOES_GERADAS
+
+    Args:
+        modo: 'individual' ou 'lote' (padrão: AUDITORIA_MODO)
+        esperar: No modo lote, False só envia o lote (ver auditar_em_lote)
+    """
+    modo = (modo or AUDITORIA_MODO).lower()
     print(f"\n{'='*70}")
-    print(f"[AGENTE AUDITOR] {datetime.now().strftime('%H:%M:%S')}")
+    print(f"[AGENTE AUDITOR] {datetime.now().strftime('%H:%M:%S')} (modo {modo})")
     print(f"{'='*70}")
     
     try:
         service = autenticar_google_drive()
         total_auditadas = 0
-        total_aprovadas = 0
         
+        pendentes = []
         for tipo, pasta_id in PASTAS_PETICOES_GERADAS.items():
             print(f"\n  -> {tipo}")
             arquivos = listar_arquivos_pasta(service, pasta_id)
@@ -4678,74 +5132,160 @@ def agente_auditor():
                 continue
             
             print(f"     {len(arquivos)} petição(ões) pendente(s)")
-            
-            for arquivo in arquivos:
+            pendentes.extend((tipo, arquivo) for arquivo in arquivos)
+        
+        if modo == 'lote':
+            total_auditadas = auditar_em_lote(service, pendentes, esperar)
+        else:
+            for tipo, arquivo in pendentes:
                 print(f"\n     [PETIÇÃO: {arquivo['name']}]")
                 
-                # Extrair nome do cliente
-                parts = arquivo['name'].split('_')
-                cliente_nome = parts[2] if len(parts) > 2 else 'Desconhecido'
+                cliente_nome = nome_cliente_da_peticao(arquivo['name'])
                 
                 resultado = auditar_peticao_com_claude(service, arquivo['id'], tipo, cliente_nome)
                 
                 if resultado:
                     total_auditadas += 1
-                    
-                    # Salvar relatório
-                    log_auditoria(cliente_nome, tipo, resultado, arquivo['name'])
-                    
-                    # SEMPRE APROVAR - Status baseado no score
-                    score = resultado.get('score', 0)
-                    
-                    # Determinar ranking baseado no score
-                    if score >= 90:
-                        ranking = "EXCELENTE"
-                    elif score >= 80:
-                        ranking = "MUITO BOM"
-                    elif score >= 70:
-                        ranking = "BOM"
-                    elif score >= 60:
-                        ranking = "SATISFATÓRIO"
-                    else:
-                        ranking = "PRECISA MELHORAR"
-                    
-                    # Atualizar histórico como APROVADA
-                    atualizar_status_historico(
-                        arquivo['id'],
-                        'aprovada',  # Sempre aprovada
-                        score,
-                        resultado.get('erros_criticos', []),
-                        resultado.get('relatorio_detalhado', '')
-                    )
-                    
-                    # FASE 3: Atualizar estatísticas globais
-                    atualizar_estatisticas(
-                        tipo,
-                        score,
-                        True,  # Sempre True
-                        tempo_geracao=0
-                    )
-                    
-                    # Petição permanece na subpasta do cliente (não move para pasta global)
-                    total_aprovadas += 1
-                    
-                    # Mostrar resultado
-                    print(f"         APROVADA! Score: {score}/100")
-                    print(f"         Ranking: {ranking}")
-                    
-                    # Mostrar pontos de melhoria se score < 90
-                    if score < 90 and resultado.get('pontos_melhoria'):
-                        print(f"         Pontos de melhoria:")
-                        for ponto in resultado['pontos_melhoria'][:2]:
-                            print(f"           • {ponto}")
+                    registrar_resultado_auditoria(arquivo, tipo, cliente_nome, resultado)
         
+        # Todas as auditadas são aprovadas (sistema não rejeita)
         print(f"\n{'='*70}")
-        print(f"  AUDITOR: {total_auditadas} auditadas | {total_aprovadas}  aprovadas")
+        print(f"  AUDITOR: {total_auditadas} auditadas | {total_auditadas}  aprovadas")
         print(f"{'='*70}")
         
     except Exception as e:
         print(f"[ERRO AUDITOR] {e}")
 
+def processar_flag_peticao(flag_file):
+    """Gera a petição pedida em uma flag do dashboard e remove a flag"""
+    try:
+        # Ler dados da flag
+        with open(flag_file, 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+        
+        cliente_nome = dados.get('cliente_nome')
+        tipo_acao = dados.get('tipo_acao', 'RECONHECIMENTO_VINCULO')
+        forcar_geracao = dados.get('forcar_geracao', False)
+        
+        print(f"   Processando: {cliente_nome}")
+        print(f"   Tipo: {tipo_acao}")
+        print(f"   Forçar: {forcar_geracao}")
+        
+        # Processar geração
+        sucesso = processar_geracao_manual(cliente_nome, tipo_acao, forcar_geracao)
+        
+        # Remover flag após processar (sucesso ou não)
+        os.remove(flag_file)
+        print(f"   Flag removida: {flag_file}\n")
+        
+        if sucesso:
+            print(f"   Petição gerada com sucesso para {cliente_nome}\n")
+        else:
+            print(f"   Erro ao gerar petição para {cliente_nome}\n")
+            
+    except Exception as e:
+        print(f"   Erro ao processar flag {flag_file}: {e}")
+        # Remover flag com erro para não ficar travado
+        try:
+            os.remove(flag_file)
+        except:
+            pass
+
+def processar_flag_cronologia(flag_file):
+    """Gera a cronologia pedida em uma flag do dashboard e remove a flag"""
+    try:
+        # Ler dados da flag
+        with open(flag_file, 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+        
+        cliente_nome = dados.get('cliente_nome')
+        
+        print(f"   Gerando cronologia para: {cliente_nome}")
+        
+        # Processar geração de cronologia
+        sucesso = processar_cronologia_manual(cliente_nome)
+        
+        # Remover flag após processar
+        os.remove(flag_file)
+        print(f"   Flag removida: {flag_file}\n")
+        
+        if sucesso:
+            print(f"   Cronologia gerada com sucesso para {cliente_nome}\n")
+        else:
+            print(f"   Erro ao gerar cronologia para {cliente_nome}\n")
+            
+    except Exception as e:
+        print(f"   Erro ao processar flag de cronologia {flag_file}: {e}")
+        try:
+            os.remove(flag_file)
+        except:
+            pass
+
+def processar_flag_transcricao(flag_file):
+    """Transcreve os vídeos pedidos em uma flag do dashboard e remove a flag"""
+    try:
+        # Ler dados da flag
+        with open(flag_file, 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+        
+        cliente_nome = dados.get('cliente_nome')
+        
+        print(f"[DEBUG] Processando vídeos para: {cliente_nome}")
+        print(f"[DEBUG] Flag file: {flag_file}")
+        
+        # Processar transcrição de vídeo
+        print(f"[DEBUG] Chamando processar_transcricao_manual...")
+        sucesso = processar_transcricao_manual(cliente_nome)
+        print(f"[DEBUG] processar_transcricao_manual retornou: {sucesso}")
+        
+        # Remover flag após processar
+        os.remove(flag_file)
+        print(f"   Flag removida: {flag_file}\n")
+        
+        if sucesso:
+            print(f"   Transcrição concluída para {cliente_nome}\n")
+        else:
+            print(f"   Erro ao transcrever vídeo para {cliente_nome}\n")
+            
+    except Exception as e:
+        print(f"   Erro ao processar flag de transcrição {flag_file}: {e}")
+        try:
+            os.remove(flag_file)
+        except:
+            pass
+
+# Clientes processados ao mesmo tempo a partir das flags do dashboard (1 = em série)
+FLAGS_MAX_PARALELO = int(os.getenv('FLAGS_MAX_PARALELO', '3'))
+
+def processar_flag_auditoria(flag_file):
+    """Roda o agente auditor uma vez, pedido por uma flag do dashboard, e remove a flag"""
+    try:
+        with open(flag_file, 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+        
+        os.remove(flag_file)
+        print(f"   Flag removida: {flag_file}\n")
+        
+        # No modo lote só envia: o lote leva até 24h e o worker não pode
+        # parar as outras flags esperando; verificar_lote_auditoria_pendente conclui
+        agente_auditor(dados.get('modo'), esperar=False)
+            
+    except Exception as e:
+        print(f"   Erro ao processar flag de auditoria {flag_file}: {e}")
+        try:
+            os.remove(flag_file)
+        except:
+            pass
+
+def cliente_da_flag(flag_file):
+    """Nome do cliente (normalizado) de uma flag, para agrupar as flags do mesmo cliente"""
+    try:
+        with open(flag_file, 'r', encoding='utf-8') as f:
+            return normalizar_texto(json.load(f).get('cliente_nome') or '')
+    except Exception:
+        # Flag ilegível: grupo próprio (o processamento registra o erro e remove a flag)
+        return flag_file
+
 def verificar_flags_manuais():
     """
     Verifica se há solicitações de geração manual pendentes
@@ -4759,10 +5299,13 @@ def verificar_flags_manuais():
     # Processar flags de transcrição de vídeo
     flags_transcricao = glob.glob(os.path.join("flags", "flag_transcricao_*.json"))
     
+    # Flag de auditoria (uma execução do agente auditor)
+    flags_auditoria = glob.glob(os.path.join("flags", "flag_auditoria*.json"))
+    
     # DEBUG TOTAL - REMOVER DEPOIS
     # print(f"[DEBUG] P:{len(flags_peticao)} C:{len(flags_cronologia)} T:{len(flags_transcricao)} CWD:{os.getcwd()}")
     
-    total_flags = len(flags_peticao) + len(flags_cronologia) + len(flags_transcricao)
+    total_flags = len(flags_peticao) + len(flags_cronologia) + len(flags_transcricao) + len(flags_auditoria)
     
     if total_flags == 0:
         return
@@ -4771,103 +5314,34 @@ def verificar_flags_manuais():
     print(f"   PROCESSANDO SOLICITAÇÕES MANUAIS ({total_flags})")
     print(f"{'='*70}\n")
     
-    # Processar flags de petição
-    for flag_file in flags_peticao:
-        try:
-            # Ler dados da flag
-            with open(flag_file, 'r', encoding='utf-8') as f:
-                dados = json.load(f)
-            
-            cliente_nome = dados.get('cliente_nome')
-            tipo_acao = dados.get('tipo_acao', 'RECONHECIMENTO_VINCULO')
-            forcar_geracao = dados.get('forcar_geracao', False)
-            
-            print(f"   Processando: {cliente_nome}")
-            print(f"   Tipo: {tipo_acao}")
-            print(f"   Forçar: {forcar_geracao}")
-            
-            # Processar geração
-            sucesso = processar_geracao_manual(cliente_nome, tipo_acao, forcar_geracao)
-            
-            # Remover flag após processar (sucesso ou não)
-            os.remove(flag_file)
-            print(f"   Flag removida: {flag_file}\n")
-            
-            if sucesso:
-                print(f"   Petição gerada com sucesso para {cliente_nome}\n")
-            else:
-                print(f"   Erro ao gerar petição para {cliente_nome}\n")
-                
-        except Exception as e:
-            print(f"   Erro ao processar flag {flag_file}: {e}")
-            # Remover flag com erro para não ficar travado
-            try:
-                os.remove(flag_file)
-            except:
-                pass
+    # Flags do mesmo cliente em ordem (petição, cronologia, transcrição);
+    # clientes diferentes em paralelo, com as chamadas de IA limitadas
+    # globalmente pelo limitador_llm
+    tarefas_por_cliente = {}
+    for funcao, flags in ((processar_flag_peticao, flags_peticao),
+                          (processar_flag_cronologia, flags_cronologia),
+                          (processar_flag_transcricao, flags_transcricao)):
+        for flag_file in flags:
+            cliente = cliente_da_flag(flag_file)
+            tarefas_por_cliente.setdefault(cliente, []).append((funcao, flag_file))
+    # Auditoria em grupo próprio (não é de um cliente)
+    for flag_file in flags_auditoria:
+        tarefas_por_cliente.setdefault(flag_file, []).append((processar_flag_auditoria, flag_file))
     
-    # Processar flags de cronologia
-    for flag_file in flags_cronologia:
-        try:
-            # Ler dados da flag
-            with open(flag_file, 'r', encoding='utf-8') as f:
-                dados = json.load(f)
-            
-            cliente_nome = dados.get('cliente_nome')
-            
-            print(f"   Gerando cronologia para: {cliente_nome}")
-            
-            # Processar geração de cronologia
-            sucesso = processar_cronologia_manual(cliente_nome)
-            
-            # Remover flag após processar
-            os.remove(flag_file)
-            print(f"   Flag removida: {flag_file}\n")
-            
-            if sucesso:
-                print(f"   Cronologia gerada com sucesso para {cliente_nome}\n")
-            else:
-                print(f"   Erro ao gerar cronologia para {cliente_nome}\n")
-                
-        except Exception as e:
-            print(f"   Erro ao processar flag de cronologia {flag_file}: {e}")
-            try:
-                os.remove(flag_file)
-            except:
-                pass
-
-    # Processar flags de transcrição de vídeo
-    for flag_file in flags_transcricao:
-        try:
-            # Ler dados da flag
-            with open(flag_file, 'r', encoding='utf-8') as f:
-                dados = json.load(f)
-            
-            cliente_nome = dados.get('cliente_nome')
-            
-            print(f"[DEBUG] Processando vídeos para: {cliente_nome}")
-            print(f"[DEBUG] Flag file: {flag_file}")
-            
-            # Processar transcrição de vídeo
-            print(f"[DEBUG] Chamando processar_transcricao_manual...")
-            sucesso = processar_transcricao_manual(cliente_nome)
-            print(f"[DEBUG] processar_transcricao_manual retornou: {sucesso}")
-            
-            # Remover flag após processar
-            os.remove(flag_file)
-            print(f"   Flag removida: {flag_file}\n")
-            
-            if sucesso:
-                print(f"   Transcrição concluída para {cliente_nome}\n")
-            else:
-                print(f"   Erro ao transcrever vídeo para {cliente_nome}\n")
-                
-        except Exception as e:
-            print(f"   Erro ao processar flag de transcrição {flag_file}: {e}")
-            try:
-                os.remove(flag_file)
-            except:
-                pass
+    def processar_cliente(tarefas):
+        for funcao, flag_file in tarefas:
+            funcao(flag_file)
+    
+    grupos = list(tarefas_por_cliente.values())
+    if FLAGS_MAX_PARALELO <= 1 or len(grupos) == 1:
+        for tarefas in grupos:
+            processar_cliente(tarefas)
+        return
+    
+    print(f"   {len(grupos)} cliente(s) em paralelo (até {FLAGS_MAX_PARALELO} por vez)\n")
+    with ThreadPoolExecutor(max_workers=min(FLAGS_MAX_PARALELO, len(grupos))) as executor:
+        for futuro in [executor.submit(processar_cliente, tarefas) for tarefas in grupos]:
+            futuro.result()
 
 def processar_transcricao_manual(cliente_nome):
     """
@@ -4881,21 +5355,11 @@ def processar_transcricao_manual(cliente_nome):
         print(f"{'='*70}\n")
         
         service = autenticar_google_drive()
+        # Trazer o índice local em dia com as mudanças do Drive antes de listar
+        obter_indice_drive(service, forcar_sincronizacao=True)
         
-        # 1. Buscar pasta do cliente (Reutilizando lógica da cronologia)
-        pasta_cliente = None
-        for _, pasta_id in [
-            ('RECONHECIMENTO_VINCULO', os.getenv('PASTA_RECONHECIMENTO_VINCULO')),
-            ('ACAO_ACIDENTARIA', os.getenv('PASTA_ACAO_ACIDENTARIA')),
-            ('DIFERENCAS_CONTRATUAIS', os.getenv('PASTA_DIFERENCAS_CONTRATUAIS'))
-        ]:
-            if not pasta_id: continue
-            pastas = listar_pastas(service, pasta_id)
-            for p in pastas:
-                if p['name'].lower() == cliente_nome.lower():
-                    pasta_cliente = p
-                    break
-            if pasta_cliente: break
+        # 1. Buscar pasta do cliente (índice de nomes, sem acentos/maiúsculas)
+        pasta_cliente = obter_armazenamento(service).buscar_pasta_cliente(cliente_nome)
             
         if not pasta_cliente:
             print(f"   Pasta do cliente não encontrada")
@@ -4985,31 +5449,15 @@ def processar_cronologia_manual(cliente_nome):
         
         # Autenticar Google Drive
         service = autenticar_google_drive()
+        # Trazer o índice local em dia com as mudanças do Drive antes de listar
+        obter_indice_drive(service, forcar_sincronizacao=True)
         
-        # Buscar pasta do cliente em todas as pastas de tipos
-        pasta_cliente = None
-        pasta_id_tipo = None
-        
-        for tipo_acao, pasta_id in [
-            ('RECONHECIMENTO_VINCULO', os.getenv('PASTA_RECONHECIMENTO_VINCULO')),
-            ('ACAO_ACIDENTARIA', os.getenv('PASTA_ACAO_ACIDENTARIA')),
-            ('DIFERENCAS_CONTRATUAIS', os.getenv('PASTA_DIFERENCAS_CONTRATUAIS'))
-        ]:
-            if not pasta_id:
-                continue
-                
-            pastas_clientes = listar_pastas(service, pasta_id)
-            for pasta in pastas_clientes:
-                if pasta['name'].lower() == cliente_nome.lower():
-                    pasta_cliente = pasta
-                    pasta_id_tipo = pasta_id
-                    print(f"   Cliente encontrado em: {tipo_acao}")
-                    break
-            
-            if pasta_cliente:
-                break
+        # Buscar pasta do cliente em todas as pastas de tipos (índice de nomes)
+        pasta_cliente = obter_armazenamento(service).buscar_pasta_cliente(cliente_nome)
         
-        if not pasta_cliente:
+        if pasta_cliente:
+            print(f"   Cliente encontrado em: {pasta_cliente['tipo_acao']}")
+        else:
             print(f"   Cliente não encontrado: {cliente_nome}")
             return False
             
@@ -5033,7 +5481,9 @@ def processar_cronologia_manual(cliente_nome):
                     'id': arq['id'], 
                     'nome': arq['name'], 
                     'tipo': classif['tipo'], 
-                    'prioridade': classif['prioridade']
+                    'prioridade': classif['prioridade'],
+                    'versao': arq.get('versao'),
+                    'mimeType': arq.get('mimeType')
                 })
         
         # Procurar documento de transcrição
@@ -5047,13 +5497,16 @@ def processar_cronologia_manual(cliente_nome):
         print(f"   Transcrição encontrada: {doc_transcricao['nome']}")
         
         # Baixar documento de transcrição
-        conteudo = baixar_arquivo(service, doc_transcricao['id'])
+        conteudo = baixar_arquivo(service, doc_transcricao['id'], doc_transcricao.get('versao'), doc_transcricao.get('mimeType'))
         if not conteudo:
             print(f"   Erro ao baixar arquivo de transcrição")
             return False
         
         # Extrair texto
-        if doc_transcricao['nome'].lower().endswith('.pdf'):
+        if doc_transcricao.get('mimeType') in EXPORTACAO_NATIVOS:
+            # Google Docs: já exportado como texto puro
+            texto_transcricao = conteudo.decode('utf-8-sig', errors='ignore')
+        elif doc_transcricao['nome'].lower().endswith('.pdf'):
             texto_transcricao = extrair_texto_pdf(conteudo)
         elif doc_transcricao['nome'].lower().endswith('.docx'):
             # Usar python-docx para extrair texto de DOCX
@@ -5165,6 +5618,9 @@ def processar_geracao_manual(cliente_nome, tipo_acao, forcar_geracao=False):
         service = autenticar_google_drive()
         print(f"[DEBUG] ✓ Autenticado com sucesso")
         
+        # Trazer o índice local em dia com as mudanças do Drive antes de listar
+        obter_indice_drive(service, forcar_sincronizacao=True)
+        
         # Determinar qual pasta buscar baseado no tipo
         pasta_id = None
         if tipo_acao == 'RECONHECIMENTO_VINCULO':
@@ -5181,24 +5637,14 @@ def processar_geracao_manual(cliente_nome, tipo_acao, forcar_geracao=False):
         # STATUS 2: Buscando cliente
         atualizar_status_processamento(cliente_nome, tipo_acao, "Localizando pasta do cliente...")
         
-        # Buscar pasta do cliente
-        pastas_clientes = listar_pastas(service, pasta_id)
-        pasta_cliente = None
-        
+        # Buscar pasta do cliente (índice de nomes, sem acentos/maiúsculas)
         print(f"   Buscando cliente: '{cliente_nome}'")
-        print(f"   Pastas encontradas: {len(pastas_clientes)}")
-        
-        for pasta in pastas_clientes:
-            print(f"     - Comparando: '{pasta['name']}' com '{cliente_nome}'")
-            if pasta['name'].lower() == cliente_nome.lower():
-                pasta_cliente = pasta
-                print(f"      MATCH ENCONTRADO!")
-                break
+        pasta_cliente = obter_armazenamento(service).buscar_pasta_cliente(cliente_nome, tipo_acao)
         
         if not pasta_cliente:
             print(f"   Cliente não encontrado: {cliente_nome}")
             print(f"   Pastas disponíveis:")
-            for pasta in pastas_clientes[:5]:
+            for pasta in listar_pastas(service, pasta_id)[:5]:
                 print(f"     - {pasta['name']}")
             return False
         
@@ -5207,7 +5653,7 @@ def processar_geracao_manual(cliente_nome, tipo_acao, forcar_geracao=False):
         
         # Verificar se já foi processado
         if not forcar_geracao and verificar_cliente_ja_processado(service, pasta_cliente['id']):
-            print(f"   Cliente já processado anteriormente (arquivo _PROCESSADO.txt encontrado).")
+            print(f"   Cliente já processado anteriormente (pasta marcada como processada).")
             print(f"   Abortando para evitar duplicação. Use forcar_geracao=True para ignorar.")
             return False
 
@@ -5224,6 +5670,9 @@ def processar_geracao_manual(cliente_nome, tipo_acao, forcar_geracao=False):
         for arq in arquivos[:5]:  # Mostrar primeiros 5
             print(f"     - {arq['name']}")
         
+        # Cópias do mesmo arquivo em várias subpastas: baixar/enviar uma só
+        arquivos, duplicados = deduplicar_arquivos(arquivos)
+        
         # Classificar documentos
         docs = []
         for arq in arquivos:
@@ -5233,7 +5682,9 @@ def processar_geracao_manual(cliente_nome, tipo_acao, forcar_geracao=False):
                     'id': arq['id'], 
                     'nome': arq['name'], 
                     'tipo': classif['tipo'], 
-                    'prioridade': classif['prioridade']
+                    'prioridade': classif['prioridade'],
+                    'versao': arq.get('versao'),
+                    'mimeType': arq.get('mimeType')
                 })
         
         print(f"   Documentos encontrados: {len(docs)}")
@@ -5266,25 +5717,16 @@ def processar_geracao_manual(cliente_nome, tipo_acao, forcar_geracao=False):
             else:
                 print(f"\n   FORÇANDO GERAÇÃO mesmo com documentos faltantes...")
         
-        # STATUS 4: Baixando documentos
-        atualizar_status_processamento(cliente_nome, tipo_acao, f"Baixando {len(docs)} documentos...")
-        
-        # Baixar documentos completos
-        print(f"\n[DEBUG] Etapa 4: Baixando {len(docs)} documentos...")
-        docs_completos = []
-        for i, doc in enumerate(docs, 1):
-            print(f"[DEBUG]   Baixando {i}/{len(docs)}: {doc['nome'][:50]}...")
-            cont = baixar_arquivo(service, doc['id'])
-            if cont:
-                texto = extrair_texto_pdf(cont) if doc['nome'].lower().endswith('.pdf') else ""
-                docs_completos.append({
-                    'tipo': doc['tipo'], 
-                    'nome': doc['nome'], 
-                    'conteudo': cont, 
-                    'texto': texto
-                })
+        # STATUS 4: Preparando documentos
+        atualizar_status_processamento(cliente_nome, tipo_acao, f"Preparando {len(docs)} documentos...")
         
-        print(f"[DEBUG] ✓ {len(docs_completos)} documentos baixados com sucesso")
+        # Nada é baixado aqui: cada etapa abaixo (resumo, cronologia, procuração,
+        # prompt) baixa só os documentos e a representação de que precisa
+        print(f"\n[DEBUG] Etapa 4: {len(docs)} documentos sob demanda ({DOWNLOAD_MAX_PARALELO} downloads em paralelo)...")
+        docs_completos = criar_documentos_sob_demanda(service, docs)
+        docs_completos, imagens_duplicadas = deduplicar_prints(docs_completos)
+        duplicados += imagens_duplicadas
+        imprimir_duplicados(duplicados)
         
         # ============================================================================
         # BUSCAR RESUMO DO VÍDEO E CRONOLOGIA DOS FATOS
@@ -5298,33 +5740,8 @@ def processar_geracao_manual(cliente_nome, tipo_acao, forcar_geracao=False):
         
         if doc_resumo:
             print(f"\n   Resumo do vídeo encontrado: {doc_resumo['nome']}")
-            resumo_texto = doc_resumo.get('texto', '').strip()
-            
-            # Fallback: se texto estiver vazio, tentar ler conteúdo bruto
-            if not resumo_texto:
-                print(f"   Texto vazio, tentando extrair novamente...")
-                if doc_resumo['nome'].lower().endswith('.pdf'):
-                    resumo_texto = extrair_texto_pdf(doc_resumo['conteudo'])
-                elif doc_resumo['nome'].lower().endswith('.docx'):
-                    # Se for DOCX, tentar ler com python-docx
-                    try:
-                        import tempfile
-                        from docx import Document
-                        tmp_fd, tmp_path = tempfile.mkstemp(suffix='.docx')
-                        os.close(tmp_fd)
-                        with open(tmp_path, 'wb') as f:
-                            f.write(doc_resumo['conteudo'])
-                        doc = Document(tmp_path)
-                        resumo_texto = '\n'.join([p.text for p in doc.paragraphs])
-                        os.unlink(tmp_path)
-                    except Exception as e:
-                        print(f"   Erro ao ler DOCX: {e}")
-                else:
-                    # Se for TXT, tentar decodificar
-                    try:
-                        resumo_texto = doc_resumo['conteudo'].decode('utf-8', errors='ignore')
-                    except:
-                        pass
+            # Só agora o arquivo é baixado (texto de PDF, DOCX, TXT ou Google Docs)
+            resumo_texto = doc_resumo.texto().strip()
             
             if resumo_texto and len(resumo_texto) > 50:
                 print(f"   Resumo carregado ({len(resumo_texto)} caracteres)")
@@ -5339,33 +5756,7 @@ def processar_geracao_manual(cliente_nome, tipo_acao, forcar_geracao=False):
         
         if doc_cronologia:
             print(f"\n   Cronologia dos fatos encontrada: {doc_cronologia['nome']}")
-            cronologia_texto = doc_cronologia.get('texto', '').strip()
-            
-            # Fallback: se texto estiver vazio, tentar ler conteúdo bruto
-            if not cronologia_texto:
-                print(f"   Texto vazio, tentando extrair novamente...")
-                if doc_cronologia['nome'].lower().endswith('.pdf'):
-                    cronologia_texto = extrair_texto_pdf(doc_cronologia['conteudo'])
-                elif doc_cronologia['nome'].lower().endswith('.docx'):
-                    # Se for DOCX, tentar ler com python-docx
-                    try:
-                        import tempfile
-                        from docx import Document
-                        tmp_fd, tmp_path = tempfile.mkstemp(suffix='.docx')
-                        os.close(tmp_fd)
-                        with open(tmp_path, 'wb') as f:
-                            f.write(doc_cronologia['conteudo'])
-                        doc = Document(tmp_path)
-                        cronologia_texto = '\n'.join([p.text for p in doc.paragraphs])
-                        os.unlink(tmp_path)
-                    except Exception as e:
-                        print(f"   Erro ao ler DOCX: {e}")
-                else:
-                    # Se for TXT, tentar decodificar
-                    try:
-                        cronologia_texto = doc_cronologia['conteudo'].decode('utf-8', errors='ignore')
-                    except:
-                        pass
+            cronologia_texto = doc_cronologia.texto().strip()
             
             if cronologia_texto and len(cronologia_texto) > 50:
                 print(f"   Cronologia carregada ({len(cronologia_texto)} caracteres)")
@@ -5380,19 +5771,7 @@ def processar_geracao_manual(cliente_nome, tipo_acao, forcar_geracao=False):
             
             if doc_transcricao:
                 print(f"\n   Documento de transcrição encontrado: {doc_transcricao['nome']}")
-                texto_para_cronologia = doc_transcricao.get('texto', '').strip()
-                
-                # Fallback: se texto estiver vazio, tentar ler conteúdo bruto
-                if not texto_para_cronologia:
-                    print(f"   Texto vazio, tentando extrair novamente...")
-                    if doc_transcricao['nome'].lower().endswith('.pdf'):
-                        texto_para_cronologia = extrair_texto_pdf(doc_transcricao['conteudo'])
-                    else:
-                        # Se for DOCX ou TXT, tentar decodificar
-                        try:
-                            texto_para_cronologia = doc_transcricao['conteudo'].decode('utf-8', errors='ignore')
-                        except:
-                            pass
+                texto_para_cronologia = doc_transcricao.texto().strip()
                 
                 if texto_para_cronologia and len(texto_para_cronologia) > 50:
                     print(f"   Gerando Cronologia dos Fatos (IA)... ({len(texto_para_cronologia)} caracteres)")
@@ -5416,33 +5795,7 @@ def processar_geracao_manual(cliente_nome, tipo_acao, forcar_geracao=False):
         
         if doc_procuracao:
             print(f"\n   Procuração encontrada: {doc_procuracao['nome']}")
-            procuracao_texto = doc_procuracao.get('texto', '').strip()
-            
-            # Fallback: se texto estiver vazio, tentar ler conteúdo bruto
-            if not procuracao_texto:
-                print(f"   Texto vazio, tentando extrair novamente...")
-                if doc_procuracao['nome'].lower().endswith('.pdf'):
-                    procuracao_texto = extrair_texto_pdf(doc_procuracao['conteudo'])
-                elif doc_procuracao['nome'].lower().endswith('.docx'):
-                    # Se for DOCX, tentar ler com python-docx
-                    try:
-                        import tempfile
-                        from docx import Document
-                        tmp_fd, tmp_path = tempfile.mkstemp(suffix='.docx')
-                        os.close(tmp_fd)
-                        with open(tmp_path, 'wb') as f:
-                            f.write(doc_procuracao['conteudo'])
-                        doc = Document(tmp_path)
-                        procuracao_texto = '\n'.join([p.text for p in doc.paragraphs])
-                        os.unlink(tmp_path)
-                    except Exception as e:
-                        print(f"   Erro ao ler DOCX: {e}")
-                else:
-                    # Se for TXT, tentar decodificar
-                    try:
-                        procuracao_texto = doc_procuracao['conteudo'].decode('utf-8', errors='ignore')
-                    except:
-                        pass
+            procuracao_texto = doc_procuracao.texto().strip()
             
             if procuracao_texto and len(procuracao_texto) > 50:
                 print(f"   Procuração carregada ({len(procuracao_texto)} caracteres)")
@@ -5482,7 +5835,8 @@ def processar_geracao_manual(cliente_nome, tipo_acao, forcar_geracao=False):
             cronologia_fatos=cronologia_texto,
             resumo_video=resumo_texto,
             procuracao=procuracao_texto,
-            usar_prompt_master=True  #  PROMPT MASTER ATIVADO POR PADRÃO
+            usar_prompt_master=True,  #  PROMPT MASTER ATIVADO POR PADRÃO
+            ao_progresso=lambda status: atualizar_status_processamento(cliente_nome, tipo_acao, status)
         )
         
         if not peticao:
@@ -5490,6 +5844,14 @@ def processar_geracao_manual(cliente_nome, tipo_acao, forcar_geracao=False):
             return False
         
         print(f"[DEBUG] ✓ Petição gerada com sucesso ({len(peticao)} caracteres)")
+        cache = obter_cache_downloads()
+        if cache:
+            est = cache.estatisticas()
+            print(f"[DEBUG]   Cache de downloads: {est['acertos']} acertos, {est['falhas']} falhas, {est['total_mb']} MB")
+        chamadas_drive = estatisticas_drive()
+        print(f"[DEBUG]   Drive: {sum(e['chamadas'] for e in chamadas_drive.values())} chamadas, "
+              f"{sum(e['novas_tentativas'] for e in chamadas_drive.values())} novas tentativas, "
+              f"{sum(e['erros'] for e in chamadas_drive.values())} erros")
         
         # STATUS 6: Salvando
         atualizar_status_processamento(cliente_nome, tipo_acao, "Salvando petição no Drive...")
@@ -5524,7 +5886,7 @@ def processar_geracao_manual(cliente_nome, tipo_acao, forcar_geracao=False):
             'nome_arquivo': arquivo.get('nome', 'N/A'),
             'link': arquivo.get('link', 'N/A')
         })
-        print(f"   Arquivo _PROCESSADO.txt criado!")
+        print(f"   Pasta marcada como processada!")
         
         # Gerar relatório de prints se necessário
         if arquivo.get('marcadores_prints'):
@@ -5534,7 +5896,8 @@ def processar_geracao_manual(cliente_nome, tipo_acao, forcar_geracao=False):
                 info_prints['marcadores'],
                 info_prints['faltantes'],
                 info_prints['criticos_faltantes'],
-                cliente_info['cliente_nome']
+                cliente_info['cliente_nome'],
+                duplicados=duplicados
             )
             if relatorio_prints:
                 print(f"   Relatório de prints: {relatorio_prints}")
@@ -5657,6 +6020,9 @@ def main():
         # Verificar flags manuais a cada ciclo
         verificar_flags_manuais()
         
+        # Lote de auditoria enviado pelo dashboard (consulta sem bloquear)
+        verificar_lote_auditoria_pendente()
+        
         # Executar tarefas agendadas
         schedule.run_pending()
         time.sleep(5)
@@ -5665,6 +6031,14 @@ if __name__ == "__main__":
     import subprocess
     import time
     import os
+    import sys
+    
+    # python main_v10_fase3.py --auditar       -> auditor uma vez (AUDITORIA_MODO)
+    # python main_v10_fase3.py --auditar-lote  -> auditor uma vez em lote
+    # Sem dashboard nem worker; termina ao fim da auditoria
+    if '--auditar' in sys.argv or '--auditar-lote' in sys.argv:
+        agente_auditor('lote' if '--auditar-lote' in sys.argv else None)
+        sys.exit(0)
     
     print("="*50)
     print("  INICIALIZANDO SISTEMA UNIFICADO")
@@ -0,0 +1,227 @@
+"""
+ORÇAMENTO DE TOKENS DO PROMPT DA PETIÇÃO
+gerar_peticao_com_claude junta imagens, trechos de texto dos documentos,
+procuração, cronologia e resumo do vídeo sem saber o tamanho total: um
+pedido grande demais só falha depois de enviado, e um pequeno deixa
+contexto sem uso.
+
+Antes de enviar, cada documento vira um item com custo estimado
+(limitador_llm.estimar_tokens_conteudo) e ajustar_ao_orcamento encaixa o
+total em ORCAMENTO_TOKENS_ENTRADA (e na janela de contexto menos o
+max_tokens da resposta):
+  - acima do orçamento: corta primeiro os documentos de prioridade BAIXA
+    (classificar_documento), depois MEDIA e por último ALTA, em degraus -
+    imagem em meia resolução, trecho de texto curto, documento só pelo nome
+  - com folga: amplia os trechos de texto (ALTA primeiro) até
+    ORCAMENTO_TEXTO_EXPANDIDO caracteres
+
+Com ORCAMENTO_CONTAGEM=api a estimativa local é calibrada por uma chamada
+a count_tokens da Anthropic (a contagem real do pedido montado).
+"""
+
+import io
+import os
+import base64
+from PIL import Image
+from dotenv import load_dotenv
+from limitador_llm import estimar_tokens_conteudo, tokens_imagem
+
+load_dotenv()
+
+ORCAMENTO_TOKENS_ENTRADA = int(os.getenv('ORCAMENTO_TOKENS_ENTRADA', '150000'))
+JANELA_CONTEXTO_TOKENS = int(os.getenv('JANELA_CONTEXTO_TOKENS', '200000'))
+
+# local (só estimativa) ou api (calibra com messages.count_tokens, uma chamada a mais)
+ORCAMENTO_CONTAGEM = os.getenv('ORCAMENTO_CONTAGEM', 'local').lower()
+
+# Trecho de texto por documento: padrão, reduzido e ampliado (caracteres)
+ORCAMENTO_TEXTO_PADRAO = 1500
+ORCAMENTO_TEXTO_REDUZIDO = 400
+ORCAMENTO_TEXTO_EXPANDIDO = int(os.getenv('ORCAMENTO_TEXTO_EXPANDIDO', '6000'))
+
+ORDEM_CORTE = ('BAIXA', 'MEDIA', 'ALTA')
+
+
+def criar_item(cabecalho, prioridade, imagem=None, texto=None):
+    """
+    Documento do prompt com os controles de corte
+
+    Args:
+        cabecalho: Linha "=== DOCUMENTO: ... ===" (sempre enviada)
+        prioridade: ALTA, MEDIA ou BAIXA
+        imagem: JPEG em base64 da 1ª página, ou None
+        texto: Texto extraído completo, ou None
+    """
+    return {
+        'cabecalho': cabecalho,
+        'prioridade': prioridade if prioridade in ORDEM_CORTE else 'MEDIA',
+        'imagem': imagem,
+        'texto': texto or '',
+        'limite_texto': ORCAMENTO_TEXTO_PADRAO if texto else 0,
+        'incluir_imagem': bool(imagem),
+    }
+
+
+def blocos_item(item):
+    """Blocos de conteúdo (formato da API) de um item"""
+    blocos = [{"type": "text", "text": item['cabecalho']}]
+    if item['incluir_imagem']:
+        blocos.append({
+            "type": "image",
+            "source": {"type": "base64", "media_type": "image/jpeg", "data": item['imagem']}
+        })
+    if item['limite_texto'] and item['texto']:
+        blocos.append({"type": "text", "text": f"Texto extraído:\n{item['texto'][:item['limite_texto']]}"})
+    return blocos
+
+
+def montar_conteudo(itens):
+    """conteudo_mensagem da petição a partir dos itens"""
+    conteudo = []
+    for item in itens:
+        conteudo.extend(blocos_item(item))
+    return conteudo
+
+
+def nome_item(item):
+    """Documento do item para o log (cabeçalho sem os '=')"""
+    return item['cabecalho'].strip().strip('= ')
+
+
+def tokens_item(item):
+    return estimar_tokens_conteudo(blocos_item(item))
+
+
+def reduzir_imagem(dados_base64, fator=0.5):
+    """Mesma imagem com largura e altura multiplicadas por fator (~fator² dos tokens)"""
+    try:
+        img = Image.open(io.BytesIO(base64.b64decode(dados_base64)))
+        img = img.convert('RGB').resize(
+            (max(1, int(img.width * fator)), max(1, int(img.height * fator))), Image.LANCZOS
+        )
+        saida = io.BytesIO()
+        img.save(saida, format='JPEG', quality=80, optimize=True)
+        return base64.b64encode(saida.getvalue()).decode('utf-8')
+    except Exception:
+        return dados_base64
+
+
+def orcamento_efetivo(max_tokens):
+    """Orçamento de entrada: o configurado, sem passar da janela menos a resposta"""
+    return min(ORCAMENTO_TOKENS_ENTRADA, JANELA_CONTEXTO_TOKENS - max_tokens)
+
+
+def _degraus_corte(prioridade):
+    """Cortes de uma prioridade, do mais leve ao mais forte"""
+    degraus = [
+        ('imagem em meia resolução',
+         lambda it: it['incluir_imagem'] and tokens_imagem(it['imagem']) > 400,
+         lambda it: it.update(imagem=reduzir_imagem(it['imagem']))),
+        ('trecho de texto reduzido',
+         lambda it: it['limite_texto'] > ORCAMENTO_TEXTO_REDUZIDO,
+         lambda it: it.update(limite_texto=ORCAMENTO_TEXTO_REDUZIDO)),
+    ]
+    if prioridade != 'ALTA':
+        degraus.append(('só o nome',
+                        lambda it: it['incluir_imagem'] or it['limite_texto'],
+                        lambda it: it.update(incluir_imagem=False, limite_texto=0)))
+    return degraus
+
+
+def ajustar_ao_orcamento(itens, tokens_fixos, orcamento):
+    """
+    Corta ou amplia os itens (no lugar) para o total caber no orçamento
+
+    Os cortes seguem ORDEM_CORTE e, dentro de uma prioridade, começam pelo
+    último documento; param assim que o total cabe.
+
+    Args:
+        itens: Lista de criar_item
+        tokens_fixos: Tokens do que não é cortado aqui (system prompt)
+        orcamento: Tokens de entrada permitidos
+
+    Returns:
+        (total estimado final, lista de ajustes para o log)
+    """
+    custos = [tokens_item(item) for item in itens]
+    total = tokens_fixos + sum(custos)
+    ajustes = []
+
+    def aplicar(i, acao):
+        nonlocal total
+        acao(itens[i])
+        novo = tokens_item(itens[i])
+        total += novo - custos[i]
+        custos[i] = novo
+
+    if total > orcamento:
+        for prioridade in ORDEM_CORTE:
+            indices = [i for i in reversed(range(len(itens))) if itens[i]['prioridade'] == prioridade]
+            for descricao, aplicavel, acao in _degraus_corte(prioridade):
+                for i in indices:
+                    if total <= orcamento:
+                        return total, ajustes
+                    if aplicavel(itens[i]):
+                        aplicar(i, acao)
+                        ajustes.append(f"{prioridade}: {nome_item(itens[i])} -> {descricao}")
+        return total, ajustes
+
+    # Folga: trechos maiores, ALTA primeiro, enquanto couber
+    for prioridade in reversed(ORDEM_CORTE):
+        for i, item in enumerate(itens):
+            if item['prioridade'] != prioridade or len(item['texto']) <= item['limite_texto']:
+                continue
+            anterior = item['limite_texto']
+            aplicar(i, lambda it: it.update(limite_texto=ORCAMENTO_TEXTO_EXPANDIDO))
+            if total > orcamento:
+                aplicar(i, lambda it: it.update(limite_texto=anterior))
+                return total, ajustes
+            ajustes.append(f"{prioridade}: {nome_item(item)} -> trecho ampliado")
+    return total, ajustes
+
+
+def calibrar_com_api(cliente, parametros, estimado):
+    """
+    Razão contagem real / estimativa local do pedido montado (1.0 se falhar)
+
+    Usa messages.count_tokens (beta da SDK), que não gera resposta nem custa tokens.
+    """
+    try:
+        contagem = cliente.beta.messages.count_tokens(
+            model=parametros['model'],
+            system=parametros['system'],
+            messages=parametros['messages'],
+        )
+        print(f"        - count_tokens: {contagem.input_tokens} (estimativa local {estimado})")
+        return contagem.input_tokens / max(1, estimado)
+    except Exception as e:
+        print(f"        [AVISO] count_tokens falhou ({e}), usando só a estimativa local")
+        return 1.0
+
+
+def montar_conteudo_no_orcamento(itens, model, system, max_tokens, cliente=None):
+    """
+    Ajusta os itens ao orçamento e devolve o conteudo_mensagem final
+
+    Args:
+        system: System prompt já em blocos (montar_system_com_cache)
+        cliente: Cliente Anthropic, usado só com ORCAMENTO_CONTAGEM=api
+    """
+    tokens_fixos = estimar_tokens_conteudo(system)
+    orcamento = orcamento_efetivo(max_tokens)
+    if ORCAMENTO_CONTAGEM == 'api' and cliente is not None:
+        conteudo = montar_conteudo(itens)
+        estimado = tokens_fixos + estimar_tokens_conteudo(conteudo)
+        fator = calibrar_com_api(cliente, {'model': model, 'system': system,
+                                           'messages': [{"role": "user", "content": conteudo}]}, estimado)
+        # Orçamento na escala da estimativa local
+        orcamento = int(orcamento / fator)
+
+    total, ajustes = ajustar_ao_orcamento(itens, tokens_fixos, orcamento)
+    print(f"        - Orçamento de tokens: ~{total} de {orcamento} (fixo ~{tokens_fixos}, "
+          f"{len(ajustes)} ajuste(s))")
+    for ajuste in ajustes:
+        print(f"          • {ajuste}")
+    if total > orcamento:
+        print(f"        [AVISO] Prompt acima do orçamento mesmo após os cortes (~{total} tokens)")
+    return montar_conteudo(itens)
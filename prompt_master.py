@@ -61,7 +61,26 @@ class PromptMasterGenerator:
             resumo_video: Resumo do vídeo (opcional)
             
         Returns:
-            String com o prompt master completo
+            String com o prompt master completo (parte fixa + dados do caso)
+        """
+        return self.gerar_prompt_estatico() + self.gerar_secao_caso(cliente_info, cronologia, resumo_video)
+    
+    def gerar_secao_caso(self, cliente_info: Dict, cronologia: Optional[str] = None,
+                         resumo_video: Optional[str] = None) -> str:
+        """Dados do cliente (mudam a cada petição; vão depois da parte fixa)"""
+        return f"""
+## INFORMAÇÕES DO CASO
+
+**Cliente**: {cliente_info.get('cliente_nome', 'Não informado')}
+
+{self._gerar_secao_cronologia(cronologia)}
+{self._gerar_secao_resumo_video(resumo_video)}
+"""
+    
+    def gerar_prompt_estatico(self) -> str:
+        """
+        Parte fixa do prompt master: igual para todos os clientes do mesmo tipo
+        de processo, por isso pode ficar no cache de prompt da Anthropic
         """
         
         # Determinar área do direito baseada no tipo de processo
@@ -88,14 +107,13 @@ Você é um advogado sênior especializado em elaboração de petições jurídi
 ❌ **PETIÇÕES COM MENOS DE 12 PÁGINAS SERÃO REJEITADAS AUTOMATICAMENTE**
 ✅ **Desenvolva COMPLETAMENTE cada seção conforme as proporções abaixo**
 
-## INFORMAÇÕES DO CASO
+## TIPO DA AÇÃO
 
-**Cliente**: {cliente_info.get('cliente_nome', 'Não informado')}
 **Tipo de Ação**: {self._traduzir_tipo_processo()}
 **Área do Direito**: {area_direito.title()}
 
-{self._gerar_secao_cronologia(cronologia)}
-{self._gerar_secao_resumo_video(resumo_video)}
+Os dados do cliente (nome, cronologia, resumo do vídeo) estão na seção
+INFORMAÇÕES DO CASO, ao final destas instruções.
 
 ## RESTRIÇÕES TÉCNICAS OBRIGATÓRIAS
 
@@ -707,3 +725,16 @@ def gerar_prompt_master(tipo_processo: str, cliente_info: Dict, documentos: List
     """
     generator = PromptMasterGenerator(tipo_processo)
     return generator.gerar_prompt_completo(cliente_info, documentos, cronologia, resumo_video)
+
+
+def gerar_prompt_master_em_blocos(tipo_processo: str, cliente_info: Dict,
+                                  cronologia: Optional[str] = None,
+                                  resumo_video: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Prompt master separado para o cache de prompt
+    
+    Returns:
+        (parte fixa do tipo de processo, dados do caso)
+    """
+    generator = PromptMasterGenerator(tipo_processo)
+    return generator.gerar_prompt_estatico(), generator.gerar_secao_caso(cliente_info, cronologia, resumo_video)
@@ -0,0 +1,59 @@
+"""
+Teste do cache de modelos no armazenamento local (ARMAZENAMENTO_BACKEND=local)
+
+O 'service' recebido pelos helpers é um ArmazenamentoLocal: versão e
+download do modelo precisam passar pelo armazenamento, não pelo Drive.
+
+Uso:
+    python test_cache_modelos_local.py   (ou pytest)
+"""
+
+import os
+import shutil
+import tempfile
+from docx import Document
+from armazenamento import ArmazenamentoLocal
+from cache_modelos import CacheModelos
+
+MODELO_ID = 'MODELOS/modelo.docx'
+
+
+def criar_modelo(raiz, corpo):
+    os.makedirs(os.path.join(raiz, 'MODELOS'), exist_ok=True)
+    doc = Document()
+    doc.sections[0].header.paragraphs[0].text = "ESCRITÓRIO TESTE - CABEÇALHO"
+    for linha in corpo:
+        doc.add_paragraph(linha)
+    doc.add_table(rows=1, cols=2)
+    doc.save(os.path.join(raiz, *MODELO_ID.split('/')))
+
+
+def test_modelo_docx_no_armazenamento_local():
+    raiz = tempfile.mkdtemp(prefix='teste_modelos_')
+    try:
+        criar_modelo(raiz, ["EXCELENTÍSSIMO SENHOR DOUTOR JUIZ", "DOS FATOS"])
+        local = ArmazenamentoLocal(raiz)
+        cache = CacheModelos()
+
+        texto = cache.texto(local, MODELO_ID)
+        assert "EXCELENTÍSSIMO SENHOR DOUTOR JUIZ" in texto
+        assert "DOS FATOS" in texto
+
+        doc = cache.novo_documento(local, MODELO_ID)
+        assert doc is not None
+        assert not doc.paragraphs and not doc.tables
+        assert doc.sections[0].header.paragraphs[0].text == "ESCRITÓRIO TESTE - CABEÇALHO"
+
+        # Modelo alterado no disco: nova versão (mtime/tamanho) e novo texto
+        versao_antiga = cache.entradas[MODELO_ID]['versao']
+        criar_modelo(raiz, ["MODELO REVISADO", "DOS FATOS E DO DIREITO"])
+        cache.invalidar(MODELO_ID)
+        assert "MODELO REVISADO" in cache.texto(local, MODELO_ID)
+        assert cache.entradas[MODELO_ID]['versao'] != versao_antiga
+    finally:
+        shutil.rmtree(raiz, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_modelo_docx_no_armazenamento_local()
+    print("OK")
@@ -0,0 +1,144 @@
+"""
+TRANSPORTE HTTP COMPARTILHADO DO GOOGLE DRIVE (HTTPX COM POOL)
+O googleapiclient usa por padrão um httplib2.Http por service, sem
+reaproveitar conexões entre services: cada thread/service novo paga de
+novo o handshake TLS, que domina a latência das chamadas pequenas
+(listagens, /api/drive/folders).
+
+Aqui um único httpx.Client por processo (thread-safe, pool limitado a
+DRIVE_HTTP_MAX_CONEXOES, keep-alive e HTTP/2 quando o pacote h2 estiver
+instalado) é exposto com a interface do httplib2 (HttpxHttplib2). Os
+services de todas as threads (listagem, download, upload, batch) passam
+a dividir o mesmo pool de conexões.
+
+Seleção: DRIVE_TRANSPORTE=httpx (padrão) ou httplib2 (comportamento antigo).
+Com certificado de cliente (GOOGLE_API_USE_CLIENT_CERTIFICATE=true) o
+transporte volta para o httplib2 do googleapiclient, que é quem instala o
+certificado (mTLS); o pool httpx não apresenta certificado de cliente.
+"""
+
+import os
+import socket
+import threading
+import httplib2
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DRIVE_TRANSPORTE = os.getenv('DRIVE_TRANSPORTE', 'httpx').lower()
+
+# mTLS do googleapiclient (certificado de cliente instalado no httplib2.Http)
+MTLS_ATIVO = os.getenv('GOOGLE_API_USE_CLIENT_CERTIFICATE', 'false').lower() == 'true'
+
+# Conexões simultâneas no pool e quantas ficam abertas ociosas (keep-alive)
+DRIVE_HTTP_MAX_CONEXOES = int(os.getenv('DRIVE_HTTP_MAX_CONEXOES', '20'))
+DRIVE_HTTP_KEEPALIVE_SEG = float(os.getenv('DRIVE_HTTP_KEEPALIVE_SEG', '60'))
+DRIVE_HTTP_TIMEOUT_SEG = float(os.getenv('DRIVE_HTTP_TIMEOUT_SEG', '120'))
+
+# HTTP/2 (multiplexação em uma conexão) só se o pacote h2 estiver instalado
+try:
+    import h2  # noqa: F401
+    HTTP2_DISPONIVEL = os.getenv('DRIVE_HTTP2', '1') == '1'
+except ImportError:
+    HTTP2_DISPONIVEL = False
+
+# Cabeçalhos de conexão do HTTP/1.1 (proibidos no HTTP/2, o pool cuida disso)
+CABECALHOS_CONEXAO = {'connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'upgrade'}
+
+STATUS_REDIRECIONAMENTO = {300, 301, 302, 303, 307}
+
+
+class HttpxHttplib2:
+    """
+    Adaptador com a interface do httplib2.Http sobre um httpx.Client compartilhado
+
+    Devolve (httplib2.Response, bytes) como o httplib2, e converte os erros
+    de rede do httpx nas exceções que o googleapiclient e o limitador_drive
+    já tratam como temporárias (ConnectionError, socket.timeout).
+    O 308 não é seguido: no upload resumable ele significa "continue".
+    """
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.timeout = DRIVE_HTTP_TIMEOUT_SEG
+        self.follow_redirects = True
+        self.redirect_codes = set(STATUS_REDIRECIONAMENTO)
+        self.connections = {}
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=httplib2.DEFAULT_MAX_REDIRECTS, connection_type=None):
+        cabecalhos = {k: v for k, v in (headers or {}).items() if k.lower() not in CABECALHOS_CONEXAO}
+        if body is not None and hasattr(body, 'read'):
+            body = body.read()
+
+        try:
+            resposta = self.cliente.request(method, uri, content=body, headers=cabecalhos, timeout=self.timeout)
+            conteudo = resposta.content
+        except httpx.TimeoutException as e:
+            raise socket.timeout(str(e)) from e
+        except httpx.TransportError as e:
+            raise ConnectionError(str(e)) from e
+
+        location = resposta.headers.get('location')
+        if (self.follow_redirects and resposta.status_code in self.redirect_codes and location
+                and method in ('GET', 'HEAD') and redirections > 0):
+            return self.request(str(resposta.url.join(location)), method, None, headers, redirections - 1)
+
+        info = dict(resposta.headers)
+        if info.pop('content-encoding', None):
+            # Como o httplib2: o corpo já vem descompactado
+            info['content-length'] = str(len(conteudo))
+        info['status'] = str(resposta.status_code)
+        return httplib2.Response(info), conteudo
+
+    def close(self):
+        # O cliente é do processo inteiro: fechar um service não derruba o pool
+        pass
+
+
+# ============================================================================
+# INSTÂNCIA COMPARTILHADA DO PROCESSO
+# ============================================================================
+
+_CLIENTE = None
+_LOCK_CLIENTE = threading.Lock()
+_AVISO_MTLS = False
+
+
+def obter_cliente_http():
+    """httpx.Client do processo (criado na primeira chamada)"""
+    global _CLIENTE
+    with _LOCK_CLIENTE:
+        if _CLIENTE is None:
+            _CLIENTE = httpx.Client(
+                http2=HTTP2_DISPONIVEL,
+                limits=httpx.Limits(
+                    max_connections=DRIVE_HTTP_MAX_CONEXOES,
+                    max_keepalive_connections=DRIVE_HTTP_MAX_CONEXOES,
+                    keepalive_expiry=DRIVE_HTTP_KEEPALIVE_SEG,
+                ),
+                timeout=DRIVE_HTTP_TIMEOUT_SEG,
+                follow_redirects=False,
+            )
+            print(f"    [HTTP] Pool compartilhado do Drive: até {DRIVE_HTTP_MAX_CONEXOES} conexões, "
+                  f"{'HTTP/2' if HTTP2_DISPONIVEL else 'HTTP/1.1 keep-alive'}")
+        return _CLIENTE
+
+
+def obter_http_drive():
+    """
+    Objeto http (interface httplib2) para build()/AuthorizedHttp, ou None
+    para deixar o googleapiclient criar o httplib2.Http padrão
+    """
+    global _AVISO_MTLS
+    if DRIVE_TRANSPORTE != 'httpx':
+        return None
+    if MTLS_ATIVO:
+        with _LOCK_CLIENTE:
+            if not _AVISO_MTLS:
+                _AVISO_MTLS = True
+                print("    [HTTP] GOOGLE_API_USE_CLIENT_CERTIFICATE=true: usando httplib2 "
+                      "(o transporte httpx não faz mTLS)")
+        return None
+    return HttpxHttplib2(obter_cliente_http())
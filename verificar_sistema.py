@@ -90,7 +90,7 @@ if not os.path.exists('historico_peticoes.json'):
     print("   1. Parar o sistema (Ctrl+C)")
     print("   2. Baixar main_v9_corrigido.py")
     print("   3. Substituir o main.py")
-    print("   4. Delete _PROCESSADO.txt de um cliente")
+    print("   4. Desmarque um cliente: POST /api/desmarcar-processado {\"cliente_nome\": ...}")
     print("   5. Rodar: python main.py")
     print("   6. Aguardar gerar e auditar")
 else:
@@ -110,7 +110,7 @@ else:
         print("   1. Delete pasta logs_auditoria/")
         print("   2. Delete petições de 03_APROVADAS/")
         print("   3. Delete petições de 04_REJEITADAS/")
-        print("   4. Delete _PROCESSADO.txt do cliente")
+        print("   4. Desmarque o cliente: POST /api/desmarcar-processado {\"cliente_nome\": ...}")
         print("   5. Reprocessar com sistema novo")
     else:
         print("\n✅ Logs com justificativa!")